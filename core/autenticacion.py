@@ -0,0 +1,60 @@
+"""
+Usuario del request servido desde la caché.
+
+AuthenticationMiddleware carga `request.user` con `get_user` del backend en cada
+request autenticado. Este backend guarda el Usuario en la caché por defecto, así un
+request con sesión iniciada no consulta la tabla de usuarios. La entrada se borra al
+guardar o borrar el usuario (editar perfil, cambiar contraseña, last_login; ver
+core/signals.py), y eso solo llega a los demás procesos con una caché compartida: con
+locmem (CACHE_COMPARTIDA falso) `get_user` es el de ModelBackend. Los agregados de valoraciones se actualizan con UPDATE sin señales:
+en el usuario cacheado pueden atrasarse hasta USUARIO_CACHE_SEGUNDOS.
+
+Junto con SESSION_ENGINE cached_db (o signed_cookies) un request autenticado no
+toca la base antes de llegar a la vista (ver helptime/settings.py).
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+
+
+def clave_usuario(usuario_id):
+    return f"auth:usuario:{usuario_id}"
+
+
+def invalidar_usuario(usuario_id):
+    cache.delete(clave_usuario(usuario_id))
+
+
+class UsuarioCacheadoBackend(ModelBackend):
+    """ModelBackend con `get_user` (y su versión async) respaldado por la caché."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        usuario = super().authenticate(request, username=username, password=password, **kwargs)
+        if usuario is None:
+            # Corta la cadena: el ModelBackend que sigue en la lista repetiría el mismo
+            # chequeo (y el hash de la contraseña) para nada
+            raise PermissionDenied
+        return usuario
+
+    def get_user(self, user_id):
+        if not settings.CACHE_COMPARTIDA:
+            return super().get_user(user_id)
+        clave = clave_usuario(user_id)
+        usuario = cache.get(clave)
+        if usuario is None:
+            usuario = super().get_user(user_id)
+            if usuario is not None:
+                cache.set(clave, usuario, settings.USUARIO_CACHE_SEGUNDOS)
+        return usuario
+
+    async def aget_user(self, user_id):
+        if not settings.CACHE_COMPARTIDA:
+            return await super().aget_user(user_id)
+        clave = clave_usuario(user_id)
+        usuario = await cache.aget(clave)
+        if usuario is None:
+            usuario = await super().aget_user(user_id)
+            if usuario is not None:
+                await cache.aset(clave, usuario, settings.USUARIO_CACHE_SEGUNDOS)
+        return usuario
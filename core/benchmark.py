@@ -0,0 +1,171 @@
+"""
+Herramientas para medir las vistas con datos sintéticos (ver el comando benchmark_vistas).
+
+- `generar_datos`: usuarios, servicios, valoraciones, mensajes y notificaciones en lotes,
+  con los agregados, las localidades, el índice de búsqueda y la caché al día.
+- `medir`: latencia y cantidad de consultas de un request hecho con el cliente de pruebas.
+- `comparar`: diferencias contra una línea base guardada en JSON.
+"""
+import statistics
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .cache import invalidar
+from .conversaciones import reconstruir as reconstruir_conversaciones
+from .models import Usuario, Servicio, Mensaje, Valoracion, Notificacion
+from .ratings import recalcular_agregados
+from .search import get_backend
+from .ubicaciones import geocodificar_todos
+
+PALABRAS = [
+    'clases', 'guitarra', 'piano', 'matemática', 'inglés', 'plomería', 'electricidad',
+    'jardinería', 'pintura', 'computación', 'reparación', 'celulares', 'enfermería',
+    'cuidado', 'adultos', 'mayores', 'niños', 'cocina', 'costura', 'mudanza',
+]
+PROFESIONES = ['Docente', 'Plomero', 'Electricista', 'Enfermera', 'Programador', 'Jardinero']
+UBICACIONES = [
+    'Rosario', 'Córdoba', 'Mendoza', 'La Plata', 'Palermo', 'Caballito', 'Belgrano', 'Quilmes',
+    'San Isidro', 'Mar del Plata', 'Salta', 'Neuquén', 'Tucumán', 'Villa Crespo, CABA',
+]
+CATEGORIAS = [clave for clave, _ in Servicio.CATEGORY_CHOICES]
+LOTE = 5000
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+def _en_lotes(modelo, objetos):
+    creados = []
+    for inicio in range(0, len(objetos), LOTE):
+        creados += modelo.objects.bulk_create(objetos[inicio:inicio + LOTE])
+    return creados
+
+
+def generar_datos(rnd, usuarios=200, servicios=1000, valoraciones=3000, mensajes=5000,
+                  notificaciones=2000, prefijo='bench'):
+    """
+    Crea el volumen pedido y devuelve {'usuarios': [...], 'servicios': [...]}.
+    Los primeros dos usuarios concentran una conversación larga y muchas notificaciones
+    (el peor caso de chat_view y notificaciones_view).
+    """
+    clave = make_password('benchmark')  # un solo hash: es lo más caro de crear usuarios
+    lista_usuarios = _en_lotes(Usuario, [
+        Usuario(
+            username=f"{prefijo}-{i}",
+            email=f"{prefijo}-{i}@example.com",
+            password=clave,
+            profession=rnd.choice(PROFESIONES),
+            location=rnd.choice(UBICACIONES),
+        )
+        for i in range(usuarios)
+    ])
+    lista_servicios = _en_lotes(Servicio, [
+        Servicio(
+            user=lista_usuarios[i % len(lista_usuarios)],
+            title=' '.join(rnd.sample(PALABRAS, 3)).capitalize(),
+            description=' '.join(rnd.choices(PALABRAS, k=20)),
+            category=rnd.choice(CATEGORIAS),
+            profession=rnd.choice(PROFESIONES),
+            location=rnd.choice(UBICACIONES),
+        )
+        for i in range(servicios)
+    ])
+
+    pares = set()
+    limite = min(valoraciones, len(lista_servicios) * (len(lista_usuarios) - 1))
+    while len(pares) < limite:
+        servicio = rnd.choice(lista_servicios)
+        autor = rnd.choice(lista_usuarios)
+        if autor.pk != servicio.user_id:
+            pares.add((servicio, autor))
+    _en_lotes(Valoracion, [
+        Valoracion(
+            servicio=servicio,
+            autor=autor,
+            puntuacion=rnd.randint(1, 5),
+            comentario=rnd.choice(['', 'Muy bueno', 'Recomendable', 'Llegó tarde']),
+        )
+        for servicio, autor in sorted(pares, key=lambda par: (par[0].pk, par[1].pk))
+    ])
+
+    a, b = lista_usuarios[0], lista_usuarios[1 % len(lista_usuarios)]
+    objetos = []
+    for i in range(mensajes):
+        if i % 2:
+            sender, receiver = rnd.sample(lista_usuarios, 2) if len(lista_usuarios) > 1 else (a, b)
+        else:
+            sender, receiver = (a, b) if i % 4 else (b, a)
+        objetos.append(Mensaje(sender=sender, receiver=receiver, content=' '.join(rnd.choices(PALABRAS, k=8))))
+    _en_lotes(Mensaje, objetos)
+
+    _en_lotes(Notificacion, [
+        Notificacion(
+            receptor=a if i % 2 else rnd.choice(lista_usuarios),
+            emisor=rnd.choice(lista_usuarios),
+            mensaje=f"Tienes un nuevo mensaje ({i})",
+            leida=rnd.random() < 0.7,
+        )
+        for i in range(notificaciones)
+    ])
+
+    # bulk_create no dispara señales
+    recalcular_agregados()
+    geocodificar_todos(Usuario, solo_pendientes=True)
+    geocodificar_todos(Servicio, solo_pendientes=True)
+    reconstruir_conversaciones()
+    get_backend().reindexar()
+    invalidar('servicios')
+    invalidar('paginas')
+    return {'usuarios': lista_usuarios, 'servicios': lista_servicios}
+
+
+def medir(client, metodo, url, repeticiones, datos=None):
+    """
+    Ejecuta el request `repeticiones` veces. El primero se informa aparte (caché fría);
+    los tiempos de los demás dan p50/p95.
+    """
+    tiempos, consultas, estados = [], [], set()
+    for _ in range(repeticiones):
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            respuesta = getattr(client, metodo)(url, datos or {})
+            if respuesta.streaming:
+                b''.join(respuesta.streaming_content)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        consultas.append(len(capturadas))
+        estados.add(respuesta.status_code)
+    calientes = tiempos[1:] or tiempos
+    return {
+        'estado': sorted(estados),
+        'primera_ms': round(tiempos[0], 2),
+        'p50_ms': round(statistics.median(calientes), 2),
+        'p95_ms': round(percentil(calientes, 95), 2),
+        'max_ms': round(max(calientes), 2),
+        'consultas_primera': consultas[0],
+        'consultas': max(consultas[1:] or consultas),
+    }
+
+
+def comparar(base, actual, tolerancia, minimo_ms=2.0):
+    """
+    Devuelve las regresiones de `actual` respecto de `base` (dos salidas del benchmark):
+    más consultas que antes, o un p95 más de `tolerancia` (fracción) y más de `minimo_ms`
+    por encima (en vistas de pocos ms el ruido supera cualquier porcentaje).
+    """
+    regresiones = []
+    for nombre, medida in actual['vistas'].items():
+        anterior = base.get('vistas', {}).get(nombre)
+        if not anterior:
+            continue
+        if medida['consultas'] > anterior['consultas']:
+            regresiones.append(f"{nombre}: consultas {anterior['consultas']} -> {medida['consultas']}")
+        limite = max(anterior['p95_ms'] * (1 + tolerancia), anterior['p95_ms'] + minimo_ms)
+        if medida['p95_ms'] > limite:
+            regresiones.append(f"{nombre}: p95 {anterior['p95_ms']}ms -> {medida['p95_ms']}ms")
+    return regresiones
@@ -0,0 +1,171 @@
+"""
+Capa de caché de la aplicación.
+
+- `obtener_o_calcular`: cache-aside con contadores de aciertos/fallos por espacio de nombres.
+- Versiones por espacio de nombres: invalidar = incrementar la versión, así no hace
+  falta borrar claves por patrón (los backends de Django no lo soportan).
+- `cache_para_anonimos`: cachea la respuesta completa de una vista solo para visitantes
+  sin sesión iniciada.
+- Variantes `a...` para vistas async: usan la API async del backend de caché.
+
+El backend se elige con CACHE_URL (ver helptime/settings.py). Las invalidaciones no
+cruzan procesos con una caché local: sin CACHE_FRAGMENTOS las funciones de acá calculan
+siempre y no guardan nada.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+
+ESPACIOS = ('servicios', 'paginas')
+TIMEOUT = 600
+
+
+def _clave_estadistica(espacio, tipo):
+    return f"cache_stats:{espacio}:{tipo}"
+
+
+def _contar(espacio, tipo):
+    clave = _clave_estadistica(espacio, tipo)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        if not cache.add(clave, 1, None):
+            cache.incr(clave)
+
+
+async def _acontar(espacio, tipo):
+    clave = _clave_estadistica(espacio, tipo)
+    try:
+        await cache.aincr(clave)
+    except ValueError:
+        if not await cache.aadd(clave, 1, None):
+            await cache.aincr(clave)
+
+
+def estadisticas():
+    """Aciertos, fallos y tasa de aciertos por espacio de nombres."""
+    claves = {
+        (espacio, tipo): _clave_estadistica(espacio, tipo)
+        for espacio in ESPACIOS for tipo in ('hits', 'misses')
+    }
+    valores = cache.get_many(list(claves.values()))
+    resultado = {}
+    for espacio in ESPACIOS:
+        hits = valores.get(claves[(espacio, 'hits')], 0)
+        misses = valores.get(claves[(espacio, 'misses')], 0)
+        total = hits + misses
+        resultado[espacio] = {
+            'hits': hits,
+            'misses': misses,
+            'ratio': round(hits / total, 3) if total else None,
+        }
+    return resultado
+
+
+def version(espacio):
+    return cache.get_or_set(f"cache_version:{espacio}", 1, None)
+
+
+async def aversion(espacio):
+    return await cache.aget_or_set(f"cache_version:{espacio}", 1, None)
+
+
+def invalidar(espacio):
+    """Invalida todas las entradas del espacio de nombres."""
+    try:
+        cache.incr(f"cache_version:{espacio}")
+    except ValueError:
+        cache.set(f"cache_version:{espacio}", 2, None)
+
+
+def _digest(partes):
+    return hashlib.sha1(repr(partes).encode()).hexdigest()
+
+
+def clave(espacio, *partes):
+    """Clave estable para `partes` dentro de la versión actual del espacio de nombres."""
+    return f"{espacio}:v{version(espacio)}:{_digest(partes)}"
+
+
+async def aclave(espacio, *partes):
+    return f"{espacio}:v{await aversion(espacio)}:{_digest(partes)}"
+
+
+def obtener_o_calcular(espacio, partes, calcular, timeout=TIMEOUT):
+    if not settings.CACHE_FRAGMENTOS:
+        return calcular()
+    k = clave(espacio, *partes)
+    valor = cache.get(k)
+    if valor is not None:
+        _contar(espacio, 'hits')
+        return valor
+    _contar(espacio, 'misses')
+    valor = calcular()
+    cache.set(k, valor, timeout)
+    return valor
+
+
+async def aobtener_o_calcular(espacio, partes, calcular, timeout=TIMEOUT):
+    """Como obtener_o_calcular, con `calcular` async."""
+    if not settings.CACHE_FRAGMENTOS:
+        return await calcular()
+    k = await aclave(espacio, *partes)
+    valor = await cache.aget(k)
+    if valor is not None:
+        await _acontar(espacio, 'hits')
+        return valor
+    await _acontar(espacio, 'misses')
+    valor = await calcular()
+    await cache.aset(k, valor, timeout)
+    return valor
+
+
+def cache_para_anonimos(timeout=TIMEOUT):
+    """Cachea las respuestas 200 de la vista para usuarios anónimos, por URL completa."""
+    def guardable(respuesta):
+        if respuesta.status_code != 200 or respuesta.streaming:
+            return False
+        if hasattr(respuesta, 'render'):
+            respuesta.render()
+        return True
+
+    def decorador(vista):
+        if iscoroutinefunction(vista):
+            @wraps(vista)
+            async def envuelta_async(request, *args, **kwargs):
+                if (not settings.CACHE_FRAGMENTOS or request.method != 'GET'
+                        or (await request.auser()).is_authenticated):
+                    return await vista(request, *args, **kwargs)
+
+                k = await aclave('paginas', vista.__name__, request.get_full_path())
+                respuesta = await cache.aget(k)
+                if respuesta is not None:
+                    await _acontar('paginas', 'hits')
+                    return respuesta
+                await _acontar('paginas', 'misses')
+                respuesta = await vista(request, *args, **kwargs)
+                if guardable(respuesta):
+                    await cache.aset(k, respuesta, timeout)
+                return respuesta
+            return envuelta_async
+
+        @wraps(vista)
+        def envuelta(request, *args, **kwargs):
+            if not settings.CACHE_FRAGMENTOS or request.method != 'GET' or request.user.is_authenticated:
+                return vista(request, *args, **kwargs)
+
+            k = clave('paginas', vista.__name__, request.get_full_path())
+            respuesta = cache.get(k)
+            if respuesta is not None:
+                _contar('paginas', 'hits')
+                return respuesta
+            _contar('paginas', 'misses')
+            respuesta = vista(request, *args, **kwargs)
+            if guardable(respuesta):
+                cache.set(k, respuesta, timeout)
+            return respuesta
+        return envuelta
+    return decorador
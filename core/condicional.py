@@ -0,0 +1,63 @@
+"""
+Respuestas condicionales (ETag / Last-Modified) para las vistas de lectura.
+
+Cada vista arma sus validadores con consultas baratas a la base (MAX(updated_at) y
+COUNT sobre índices, el estado de las notificaciones) antes de consultar el resto o
+renderizar: si el navegador ya tiene esa versión se responde 304 sin tocar templates.
+Salen de la base y no de la caché, que puede ser por proceso: así los cambios del
+worker, de los comandos o de otro worker también cambian los validadores.
+
+- Last-Modified sale de los `updated_at` (los UPDATE en bloque también los ponen al
+  día); el ETag además cubre las filas borradas con la cantidad de filas.
+- La página cambia según quién la pide (botones, formularios con token CSRF): el
+  ETag incluye al usuario y su cookie CSRF, y la respuesta es `private`.
+"""
+import hashlib
+
+from django.conf import settings
+from django.http import HttpResponseNotModified
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+def validadores(request, partes, ultima_modificacion=None):
+    """{'etag', 'last_modified'} de la página de `request` según `partes` y la fecha dada."""
+    # Last-Modified tiene resolución de segundos; el ETag usa la fecha completa
+    marca = int(ultima_modificacion.timestamp()) if ultima_modificacion else None
+    datos = (
+        request.user.pk,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        request.get_full_path(),
+        ultima_modificacion.isoformat() if ultima_modificacion else None,
+        partes,
+    )
+    return {
+        'etag': f'"{hashlib.sha1(repr(datos).encode()).hexdigest()}"',
+        'last_modified': marca,
+    }
+
+
+def _encabezados(respuesta, validadores):
+    respuesta.headers['ETag'] = validadores['etag']
+    if validadores['last_modified'] is not None:
+        respuesta.headers['Last-Modified'] = http_date(validadores['last_modified'])
+    # El navegador revalida cada vez (también al volver atrás) y no la comparte
+    patch_cache_control(respuesta, private=True, no_cache=True)
+    return respuesta
+
+
+def no_modificado(request, validadores):
+    """Un 304 si el request ya tiene esta versión de la página, o None."""
+    respuesta = get_conditional_response(
+        request, etag=validadores['etag'], last_modified=validadores['last_modified'],
+    )
+    if isinstance(respuesta, HttpResponseNotModified):
+        return _encabezados(respuesta, validadores)
+    return None
+
+
+def con_validadores(respuesta, validadores):
+    """Agrega ETag, Last-Modified y Cache-Control a una respuesta 200."""
+    if respuesta.status_code == 200:
+        _encabezados(respuesta, validadores)
+    return respuesta
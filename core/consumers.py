@@ -0,0 +1,23 @@
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .realtime import grupo_usuario
+
+
+class EventosConsumer(AsyncJsonWebsocketConsumer):
+    """Canal por usuario logueado: recibe mensajes de chat y notificaciones nuevas."""
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+        self.grupo = grupo_usuario(user.id)
+        await self.channel_layer.group_add(self.grupo, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if hasattr(self, 'grupo'):
+            await self.channel_layer.group_discard(self.grupo, self.channel_name)
+
+    async def evento(self, event):
+        await self.send_json({'tipo': event['tipo'], 'datos': event['datos']})
@@ -0,0 +1,6 @@
+from django.conf import settings
+
+
+def tiempo_real(request):
+    """`tiempo_real`: si las páginas deben abrir el WebSocket de eventos (ver settings)."""
+    return {'tiempo_real': settings.TIEMPO_REAL_ACTIVO}
@@ -0,0 +1,113 @@
+"""
+Bandeja de entrada.
+
+Cada par de usuarios que intercambió mensajes tiene una fila Conversacion con el último
+mensaje, su fecha y los no leídos de cada lado. `enviar_mensaje` la actualiza en la
+misma transacción que crea el Mensaje, así la bandeja es una consulta indexada sobre
+Conversacion en lugar de agrupar todos los mensajes del usuario.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Q
+from django.db.models.functions import Greatest, Least
+
+from .models import Conversacion, Mensaje
+
+VISTA_PREVIA = 100
+LOTE = 1000
+
+
+def _par(usuario_id, otro_id):
+    return (usuario_id, otro_id) if usuario_id < otro_id else (otro_id, usuario_id)
+
+
+def _campo_no_leidos(usuario_id, otro_id):
+    """Contador de no leídos de `usuario_id` en su conversación con `otro_id`."""
+    return 'no_leidos_a' if usuario_id < otro_id else 'no_leidos_b'
+
+
+def conversaciones_de(usuario):
+    return Conversacion.objects.filter(Q(usuario_a=usuario) | Q(usuario_b=usuario))
+
+
+def enviar_mensaje(emisor, receptor, contenido):
+    """Crea el mensaje y actualiza el resumen de la conversación en una sola transacción."""
+    with transaction.atomic():
+        mensaje = Mensaje.objects.create(sender=emisor, receiver=receptor, content=contenido)
+        if emisor.id == receptor.id:
+            return mensaje
+        a, b = _par(emisor.id, receptor.id)
+        no_leidos = _campo_no_leidos(receptor.id, emisor.id)
+        resumen = {
+            'ultimo_mensaje': mensaje,
+            'vista_previa': contenido[:VISTA_PREVIA],
+            'ultima_fecha': mensaje.timestamp,
+        }
+        par = Conversacion.objects.filter(usuario_a_id=a, usuario_b_id=b)
+        if not par.update(**resumen, **{no_leidos: F(no_leidos) + 1}):
+            try:
+                with transaction.atomic():
+                    Conversacion.objects.create(usuario_a_id=a, usuario_b_id=b, **resumen, **{no_leidos: 1})
+            except IntegrityError:
+                # Otro request creó la conversación entre el UPDATE y el INSERT
+                par.update(**resumen, **{no_leidos: F(no_leidos) + 1})
+    return mensaje
+
+
+def marcar_leida(usuario, otro):
+    """Pone en cero los no leídos de `usuario` en su conversación con `otro`."""
+    a, b = _par(usuario.id, otro.id)
+    campo = _campo_no_leidos(usuario.id, otro.id)
+    Conversacion.objects.filter(usuario_a_id=a, usuario_b_id=b, **{f'{campo}__gt': 0}).update(**{campo: 0})
+
+
+async def amarcar_leida(usuario, otro):
+    a, b = _par(usuario.id, otro.id)
+    campo = _campo_no_leidos(usuario.id, otro.id)
+    await Conversacion.objects.filter(
+        usuario_a_id=a, usuario_b_id=b, **{f'{campo}__gt': 0}
+    ).aupdate(**{campo: 0})
+
+
+def reconstruir():
+    """
+    Recalcula todas las conversaciones a partir de Mensaje. Mensaje no registra lectura:
+    se conservan los contadores de no leídos que ya existían y los pares nuevos quedan en 0.
+    Devuelve la cantidad de conversaciones.
+    """
+    pares = (
+        Mensaje.objects.order_by()
+        .exclude(sender=F('receiver'))
+        .annotate(a=Least('sender_id', 'receiver_id'), b=Greatest('sender_id', 'receiver_id'))
+        .values('a', 'b')
+        .annotate(ultimo=Max('id'))
+        .values_list('a', 'b', 'ultimo')
+    )
+    with transaction.atomic():
+        contadores = {
+            (a, b): (na, nb)
+            for a, b, na, nb in Conversacion.objects.values_list(
+                'usuario_a_id', 'usuario_b_id', 'no_leidos_a', 'no_leidos_b'
+            )
+        }
+        Conversacion.objects.all().delete()
+        total = 0
+        pendientes = list(pares)
+        for inicio in range(0, len(pendientes), LOTE):
+            lote = pendientes[inicio:inicio + LOTE]
+            ultimos = Mensaje.objects.in_bulk([ultimo for _, _, ultimo in lote])
+            nuevas = []
+            for a, b, ultimo in lote:
+                mensaje = ultimos[ultimo]
+                na, nb = contadores.get((a, b), (0, 0))
+                nuevas.append(Conversacion(
+                    usuario_a_id=a,
+                    usuario_b_id=b,
+                    ultimo_mensaje=mensaje,
+                    vista_previa=mensaje.content[:VISTA_PREVIA],
+                    ultima_fecha=mensaje.timestamp,
+                    no_leidos_a=na,
+                    no_leidos_b=nb,
+                ))
+            Conversacion.objects.bulk_create(nuevas)
+            total += len(nuevas)
+    return total
@@ -0,0 +1,35 @@
+"""
+Archivos estáticos con WhiteNoise, también bajo ASGI.
+
+WhiteNoiseMiddleware es solo síncrono: en una cadena async, Django lo adapta con
+async_to_sync y cada request pasa por un hilo, aunque la vista sea async. La búsqueda
+del archivo es un diccionario en memoria (sin autorefresh), así que puede hacerse en
+el event loop.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class EstaticosMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            # Con autorefresh (DEBUG) busca en disco
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,104 @@
+"""
+Exportación de datos en CSV o JSONL, en streaming.
+
+Las filas salen de `values_list(...).iterator(chunk_size=LOTE)` ordenadas por id: no se
+instancian modelos ni se carga el queryset entero (en PostgreSQL usa un cursor del
+servidor), así que la memoria no depende de la cantidad de filas. `lineas` es un
+generador que sirve tanto para StreamingHttpResponse como para escribir a un archivo.
+`desde_id` permite retomar una exportación cortada a partir del último id recibido.
+
+En CSV los textos que escriben los usuarios y empiezan con =, +, -, @, tab o CR salen
+con un ' adelante: si no, una planilla los abre como fórmulas.
+
+Bajo ASGI, StreamingHttpResponse consume un generador síncrono entero con
+`sync_to_async(list)`: para eso está `alineas`, un generador async que lee por lotes
+keyset (id > último enviado), un `sync_to_async` por lote.
+"""
+import csv
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Servicio, Valoracion, Mensaje, Notificacion
+
+LOTE = 2000
+FORMATOS = ('csv', 'jsonl')
+INICIOS_DE_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+# nombre: (modelo, columnas)
+EXPORTABLES = {
+    'servicios': (Servicio, (
+        'id', 'user_id', 'title', 'description', 'category', 'profession', 'location',
+        'localidad_id', 'latitud', 'longitud', 'rating_sum', 'rating_count',
+    )),
+    'valoraciones': (Valoracion, ('id', 'servicio_id', 'autor_id', 'puntuacion', 'comentario', 'created_at')),
+    'mensajes': (Mensaje, ('id', 'sender_id', 'receiver_id', 'content', 'timestamp')),
+    'notificaciones': (Notificacion, (
+        'id', 'receptor_id', 'emisor_id', 'tipo', 'mensaje', 'cantidad', 'leida', 'fecha',
+    )),
+}
+
+
+class _Eco:
+    """Buffer mínimo para csv.writer: devuelve la línea en lugar de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def _consulta(nombre, desde_id):
+    modelo, columnas = EXPORTABLES[nombre]
+    queryset = modelo.objects.order_by('id')
+    if desde_id is not None:
+        queryset = queryset.filter(id__gt=desde_id)
+    return queryset.values_list(*columnas)
+
+
+def filas(nombre, desde_id=None):
+    return _consulta(nombre, desde_id).iterator(chunk_size=LOTE)
+
+
+def _lote(nombre, desde_id):
+    """Hasta LOTE filas con id mayor a `desde_id` (la primera columna siempre es el id)."""
+    return list(_consulta(nombre, desde_id)[:LOTE])
+
+
+def _celda(valor):
+    if isinstance(valor, str) and valor.startswith(INICIOS_DE_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def _formato(nombre, formato):
+    """(encabezado o None, función fila -> línea)."""
+    columnas = EXPORTABLES[nombre][1]
+    if formato == 'csv':
+        escritor = csv.writer(_Eco())
+        return escritor.writerow(columnas), lambda fila: escritor.writerow([_celda(valor) for valor in fila])
+    if formato == 'jsonl':
+        codificador = DjangoJSONEncoder(ensure_ascii=False)
+        return None, lambda fila: codificador.encode(dict(zip(columnas, fila))) + '\n'
+    raise ValueError(f"Formato desconocido: {formato}")
+
+
+def lineas(nombre, formato, desde_id=None):
+    """Genera el encabezado (en CSV) y una línea por fila."""
+    encabezado, linea = _formato(nombre, formato)
+    if encabezado is not None:
+        yield encabezado
+    for fila in filas(nombre, desde_id):
+        yield linea(fila)
+
+
+async def alineas(nombre, formato, desde_id=None):
+    """`lineas` para StreamingHttpResponse bajo ASGI: nunca tiene más de un lote en memoria."""
+    encabezado, linea = _formato(nombre, formato)
+    if encabezado is not None:
+        yield encabezado
+    while True:
+        lote = await sync_to_async(_lote)(nombre, desde_id)
+        for fila in lote:
+            yield linea(fila)
+        if len(lote) < LOTE:
+            return
+        desde_id = lote[-1][0]
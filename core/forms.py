@@ -1,5 +1,6 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
+from .imagenes import validar_imagen
 from .models import Usuario, Servicio, Mensaje, Valoracion
 
 
@@ -10,7 +11,7 @@ class RegistroForm(UserCreationForm):
     age = forms.IntegerField(label="Edad", required=False, min_value=0)
     profession = forms.CharField(label="Profesión", required=False, max_length=100)
     location = forms.CharField(label="Ubicación", required=False, max_length=100)
-    profile_image = forms.ImageField(label="Imagen de perfil", required=False)
+    profile_image = forms.ImageField(label="Imagen de perfil", required=False, validators=[validar_imagen])
 
     class Meta:
         model = Usuario
@@ -56,6 +57,10 @@ class ServicioForm(forms.ModelForm):
             'location': forms.TextInput(attrs={'placeholder': 'Ciudad o barrio'}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['image'].validators.append(validar_imagen)
+
 # Formulario de mensajes
 class MensajeForm(forms.ModelForm):
     content = forms.CharField(
@@ -91,4 +96,8 @@ class EditarPerfilForm(forms.ModelForm):
             'profession': 'Profesión',
             'location': 'Ubicación',
             'profile_image': 'Imagen de perfil',
-        }
\ No newline at end of file
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['profile_image'].validators.append(validar_imagen)
@@ -0,0 +1,237 @@
+"""
+Procesamiento de imágenes subidas (perfiles y servicios).
+
+- `validar_imagen` corre en el formulario: formato, peso y dimensiones.
+- `procesar_imagen` corre en el worker (tarea subir_imagen): corrige la orientación,
+  quita metadatos (EXIF, GPS) y genera variantes de tamaño fijo en WebP y JPEG.
+- `url_imagen` / `resolver_urls`: URLs memoizadas en un LRU del proceso, para no
+  reconstruirlas con el storage (Cloudinary) en cada render.
+
+Las variantes se guardan en el mismo storage que el original (Cloudinary o el
+FileSystemStorage local), con el nombre `<original>__<variante>.<ext>`, y sus nombres
+quedan en el campo `<campo>_variantes` junto con el original del que salieron: si la
+imagen cambia por otro camino (admin, "eliminar imagen") las variantes viejas se ignoran.
+"""
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+FORMATOS_PERMITIDOS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+MAX_BYTES = 5 * 1024 * 1024
+MAX_PIXELES = 40_000_000
+
+# nombre: (ancho, alto, recortar). Sin recorte la imagen entra en la caja manteniendo proporción.
+VARIANTES = {
+    'avatar': (128, 128, True),
+    'card': (480, 360, True),
+    'full': (1600, 1600, False),
+}
+# Cantidad de archivos (originales) con URLs memoizadas por proceso
+MAX_URLS = 4096
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+def validar_imagen(archivo):
+    if archivo.size > MAX_BYTES:
+        raise ValidationError(f"La imagen no puede superar los {MAX_BYTES // (1024 * 1024)} MB.")
+    try:
+        archivo.seek(0)
+        with Image.open(archivo) as imagen:
+            formato = imagen.format
+            ancho, alto = imagen.size
+            imagen.verify()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise ValidationError("El archivo no es una imagen válida.")
+    finally:
+        archivo.seek(0)
+    if formato not in FORMATOS_PERMITIDOS:
+        raise ValidationError("Formato no permitido. Usá JPG, PNG, WebP o GIF.")
+    if ancho * alto > MAX_PIXELES:
+        raise ValidationError("La imagen tiene demasiados píxeles.")
+
+
+def _abrir(contenido):
+    imagen = Image.open(io.BytesIO(contenido))
+    imagen.seek(0)  # primer cuadro de los GIF animados
+    # Aplicar la rotación del EXIF antes de descartarlo
+    return ImageOps.exif_transpose(imagen)
+
+
+def _codificar(imagen, formato, opciones):
+    if formato == 'JPEG' and imagen.mode not in ('RGB', 'L'):
+        fondo = Image.new('RGB', imagen.size, 'white')
+        convertida = imagen.convert('RGBA')
+        fondo.paste(convertida, mask=convertida.getchannel('A'))
+        imagen = fondo
+    salida = io.BytesIO()
+    # Sin exif= ni icc_profile=: Pillow no copia metadatos al guardar
+    imagen.save(salida, formato, **opciones)
+    return salida.getvalue()
+
+
+def limpiar_original(contenido):
+    """Re-codifica el original sin metadatos. Devuelve (bytes, extensión)."""
+    with Image.open(io.BytesIO(contenido)) as original:
+        formato = original.format
+    imagen = _abrir(contenido)
+    if formato == 'PNG':
+        return _codificar(imagen, 'PNG', {'optimize': True}), 'png'
+    if formato == 'WEBP':
+        return _codificar(imagen, 'WEBP', FORMATOS['webp'][1]), 'webp'
+    return _codificar(imagen, 'JPEG', FORMATOS['jpg'][1]), 'jpg'
+
+
+def generar_variantes(contenido):
+    """Devuelve {(variante, ext): bytes} para todas las variantes y formatos."""
+    imagen = _abrir(contenido)
+    if imagen.mode not in ('RGB', 'RGBA'):
+        imagen = imagen.convert('RGBA' if 'transparency' in imagen.info or imagen.mode in ('LA', 'P') else 'RGB')
+    resultado = {}
+    for variante, (ancho, alto, recortar) in VARIANTES.items():
+        if recortar:
+            redimensionada = ImageOps.fit(imagen, (ancho, alto), Image.Resampling.LANCZOS)
+        else:
+            redimensionada = imagen.copy()
+            redimensionada.thumbnail((ancho, alto), Image.Resampling.LANCZOS)
+        for ext, (formato, opciones) in FORMATOS.items():
+            resultado[(variante, ext)] = _codificar(redimensionada, formato, opciones)
+    return resultado
+
+
+def nombre_variante(nombre_original, variante, ext):
+    base, _ = os.path.splitext(nombre_original)
+    return f"{base}__{variante}.{ext}"
+
+
+def procesar_imagen(instancia, campo, nombre_archivo, contenido):
+    """
+    Guarda el original limpio y sus variantes en el storage del campo y actualiza
+    `<campo>_variantes`. No guarda la instancia.
+    """
+    archivo = getattr(instancia, campo)
+    storage = archivo.storage
+    anteriores = getattr(instancia, f'{campo}_variantes') or {}
+
+    olvidar_urls(storage, archivo.name)
+    limpio, ext = limpiar_original(contenido)
+    base, _ = os.path.splitext(os.path.basename(nombre_archivo))
+    archivo.save(f"{base}.{ext}", ContentFile(limpio), save=False)
+
+    variantes = {'origen': archivo.name}
+    for (variante, ext), datos in generar_variantes(contenido).items():
+        guardado = storage.save(nombre_variante(archivo.name, variante, ext), ContentFile(datos))
+        variantes.setdefault(variante, {})[ext] = guardado
+    setattr(instancia, f'{campo}_variantes', variantes)
+
+    # Borrar las variantes de la imagen reemplazada
+    for variante in VARIANTES:
+        for nombre in anteriores.get(variante, {}).values():
+            storage.delete(nombre)
+
+
+# -------------------------------------------------------
+# URLs memoizadas
+# -------------------------------------------------------
+# (storage, nombre del original) -> {(variante, ext): url}. Las entradas se agrupan por
+# original para poder invalidar todas sus variantes juntas; el orden es el de uso (LRU).
+_urls = OrderedDict()
+_urls_lock = threading.Lock()
+
+
+def _nombre_archivo(instancia, campo, variante, ext):
+    archivo = getattr(instancia, campo)
+    if not archivo:
+        return None
+    if variante is None:
+        return archivo.name
+    variantes = getattr(instancia, f'{campo}_variantes') or {}
+    if variantes.get('origen') != archivo.name:
+        return None
+    return variantes.get(variante, {}).get(ext)
+
+
+def _guardar_url(clave, subclave, url):
+    # Llamar con el lock tomado
+    _urls.setdefault(clave, {})[subclave] = url
+    _urls.move_to_end(clave)
+    while len(_urls) > MAX_URLS:
+        _urls.popitem(last=False)
+
+
+def _url_del_storage(storage, nombre):
+    try:
+        return storage.url(nombre)
+    except Exception:
+        # Storage caído o mal configurado (p. ej. Cloudinary sin credenciales): no se memoiza
+        return None
+
+
+def url_imagen(instancia, campo, variante=None, ext='jpg'):
+    """
+    URL del original (`variante=None`) o de una variante ya generada; None si no hay o si
+    el storage no pudo construirla (el llamador usa su respaldo).
+    """
+    nombre = _nombre_archivo(instancia, campo, variante, ext)
+    if not nombre:
+        return None
+    storage = getattr(instancia, campo).storage
+    clave, subclave = (storage, getattr(instancia, campo).name), (variante, ext)
+    with _urls_lock:
+        url = _urls.get(clave, {}).get(subclave)
+        if url is not None:
+            _urls.move_to_end(clave)
+            return url
+    url = _url_del_storage(storage, nombre)
+    if url is None:
+        return None
+    with _urls_lock:
+        _guardar_url(clave, subclave, url)
+    return url
+
+
+def resolver_urls(instancias, campo, variante=None, ext='jpg'):
+    """
+    Resuelve de una vez las URLs de una lista de objetos (p. ej. los avatares de un
+    listado) y las deja memoizadas. Devuelve {pk: url o None}.
+    """
+    resultado, faltantes = {}, []
+    with _urls_lock:
+        for instancia in instancias:
+            nombre = _nombre_archivo(instancia, campo, variante, ext)
+            if not nombre:
+                resultado[instancia.pk] = None
+                continue
+            archivo = getattr(instancia, campo)
+            clave = (archivo.storage, archivo.name)
+            url = _urls.get(clave, {}).get((variante, ext))
+            if url is None:
+                faltantes.append((instancia.pk, clave, archivo.storage, nombre))
+            else:
+                _urls.move_to_end(clave)
+                resultado[instancia.pk] = url
+    resueltas = [(pk, clave, _url_del_storage(storage, nombre)) for pk, clave, storage, nombre in faltantes]
+    with _urls_lock:
+        for pk, clave, url in resueltas:
+            if url is not None:
+                _guardar_url(clave, (variante, ext), url)
+            resultado[pk] = url
+    return resultado
+
+
+def olvidar_urls(storage, nombre):
+    """Descarta las URLs memoizadas de un original y sus variantes."""
+    with _urls_lock:
+        _urls.pop((storage, nombre), None)
+
+
+def limpiar_urls():
+    with _urls_lock:
+        _urls.clear()
@@ -0,0 +1,171 @@
+"""
+Importación masiva de usuarios y servicios desde CSV o JSONL (ver el comando importar).
+
+Cada fila se valida con el mismo formulario que la alta manual (RegistroForm o
+ServicioForm) y las válidas se insertan por lotes con bulk_create, un lote por
+transacción. Como bulk_create no dispara señales, cada lote de servicios hace lo que
+harían core/signals.py: se ubica en el nomenclador, recibe el ranking inicial de su
+categoría (sin valoraciones no mueve el agregado de la categoría), se indexa para la
+búsqueda y queda marcado para `refrescar_similares`; al confirmar se encola esa tarea
+(una sola pendiente) y se invalida la caché de servicios. `al_confirmar` recibe la
+última fila de cada lote confirmado: es el punto desde donde se puede retomar.
+"""
+import csv
+import json
+import os
+import secrets
+import time
+
+from django.db import IntegrityError, transaction
+
+from .cache import invalidar
+from .forms import RegistroForm, ServicioForm
+from .models import Usuario, Servicio
+from .ratings import puntaje_bayesiano, promedios_previos
+from .search import get_backend
+from .tareas import pedir_refresco_similares
+from .ubicaciones import ubicar
+
+LOTE = 500
+TIPOS = ('usuarios', 'servicios')
+FORMATOS = ('csv', 'jsonl')
+
+
+def detectar_formato(ruta):
+    extension = os.path.splitext(ruta)[1].lower().lstrip('.')
+    return 'jsonl' if extension in ('jsonl', 'ndjson', 'json') else 'csv'
+
+
+def leer_filas(ruta, formato=None):
+    """Genera (número de fila, dict) empezando en 1; en CSV la fila 1 es la primera después del encabezado."""
+    formato = formato or detectar_formato(ruta)
+    with open(ruta, encoding='utf-8-sig', newline='') as f:
+        if formato == 'csv':
+            for numero, fila in enumerate(csv.DictReader(f), start=1):
+                yield numero, {clave: (valor or '').strip() for clave, valor in fila.items() if clave}
+        else:
+            for numero, linea in enumerate(f, start=1):
+                if not linea.strip():
+                    continue
+                try:
+                    fila = json.loads(linea)
+                except ValueError as error:
+                    yield numero, {'__error__': f"JSON inválido: {error}"}
+                    continue
+                yield numero, fila if isinstance(fila, dict) else {'__error__': "La línea no es un objeto JSON."}
+
+
+# -------------------------------------------------------
+# Validación por fila: devuelve (objeto sin guardar, None) o (None, errores)
+# -------------------------------------------------------
+def _usuario(fila, contexto):
+    clave = fila.get('password') or ''
+    datos = {**fila, 'password1': clave, 'password2': clave}
+    if not clave:
+        # Sin contraseña: se valida con una al azar y la cuenta queda sin contraseña utilizable
+        datos['password1'] = datos['password2'] = secrets.token_urlsafe(16)
+    form = RegistroForm(data=datos)
+    if not form.is_valid():
+        return None, form.errors.get_json_data()
+    username = form.cleaned_data['username'].lower()
+    if username in contexto['usernames']:
+        return None, {'username': [{'message': "Repetido en el archivo.", 'code': 'duplicado'}]}
+    contexto['usernames'].add(username)
+    usuario = form.save(commit=False)
+    if not clave:
+        usuario.set_unusable_password()
+    return usuario, None
+
+
+def _servicio(fila, contexto):
+    dueno = contexto['duenos'].get(fila.get('usuario') or '')
+    if dueno is None:
+        return None, {'usuario': [{'message': "No existe un usuario con ese nombre.", 'code': 'invalido'}]}
+    form = ServicioForm(data=fila)
+    if not form.is_valid():
+        return None, form.errors.get_json_data()
+    servicio = form.save(commit=False)
+    servicio.user = dueno
+    servicio.ranking = puntaje_bayesiano(0, 0, contexto['previos'][servicio.category])
+    servicio.similares_pendientes = True
+    return servicio, None
+
+
+def _preparar_lote(tipo, filas, contexto):
+    if tipo == 'servicios':
+        if 'previos' not in contexto:
+            contexto['previos'] = promedios_previos()
+        nombres = {fila.get('usuario') for _, fila in filas if fila.get('usuario')}
+        contexto['duenos'] = Usuario.objects.in_bulk(nombres, field_name='username') if nombres else {}
+
+
+def _insertar(modelo, objetos):
+    """bulk_create del lote; si choca con filas creadas mientras tanto, inserta de a una."""
+    try:
+        with transaction.atomic():
+            return modelo.objects.bulk_create([obj for _, obj in objetos]), []
+    except IntegrityError:
+        creados, errores = [], []
+        for numero, obj in objetos:
+            try:
+                with transaction.atomic():
+                    obj.save()
+                creados.append(obj)
+            except IntegrityError as error:
+                errores.append((numero, {'__all__': [{'message': str(error), 'code': 'integridad'}]}))
+        return creados, errores
+
+
+def importar(tipo, filas, lote=LOTE, al_error=None, al_confirmar=None):
+    """
+    Importa las filas ((número, dict)) de `tipo` ('usuarios' o 'servicios') y devuelve
+    {'filas', 'creados', 'errores', 'segundos', 'filas_por_segundo'}.
+    """
+    modelo, validar = (Usuario, _usuario) if tipo == 'usuarios' else (Servicio, _servicio)
+    contexto = {'usernames': set(), 'duenos': {}, 'localidades': {}}
+    resumen = {'filas': 0, 'creados': 0, 'errores': 0}
+    inicio = time.perf_counter()
+
+    def error(numero, errores):
+        resumen['errores'] += 1
+        if al_error:
+            al_error(numero, errores)
+
+    def procesar(pendientes):
+        _preparar_lote(tipo, pendientes, contexto)
+        objetos = []
+        for numero, fila in pendientes:
+            if '__error__' in fila:
+                error(numero, {'__all__': [{'message': fila['__error__'], 'code': 'formato'}]})
+                continue
+            obj, errores = validar(fila, contexto)
+            if errores:
+                error(numero, errores)
+                continue
+            ubicar(obj, memo=contexto['localidades'])
+            objetos.append((numero, obj))
+        with transaction.atomic():
+            creados, fallidos = _insertar(modelo, objetos)
+            if modelo is Servicio and creados:
+                get_backend().indexar_varios([servicio.pk for servicio in creados])
+                transaction.on_commit(pedir_refresco_similares)
+                transaction.on_commit(lambda: invalidar('servicios'))
+        for numero, errores in fallidos:
+            error(numero, errores)
+        resumen['filas'] += len(pendientes)
+        resumen['creados'] += len(creados)
+        if al_confirmar:
+            al_confirmar(pendientes[-1][0], dict(resumen))
+
+    pendientes = []
+    for numero, fila in filas:
+        pendientes.append((numero, fila))
+        if len(pendientes) >= lote:
+            procesar(pendientes)
+            pendientes = []
+    if pendientes:
+        procesar(pendientes)
+
+    resumen['segundos'] = round(time.perf_counter() - inicio, 3)
+    resumen['filas_por_segundo'] = round(resumen['filas'] / resumen['segundos'], 1) if resumen['segundos'] else 0.0
+    return resumen
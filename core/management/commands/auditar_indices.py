@@ -0,0 +1,111 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.conversaciones import conversaciones_de
+from core.models import Usuario, Servicio, Mensaje, Valoracion, Notificacion, Tarea
+from core.search import buscar_servicios
+from core.ubicaciones import cercanos
+
+ESCANEO = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    # "SCAN tabla" recorre toda la tabla. No cuentan las tablas virtuales (FTS5), que tienen
+    # su propio índice, ni "SCAN tabla USING [COVERING] INDEX", que recorre un índice en orden
+    'sqlite': re.compile(r'\bSCAN (\w+)\b(?! VIRTUAL TABLE| USING (?:COVERING )?INDEX)'),
+}
+ORDEN_EN_MEMORIA = {
+    'postgresql': re.compile(r'\bSort\b'),
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR ORDER BY'),
+}
+
+
+def consultas_de_vistas():
+    """(vista, descripción, queryset) con las consultas principales de cada vista."""
+    usuario = Usuario.objects.filter(services__isnull=False).first() or Usuario(pk=1)
+    otro = Usuario.objects.exclude(pk=usuario.pk).first() or Usuario(pk=2)
+    servicios_ids = list(usuario.services.values_list('id', flat=True)[:20]) or [0]
+    conversacion = Mensaje.objects.filter(
+        Q(sender=usuario, receiver=otro) | Q(sender=otro, receiver=usuario)
+    )
+    ahora = timezone.now()
+    return [
+        ('services', "listado", Servicio.objects.order_by('-id')[:7]),
+        ('services', "por categoría", Servicio.objects.filter(category='hogar').order_by('-id')[:7]),
+        ('services', "por ubicación", Servicio.objects.filter(location__icontains='rosario').order_by('-id')[:7]),
+        ('services', "mejor valorados", Servicio.objects.order_by('-ranking', '-id')[:7]),
+        ('services', "mejor valorados por categoría",
+            Servicio.objects.filter(category='hogar').order_by('-ranking', '-id')[:7]),
+        ('services', "búsqueda", buscar_servicios(Servicio.objects.all(), 'clases')[:6]),
+        ('services', "cercanos", cercanos(Servicio.objects.all(), -34.5889, -58.4306, 25).order_by('distancia', 'id')[:6]),
+        ('profile', "servicios del usuario", Servicio.objects.filter(user=usuario).order_by('id')),
+        ('profile', "comentarios", Valoracion.objects.filter(servicio_id__in=servicios_ids)
+            .exclude(comentario='').order_by('created_at')),
+        ('chat', "últimos mensajes", conversacion.order_by('-timestamp', '-id')[:51]),
+        ('chat', "mensajes nuevos", conversacion.filter(
+            Q(timestamp__gt=ahora) | Q(timestamp=ahora, id__gt=0)).order_by('timestamp', 'id')[:51]),
+        ('bandeja', "conversaciones", conversaciones_de(usuario).order_by('-ultima_fecha', '-id')[:21]),
+        ('notificaciones', "listado", Notificacion.objects.filter(receptor=usuario).order_by('-fecha', '-id')[:21]),
+        ('notificaciones', "no leídas", Notificacion.objects.filter(receptor=usuario, leida=False)),
+        ('procesar_tareas', "tareas listas", Tarea.objects.filter(
+            Q(estado=Tarea.PENDIENTE) | Q(estado=Tarea.EN_CURSO), ejecutar_desde__lte=ahora,
+        ).order_by('ejecutar_desde', 'id')[:100]),
+        ('valorar_servicio', "dueño del servicio", Usuario.objects.filter(services__pk=servicios_ids[0])),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Corre EXPLAIN sobre las consultas principales de cada vista contra la base configurada "
+        "e informa recorridos secuenciales y ordenamientos en memoria."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plan', action='store_true', help="Muestra el plan completo de cada consulta.")
+        parser.add_argument(
+            '--fallar', action='store_true',
+            help="Termina con error si alguna consulta recorre una tabla completa.",
+        )
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in ESCANEO:
+            raise CommandError(f"Motor no soportado: {vendor}")
+
+        problemas = 0
+        with transaction.atomic():
+            if vendor == 'postgresql':
+                # Con tablas chicas el planificador prefiere Seq Scan aunque haya índice:
+                # desalentarlo muestra si existe un índice utilizable.
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            for vista, descripcion, queryset in consultas_de_vistas():
+                plan = queryset.explain()
+                escaneos = sorted(set(ESCANEO[vendor].findall(plan)))
+                en_memoria = bool(ORDEN_EN_MEMORIA[vendor].search(plan))
+                con_limite = queryset.query.high_mark is not None
+
+                if escaneos and con_limite and not en_memoria:
+                    # Recorre la tabla en el orden pedido y corta en el LIMIT (p. ej. por PK)
+                    estado, estilo = 'LIMIT', self.style.WARNING
+                elif escaneos:
+                    estado, estilo = 'SCAN', self.style.ERROR
+                    problemas += 1
+                else:
+                    estado, estilo = 'OK', self.style.SUCCESS
+                detalle = []
+                if escaneos:
+                    detalle.append(f"recorre {', '.join(escaneos)}")
+                if en_memoria:
+                    detalle.append("ordena en memoria")
+                self.stdout.write(estilo(f"[{estado:>5}] {vista} · {descripcion}") + (
+                    f": {'; '.join(detalle)}" if detalle else ""
+                ))
+                if options['plan']:
+                    self.stdout.write('    ' + plan.replace('\n', '\n    '))
+            transaction.set_rollback(True)
+
+        if problemas and options['fallar']:
+            raise CommandError(f"{problemas} consultas recorren tablas completas.")
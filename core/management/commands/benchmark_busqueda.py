@@ -0,0 +1,70 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.benchmark import CATEGORIAS, PALABRAS, PROFESIONES, UBICACIONES, percentil
+from core.models import Usuario, Servicio
+from core.search import buscar_servicios, get_backend
+
+# Relleno para que las palabras buscadas tengan una selectividad realista
+VOCABULARIO = PALABRAS + [f"termino{i}" for i in range(2000)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara la latencia de la búsqueda de servicios por índice de texto contra el "
+        "filtro icontains anterior, sobre servicios sintéticos (se descartan al terminar)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servicios', type=int, default=100_000)
+        parser.add_argument('--consultas', type=int, default=200)
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['semilla'])
+        with transaction.atomic():
+            self.generar(rnd, options['servicios'])
+            terminos = [rnd.choice(PALABRAS) for _ in range(options['consultas'])]
+
+            base = Servicio.objects.all()
+            caminos = {
+                'icontains': lambda t: base.filter(title__icontains=t),
+                type(get_backend()).__name__: lambda t: buscar_servicios(base, t),
+            }
+            for nombre, consulta in caminos.items():
+                tiempos = []
+                for termino in terminos:
+                    inicio = time.perf_counter()
+                    # Lo mismo que hace el listado: contar y traer una página
+                    qs = consulta(termino)
+                    qs.count()
+                    list(qs[:6])
+                    tiempos.append((time.perf_counter() - inicio) * 1000)
+                self.stdout.write(
+                    f"{nombre:>16}: p50={statistics.median(tiempos):.2f}ms "
+                    f"p95={percentil(tiempos, 95):.2f}ms max={max(tiempos):.2f}ms"
+                )
+            transaction.set_rollback(True)
+
+    def generar(self, rnd, cantidad):
+        self.stdout.write(f"Generando {cantidad} servicios sintéticos...")
+        usuario = Usuario.objects.create(username=f"benchmark-{rnd.random()}")
+        lote = []
+        for i in range(cantidad):
+            lote.append(Servicio(
+                user=usuario,
+                title=' '.join(rnd.sample(VOCABULARIO, 3)).capitalize(),
+                description=' '.join(rnd.choices(VOCABULARIO, k=20)),
+                category=rnd.choice(CATEGORIAS),
+                profession=rnd.choice(PROFESIONES),
+                location=rnd.choice(UBICACIONES),
+            ))
+            if len(lote) == 5000:
+                Servicio.objects.bulk_create(lote)
+                lote = []
+        Servicio.objects.bulk_create(lote)
+        get_backend().reindexar()
@@ -0,0 +1,123 @@
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from importlib import import_module
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import Client
+
+from core.benchmark import percentil
+from core.models import Usuario
+
+# Variables de entorno de cada modo (ver DATABASES en helptime/settings.py)
+MODOS = {
+    'sin_reutilizar': {'DB_CONN_MAX_AGE': '0', 'DB_POOL': '0'},
+    'persistente': {'DB_CONN_MAX_AGE': '60', 'DB_POOL': '0'},
+    'pool': {'DB_CONN_MAX_AGE': '0', 'DB_POOL': '1'},
+}
+
+
+def _pool_disponible():
+    try:
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        return False
+    return connection.vendor == 'postgresql'
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara la latencia de requests reales (handler WSGI completo, con señales de inicio "
+        "y fin de request) abriendo una conexión por request, reutilizándola (CONN_MAX_AGE) "
+        "y con el pool de psycopg. Cada modo corre en un subproceso con su configuración."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300)
+        parser.add_argument('--url', default='/notificaciones/', help="URL a pedir (con sesión iniciada).")
+        parser.add_argument('--modos', nargs='+', choices=list(MODOS), default=list(MODOS))
+        # Uso interno: mide en este proceso e imprime el resultado en JSON
+        parser.add_argument('--medir', action='store_true', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['medir']:
+            self.stdout.write(json.dumps(self.medir(options['url'], options['requests'])))
+            return
+
+        self.stdout.write(f"Motor: {connection.vendor}, {options['requests']} requests a {options['url']}")
+        for modo in options['modos']:
+            if modo == 'pool' and not _pool_disponible():
+                self.stdout.write(f"{modo:>15}: omitido (requiere PostgreSQL y psycopg_pool)")
+                continue
+            proceso = subprocess.run(
+                [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'benchmark_conexiones',
+                 '--medir', '--requests', str(options['requests']), '--url', options['url']],
+                env={**os.environ, **MODOS[modo]},
+                capture_output=True,
+                text=True,
+            )
+            if proceso.returncode:
+                raise CommandError(f"Falló el modo {modo}:\n{proceso.stderr}")
+            r = json.loads(proceso.stdout.strip().splitlines()[-1])
+            self.stdout.write(
+                f"{modo:>15}: p50={r['p50_ms']:.2f}ms p95={r['p95_ms']:.2f}ms "
+                f"{r['requests_por_segundo']:.0f} req/s, conexiones nuevas={r['conexiones_nuevas']} "
+                f"estados={r['estados']}"
+            )
+
+    def medir(self, url, cantidad):
+        usuario = Usuario.objects.create_user(username=f"bench-conexiones-{uuid.uuid4().hex[:8]}")
+        client = Client()
+        client.force_login(usuario)
+        sesion = client.cookies[settings.SESSION_COOKIE_NAME].value
+
+        aperturas = []
+        def contar(sender, connection, **kwargs):
+            aperturas.append(connection.alias)
+        connection_created.connect(contar)
+
+        handler = WSGIHandler()
+        tiempos, estados = [], set()
+        try:
+            for _ in range(cantidad):
+                environ = {
+                    'REQUEST_METHOD': 'GET',
+                    'PATH_INFO': url,
+                    'QUERY_STRING': '',
+                    'SERVER_NAME': 'localhost',
+                    'SERVER_PORT': '443',
+                    'SERVER_PROTOCOL': 'HTTP/1.1',
+                    'HTTP_HOST': 'localhost',
+                    'HTTP_COOKIE': f"{settings.SESSION_COOKIE_NAME}={sesion}",
+                    'HTTPS': 'on',
+                    'wsgi.url_scheme': 'https',
+                    'wsgi.input': io.BytesIO(),
+                    'wsgi.errors': sys.stderr,
+                }
+                inicio = time.perf_counter()
+                resultado = handler(environ, lambda status, headers, exc_info=None: estados.add(status))
+                b''.join(resultado)
+                resultado.close()  # dispara request_finished: ahí se cierra o se devuelve la conexión
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+        finally:
+            connection_created.disconnect(contar)
+            import_module(settings.SESSION_ENGINE).SessionStore(session_key=sesion).delete()
+            usuario.delete()
+
+        return {
+            'p50_ms': round(statistics.median(tiempos), 2),
+            'p95_ms': round(percentil(tiempos, 95), 2),
+            'requests_por_segundo': round(len(tiempos) / (sum(tiempos) / 1000), 1),
+            'conexiones_nuevas': len(aperturas),
+            'estados': sorted(estados),
+        }
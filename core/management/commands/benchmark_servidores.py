@@ -0,0 +1,128 @@
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from core.benchmark import percentil
+from core.models import Usuario
+
+# Comando de cada modo (ver Procfile y helptime/asgi.py)
+SERVIDORES = {
+    'wsgi': lambda puerto, workers: [
+        sys.executable, '-m', 'gunicorn', 'helptime.wsgi:application',
+        '--bind', f'127.0.0.1:{puerto}', '--workers', str(workers), '--log-level', 'warning',
+    ],
+    'asgi': lambda puerto, workers: [
+        sys.executable, '-m', 'daphne', '-b', '127.0.0.1', '-p', str(puerto), '-v', '0',
+        'helptime.asgi:application',
+    ],
+}
+ESPERA_INICIO = 30
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _esperar(proceso, puerto):
+    limite = time.monotonic() + ESPERA_INICIO
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise CommandError(f"El servidor terminó al iniciar:\n{proceso.stderr.read().decode()}")
+        try:
+            socket.create_connection(('127.0.0.1', puerto), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise CommandError(f"El servidor no respondió en {ESPERA_INICIO}s.")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el throughput con requests concurrentes entre el servidor WSGI (gunicorn, "
+        "workers síncronos) y el ASGI (daphne con helptime/asgi.py). Levanta cada servidor "
+        "en un puerto local contra la base configurada y le pega con --concurrencia clientes "
+        "con sesión iniciada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/services/', help="URL a pedir (con sesión iniciada).")
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--concurrencia', type=int, default=20)
+        parser.add_argument('--workers', type=int, default=1, help="Workers de gunicorn en modo wsgi.")
+        parser.add_argument('--modos', nargs='+', choices=list(SERVIDORES), default=list(SERVIDORES))
+
+    def handle(self, *args, **options):
+        usuario = Usuario.objects.create_user(username=f"bench-servidores-{uuid.uuid4().hex[:8]}")
+        client = Client()
+        client.force_login(usuario)
+        sesion = client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.stdout.write(
+            f"{options['requests']} requests a {options['url']}, concurrencia {options['concurrencia']}"
+        )
+        try:
+            for modo in options['modos']:
+                r = self.medir(modo, options, sesion)
+                self.stdout.write(
+                    f"{modo:>5}: {r['requests_por_segundo']:.0f} req/s p50={r['p50_ms']:.1f}ms "
+                    f"p95={r['p95_ms']:.1f}ms estados={r['estados']}"
+                )
+        finally:
+            import_module(settings.SESSION_ENGINE).SessionStore(session_key=sesion).delete()
+            usuario.delete()
+
+    def medir(self, modo, options, sesion):
+        puerto = _puerto_libre()
+        proceso = subprocess.Popen(
+            SERVIDORES[modo](puerto, options['workers']),
+            cwd=settings.BASE_DIR,
+            env=os.environ.copy(),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        try:
+            _esperar(proceso, puerto)
+            encabezados = {'Host': 'localhost', 'Cookie': f"{settings.SESSION_COOKIE_NAME}={sesion}"}
+
+            def pedir(_):
+                conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=60)
+                inicio = time.perf_counter()
+                try:
+                    conexion.request('GET', options['url'], headers=encabezados)
+                    respuesta = conexion.getresponse()
+                    respuesta.read()
+                    return (time.perf_counter() - inicio) * 1000, respuesta.status
+                finally:
+                    conexion.close()
+
+            with ThreadPoolExecutor(options['concurrencia']) as pool:
+                list(pool.map(pedir, range(options['concurrencia'])))  # calentar
+                inicio = time.perf_counter()
+                resultados = list(pool.map(pedir, range(options['requests'])))
+                total = time.perf_counter() - inicio
+        finally:
+            proceso.terminate()
+            try:
+                proceso.wait(10)
+            except subprocess.TimeoutExpired:
+                proceso.kill()
+
+        tiempos = [ms for ms, _ in resultados]
+        return {
+            'requests_por_segundo': round(len(resultados) / total, 1),
+            'p50_ms': round(statistics.median(tiempos), 2),
+            'p95_ms': round(percentil(tiempos, 95), 2),
+            'estados': sorted({estado for _, estado in resultados}),
+        }
@@ -0,0 +1,115 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.benchmark import comparar, generar_datos, medir
+
+# Caché propia del benchmark: no ensucia la real con datos que se descartan al final
+CACHE_BENCHMARK = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide latencia (p50/p95) y cantidad de consultas de las vistas principales sobre "
+        "datos sintéticos (se descartan al terminar). Con --salida guarda la línea base en "
+        "JSON y con --comparar falla si hay regresiones respecto de otra."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=200)
+        parser.add_argument('--servicios', type=int, default=1000)
+        parser.add_argument('--valoraciones', type=int, default=3000)
+        parser.add_argument('--mensajes', type=int, default=5000)
+        parser.add_argument('--notificaciones', type=int, default=2000)
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--salida', help="Archivo JSON donde guardar los resultados.")
+        parser.add_argument('--comparar', help="JSON de una corrida anterior para detectar regresiones.")
+        parser.add_argument(
+            '--tolerancia', type=float, default=0.25,
+            help="Aumento de p95 tolerado respecto de --comparar (fracción, 0.25 = 25%%).",
+        )
+        parser.add_argument(
+            '--minimo-ms', type=float, default=2.0,
+            help="Aumento absoluto de p95 por debajo del cual no se informa regresión.",
+        )
+
+    def handle(self, *args, **options):
+        if options['usuarios'] < 2:
+            raise CommandError("Se necesitan al menos 2 usuarios.")
+        rnd = random.Random(options['semilla'])
+        with override_settings(ALLOWED_HOSTS=['testserver'], CACHES=CACHE_BENCHMARK), transaction.atomic():
+            self.stdout.write("Generando datos sintéticos...")
+            datos = generar_datos(
+                rnd,
+                usuarios=options['usuarios'],
+                servicios=options['servicios'],
+                valoraciones=options['valoraciones'],
+                mensajes=options['mensajes'],
+                notificaciones=options['notificaciones'],
+            )
+            vistas = self.medir_vistas(datos, options['repeticiones'])
+            transaction.set_rollback(True)
+
+        resultado = {
+            'meta': {
+                'fecha': timezone.now().isoformat(),
+                'motor': connection.vendor,
+                'repeticiones': options['repeticiones'],
+                'volumen': {
+                    clave: options[clave]
+                    for clave in ('usuarios', 'servicios', 'valoraciones', 'mensajes', 'notificaciones')
+                },
+            },
+            'vistas': vistas,
+        }
+        for nombre, medida in vistas.items():
+            self.stdout.write(
+                f"{nombre:>22}: p50={medida['p50_ms']:.2f}ms p95={medida['p95_ms']:.2f}ms "
+                f"primera={medida['primera_ms']:.2f}ms consultas={medida['consultas']} "
+                f"(primera {medida['consultas_primera']})"
+            )
+        if options['salida']:
+            with open(options['salida'], 'w') as f:
+                json.dump(resultado, f, indent=2, sort_keys=True)
+            self.stdout.write(f"Resultados guardados en {options['salida']}")
+
+        if options['comparar']:
+            with open(options['comparar']) as f:
+                base = json.load(f)
+            if base.get('meta', {}).get('volumen') != resultado['meta']['volumen']:
+                self.stdout.write(self.style.WARNING("La línea base se generó con otro volumen de datos."))
+            regresiones = comparar(base, resultado, options['tolerancia'], options['minimo_ms'])
+            if regresiones:
+                for linea in regresiones:
+                    self.stdout.write(self.style.ERROR(linea))
+                raise CommandError(f"{len(regresiones)} regresiones respecto de {options['comparar']}")
+            self.stdout.write(self.style.SUCCESS("Sin regresiones."))
+
+    def medir_vistas(self, datos, repeticiones):
+        a, b = datos['usuarios'][0], datos['usuarios'][1]
+        client = Client()
+        client.force_login(a)
+        escenarios = {
+            'home': ('get', reverse('home'), None),
+            'services': ('get', reverse('services'), None),
+            'services_categoria': ('get', reverse('services'), {'category': 'hogar'}),
+            'services_top': ('get', reverse('services'), {'sort': 'top'}),
+            'services_busqueda': ('get', reverse('services'), {'search': 'clases guitarra'}),
+            'services_cerca': ('get', reverse('services'), {'cerca': 'Palermo', 'radio': '25'}),
+            'profile': ('get', reverse('profile', args=[a.id]), None),
+            'chat': ('get', reverse('chat', args=[b.id]), None),
+            'bandeja': ('get', reverse('bandeja'), None),
+            'send_message': ('post', reverse('send_message', args=[b.id]), {'message': "Hola, ¿sigue disponible?"}),
+            'notificaciones': ('get', reverse('notificaciones'), None),
+        }
+        resultados = {}
+        for nombre, (metodo, url, parametros) in escenarios.items():
+            self.stdout.write(f"Midiendo {nombre}...")
+            resultados[nombre] = medir(client, metodo, url, repeticiones, parametros)
+        return resultados
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.recomendaciones import K, LOTE, recalcular_todo
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula los servicios similares de todo el catálogo (vectores TF-IDF y sus K "
+        "vecinos más cercanos). Al guardar un servicio, la tarea refrescar_similares "
+        "actualiza solo ese; esto lo pone todo al día (p. ej. tras cargas con bulk_create)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=K, help="Vecinos a guardar por servicio.")
+        parser.add_argument('--lote', type=int, default=LOTE, help="Servicios por transacción.")
+
+    def handle(self, *args, **options):
+        cantidad = recalcular_todo(k=options['k'], lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"Similares recalculados para {cantidad} servicios."))
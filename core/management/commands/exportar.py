@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from core.exportacion import EXPORTABLES, FORMATOS, lineas
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta servicios, valoraciones, mensajes o notificaciones en CSV o JSONL, "
+        "leyendo por lotes: la memoria no crece con la cantidad de filas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('nombre', choices=list(EXPORTABLES))
+        parser.add_argument('--formato', choices=FORMATOS, default='csv')
+        parser.add_argument('--salida', help="Archivo de destino (por defecto, la salida estándar).")
+        parser.add_argument('--desde-id', type=int, help="Solo filas con id mayor (para retomar).")
+
+    def handle(self, *args, **options):
+        generador = lineas(options['nombre'], options['formato'], options['desde_id'])
+        if not options['salida']:
+            for linea in generador:
+                self.stdout.write(linea, ending='')
+            return
+        cantidad = 0
+        with open(options['salida'], 'w', encoding='utf-8', newline='') as f:
+            for linea in generador:
+                f.write(linea)
+                cantidad += 1
+        if options['formato'] == 'csv':
+            cantidad -= 1
+        self.stdout.write(self.style.SUCCESS(f"{cantidad} filas exportadas a {options['salida']}."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.cache import invalidar
+from core.models import Usuario, Servicio
+from core.ubicaciones import geocodificar_todos
+
+
+class Command(BaseCommand):
+    help = (
+        "Asigna localidad y coordenadas a servicios y usuarios según su ubicación en texto "
+        "libre, con el nomenclador local core/data/localidades.csv. Necesario después de "
+        "cargas masivas (bulk_create no dispara señales) o de ampliar el nomenclador."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pendientes', action='store_true',
+            help="Solo las filas que todavía no tienen localidad.",
+        )
+
+    def handle(self, *args, **options):
+        for modelo in (Servicio, Usuario):
+            ubicadas, sin_ubicar = geocodificar_todos(modelo, solo_pendientes=options['pendientes'])
+            self.stdout.write(f"{modelo.__name__}: {ubicadas} ubicados, {sin_ubicar} sin localidad reconocida.")
+        invalidar('servicios')
+        self.stdout.write(self.style.SUCCESS("Ubicaciones actualizadas."))
@@ -0,0 +1,79 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.cache import invalidar
+from core.importacion import FORMATOS, LOTE, TIPOS, importar, leer_filas
+
+ERRORES_EN_PANTALLA = 10
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa usuarios o servicios desde un archivo CSV o JSONL. Valida cada fila con "
+        "RegistroForm / ServicioForm, inserta por lotes (una transacción por lote) y guarda "
+        "un checkpoint después de cada lote para retomar con --reanudar. Columnas: las del "
+        "formulario; usuarios admite 'password' (sin ella la cuenta queda sin contraseña "
+        "utilizable) y servicios requiere 'usuario' (nombre de usuario del dueño)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=TIPOS)
+        parser.add_argument('archivo')
+        parser.add_argument('--formato', choices=FORMATOS, help="Por defecto, según la extensión.")
+        parser.add_argument('--lote', type=int, default=LOTE)
+        parser.add_argument('--errores', help="Archivo JSONL con los errores de cada fila rechazada.")
+        parser.add_argument('--checkpoint', help="Archivo de checkpoint (por defecto <archivo>.checkpoint).")
+        parser.add_argument('--reanudar', action='store_true', help="Saltea las filas ya confirmadas según el checkpoint.")
+
+    def handle(self, *args, **options):
+        archivo = options['archivo']
+        if not os.path.exists(archivo):
+            raise CommandError(f"No existe {archivo}")
+        if options['lote'] < 1:
+            raise CommandError("--lote debe ser mayor que 0.")
+        checkpoint = options['checkpoint'] or f"{archivo}.checkpoint"
+
+        desde = 0
+        if options['reanudar'] and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                estado = json.load(f)
+            if estado.get('tipo') != options['tipo'] or estado.get('archivo') != os.path.abspath(archivo):
+                raise CommandError(f"El checkpoint {checkpoint} corresponde a otra importación.")
+            desde = estado['fila']
+            self.stdout.write(f"Retomando después de la fila {desde}.")
+
+        filas = ((numero, fila) for numero, fila in leer_filas(archivo, options['formato']) if numero > desde)
+        errores = open(options['errores'], 'a', encoding='utf-8') if options['errores'] else None
+        mostrados = 0
+
+        def al_error(numero, detalle):
+            nonlocal mostrados
+            if errores:
+                errores.write(json.dumps({'fila': numero, 'errores': detalle}, ensure_ascii=False) + '\n')
+            if mostrados < ERRORES_EN_PANTALLA:
+                mensajes = '; '.join(
+                    f"{campo}: {' '.join(e['message'] for e in lista)}" for campo, lista in detalle.items()
+                )
+                self.stdout.write(self.style.WARNING(f"Fila {numero}: {mensajes}"))
+                mostrados += 1
+
+        def al_confirmar(fila, parcial):
+            with open(checkpoint, 'w') as f:
+                json.dump({'archivo': os.path.abspath(archivo), 'tipo': options['tipo'], 'fila': fila}, f)
+            self.stdout.write(f"Fila {fila}: {parcial['creados']} creados, {parcial['errores']} con errores.")
+
+        try:
+            resumen = importar(options['tipo'], filas, options['lote'], al_error, al_confirmar)
+        finally:
+            if errores:
+                errores.close()
+
+        if options['tipo'] == 'servicios' and resumen['creados']:
+            invalidar('servicios')
+            invalidar('paginas')
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumen['filas']} filas en {resumen['segundos']:.1f}s ({resumen['filas_por_segundo']:.0f} filas/s): "
+            f"{resumen['creados']} creados, {resumen['errores']} con errores."
+        ))
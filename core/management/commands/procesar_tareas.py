@@ -0,0 +1,41 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.tareas import ejecutar, tomar_tareas
+
+
+class Command(BaseCommand):
+    help = "Worker de la cola de tareas: ejecuta notificaciones y subidas de imágenes pendientes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrencia', type=int, default=settings.TAREAS_CONCURRENCIA,
+            help="Cantidad de tareas ejecutadas en paralelo (hilos).",
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=1.0,
+            help="Segundos de espera cuando no hay tareas pendientes.",
+        )
+        parser.add_argument(
+            '--una-vez', action='store_true',
+            help="Procesa lo pendiente y termina (útil para cron o pruebas locales).",
+        )
+
+    def handle(self, *args, **options):
+        concurrencia = max(1, options['concurrencia'])
+        self.stdout.write(f"Procesando tareas con concurrencia {concurrencia}...")
+        with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            while True:
+                tomadas = tomar_tareas(concurrencia)
+                resultados = list(pool.map(ejecutar, tomadas))
+                if resultados:
+                    self.stdout.write(
+                        f"{resultados.count(True)} completadas, {resultados.count(False)} con error."
+                    )
+                if not tomadas:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['intervalo'])
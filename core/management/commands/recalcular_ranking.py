@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.ratings import recalcular_ranking
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula los promedios por categoría y el ranking bayesiano de todos los servicios "
+        "a partir de sus agregados de valoraciones."
+    )
+
+    def handle(self, *args, **options):
+        servicios = recalcular_ranking()
+        self.stdout.write(self.style.SUCCESS(f"Ranking recalculado para {servicios} servicios."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from core.ratings import recalcular_agregados
+
+
+class Command(BaseCommand):
+    help = "Recalcula desde cero los agregados de valoraciones de servicios y usuarios."
+
+    def handle(self, *args, **options):
+        servicios, usuarios = recalcular_agregados()
+        self.stdout.write(self.style.SUCCESS(
+            f"Agregados recalculados: {servicios} servicios, {usuarios} usuarios."
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.conversaciones import reconstruir
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye la bandeja de entrada (Conversacion) a partir de los mensajes existentes. "
+        "Conserva los contadores de no leídos de las conversaciones que ya existían."
+    )
+
+    def handle(self, *args, **options):
+        total = reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"Conversaciones reconstruidas: {total}."))
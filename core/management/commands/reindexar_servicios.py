@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de búsqueda de servicios (necesario tras cargas con bulk_create)."
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        with transaction.atomic():
+            backend.reindexar()
+        self.stdout.write(self.style.SUCCESS(f"Índice reconstruido ({type(backend).__name__})."))
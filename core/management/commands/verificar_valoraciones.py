@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ratings import recalcular_agregados, verificar_agregados
+
+
+class Command(BaseCommand):
+    help = "Verifica que los agregados de valoraciones coincidan con las valoraciones guardadas."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reparar', action='store_true',
+            help="Recalcula todos los agregados si se encuentran inconsistencias.",
+        )
+
+    def handle(self, *args, **options):
+        inconsistencias = verificar_agregados()
+        if not inconsistencias:
+            self.stdout.write(self.style.SUCCESS("Agregados consistentes."))
+            return
+
+        for obj, guardado, real in inconsistencias:
+            self.stdout.write(
+                f"{obj._meta.verbose_name} #{obj.pk} ({obj}): "
+                f"guardado suma={guardado[0]} cantidad={guardado[1]}, "
+                f"real suma={real[0]} cantidad={real[1]}"
+            )
+
+        if options['reparar']:
+            recalcular_agregados()
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(inconsistencias)} inconsistencias reparadas."
+            ))
+            return
+        raise CommandError(f"{len(inconsistencias)} inconsistencias encontradas.")
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:21
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def calcular_agregados(apps, schema_editor):
+    Servicio = apps.get_model('core', 'Servicio')
+    Usuario = apps.get_model('core', 'Usuario')
+    Valoracion = apps.get_model('core', 'Valoracion')
+
+    por_servicio = Valoracion.objects.values('servicio_id').annotate(s=Sum('puntuacion'), c=Count('id'))
+    for fila in por_servicio:
+        Servicio.objects.filter(pk=fila['servicio_id']).update(rating_sum=fila['s'], rating_count=fila['c'])
+
+    por_usuario = Valoracion.objects.values('servicio__user_id').annotate(s=Sum('puntuacion'), c=Count('id'))
+    for fila in por_usuario:
+        Usuario.objects.filter(pk=fila['servicio__user_id']).update(rating_sum=fila['s'], rating_count=fila['c'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_notificacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicio',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='servicio',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(calcular_agregados, migrations.RunPython.noop),
+    ]
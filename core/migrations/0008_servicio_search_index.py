@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:02
+
+from django.db import migrations
+
+
+DOCUMENTO_PG = (
+    "setweight(to_tsvector('spanish', coalesce(s.title, '')), 'A') || "
+    "setweight(to_tsvector('spanish', coalesce(s.profession, '')), 'B') || "
+    "setweight(to_tsvector('spanish', coalesce(s.description, '')), 'C') || "
+    "setweight(to_tsvector('spanish', coalesce(s.location, '')), 'D')"
+)
+
+
+def crear_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            "CREATE TABLE core_servicio_busqueda ("
+            "servicio_id bigint PRIMARY KEY REFERENCES core_servicio (id) ON DELETE CASCADE, "
+            "documento tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX core_servicio_busqueda_gin ON core_servicio_busqueda USING gin (documento)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX core_servicio_title_trgm ON core_servicio USING gin (title gin_trgm_ops)"
+        )
+        schema_editor.execute(
+            f"INSERT INTO core_servicio_busqueda (servicio_id, documento) "
+            f"SELECT s.id, {DOCUMENTO_PG} FROM core_servicio s"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE core_servicio_fts USING fts5("
+            "title, profession, description, location, "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO core_servicio_fts (rowid, title, profession, description, location) "
+            "SELECT id, title, profession, description, location FROM core_servicio"
+        )
+
+
+def borrar_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS core_servicio_title_trgm")
+        schema_editor.execute("DROP TABLE IF EXISTS core_servicio_busqueda")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS core_servicio_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
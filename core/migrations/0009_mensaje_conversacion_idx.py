@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_servicio_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mensaje',
+            index=models.Index(fields=['sender', 'receiver', 'timestamp'], name='mensaje_conversacion_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_mensaje_conversacion_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['receptor', 'leida', 'fecha'], name='notificacion_receptor_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_tarea'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicio',
+            name='image_variantes',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='profile_image_variantes',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:51
+
+from django.db import migrations, models
+
+
+def crear_indice_ubicacion(apps, schema_editor):
+    # location__icontains compila a UPPER(location) LIKE UPPER(%s): en PostgreSQL lo
+    # resuelve un índice trigram sobre esa expresión (pg_trgm viene de 0008). En SQLite
+    # un LIKE con comodín inicial no puede usar índices.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX core_servicio_location_trgm ON core_servicio "
+            "USING gin (UPPER(location) gin_trgm_ops)"
+        )
+
+
+def borrar_indice_ubicacion(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS core_servicio_location_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_imagen_variantes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['receptor', 'fecha', 'id'], name='notificacion_listado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicio',
+            index=models.Index(fields=['category', 'id'], name='servicio_categoria_idx'),
+        ),
+        migrations.RunPython(crear_indice_ubicacion, borrar_indice_ubicacion),
+    ]
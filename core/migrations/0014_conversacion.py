@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_indices_listados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vista_previa', models.CharField(blank=True, max_length=100)),
+                ('ultima_fecha', models.DateTimeField()),
+                ('no_leidos_a', models.PositiveIntegerField(default=0)),
+                ('no_leidos_b', models.PositiveIntegerField(default=0)),
+                ('ultimo_mensaje', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.mensaje')),
+                ('usuario_a', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='conversaciones_a', to=settings.AUTH_USER_MODEL)),
+                ('usuario_b', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='conversaciones_b', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['usuario_a', 'ultima_fecha', 'id'], name='conversacion_a_idx'), models.Index(fields=['usuario_b', 'ultima_fecha', 'id'], name='conversacion_b_idx')],
+                'constraints': [models.UniqueConstraint(fields=('usuario_a', 'usuario_b'), name='conversacion_par_unico'), models.CheckConstraint(condition=models.Q(('usuario_a__lt', models.F('usuario_b'))), name='conversacion_par_ordenado')],
+            },
+        ),
+    ]
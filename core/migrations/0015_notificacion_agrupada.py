@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_conversacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacion',
+            name='cantidad',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notificacion',
+            name='tipo',
+            field=models.CharField(choices=[('mensaje', 'Mensaje'), ('valoracion', 'Valoración')], default='mensaje', max_length=20),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from core.ubicaciones import buscar_en_nomenclador, geohash
+
+
+def ubicar_existentes(apps, schema_editor):
+    Localidad = apps.get_model('core', 'Localidad')
+    for modelo in (apps.get_model('core', 'Servicio'), apps.get_model('core', 'Usuario')):
+        textos = modelo.objects.order_by().values_list('location', flat=True).distinct()
+        for texto in list(textos):
+            entrada = buscar_en_nomenclador(texto)
+            if entrada is None:
+                continue
+            localidad, _ = Localidad.objects.get_or_create(
+                nombre=entrada['nombre'],
+                provincia=entrada['provincia'],
+                defaults={
+                    'latitud': entrada['latitud'],
+                    'longitud': entrada['longitud'],
+                    'geohash': geohash(entrada['latitud'], entrada['longitud']),
+                },
+            )
+            cambios = {'localidad': localidad}
+            if modelo.__name__ == 'Servicio':
+                cambios.update(latitud=localidad.latitud, longitud=localidad.longitud, geohash=localidad.geohash)
+            modelo.objects.filter(location=texto).update(**cambios)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_notificacion_agrupada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicio',
+            name='geohash',
+            field=models.CharField(blank=True, default='', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='servicio',
+            name='latitud',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='servicio',
+            name='longitud',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='Localidad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('provincia', models.CharField(max_length=100)),
+                ('latitud', models.FloatField()),
+                ('longitud', models.FloatField()),
+                ('geohash', models.CharField(max_length=12)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('nombre', 'provincia'), name='localidad_unica')],
+            },
+        ),
+        migrations.AddField(
+            model_name='servicio',
+            name='localidad',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='servicios', to='core.localidad'),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='localidad',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='usuarios', to='core.localidad'),
+        ),
+        migrations.AddIndex(
+            model_name='servicio',
+            index=models.Index(fields=['geohash'], name='servicio_geohash_idx'),
+        ),
+        migrations.RunPython(ubicar_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_localidades'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServicioSimilar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('puntaje', models.FloatField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='servicio',
+            name='similares_pendientes',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddIndex(
+            model_name='servicio',
+            index=models.Index(condition=models.Q(('similares_pendientes', True)), fields=['id'], name='servicio_similares_pend_idx'),
+        ),
+        migrations.AddField(
+            model_name='serviciosimilar',
+            name='servicio',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='similares', to='core.servicio'),
+        ),
+        migrations.AddField(
+            model_name='serviciosimilar',
+            name='similar',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.servicio'),
+        ),
+        migrations.AddIndex(
+            model_name='serviciosimilar',
+            index=models.Index(fields=['servicio', '-puntaje'], name='servicio_similar_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='serviciosimilar',
+            constraint=models.UniqueConstraint(fields=('servicio', 'similar'), name='servicio_similar_unico'),
+        ),
+    ]
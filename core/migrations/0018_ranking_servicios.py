@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:19
+
+from django.db import migrations, models
+from django.db.models import F, FloatField, Sum
+from django.db.models.functions import Cast
+
+# Valores de core/ratings.py al crear la migración
+PESO_PREVIO = 5
+PROMEDIO_POR_DEFECTO = 3.0
+
+
+def calcular_ranking(apps, schema_editor):
+    Servicio = apps.get_model('core', 'Servicio')
+    RankingCategoria = apps.get_model('core', 'RankingCategoria')
+    totales = {
+        fila['category']: fila
+        for fila in Servicio.objects.order_by().values('category').annotate(
+            suma=Sum('rating_sum'), cantidad=Sum('rating_count'),
+        )
+    }
+    for categoria in ('educacion', 'hogar', 'tecnologia', 'salud'):
+        fila = totales.get(categoria, {})
+        suma, cantidad = fila.get('suma') or 0, fila.get('cantidad') or 0
+        RankingCategoria.objects.create(category=categoria, rating_sum=suma, rating_count=cantidad)
+        previo = suma / cantidad if cantidad else PROMEDIO_POR_DEFECTO
+        Servicio.objects.filter(category=categoria).update(
+            ranking=(Cast('rating_sum', FloatField()) + PESO_PREVIO * previo)
+            / Cast(F('rating_count') + PESO_PREVIO, FloatField()),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_servicios_similares'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingCategoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('educacion', 'Educación'), ('hogar', 'Hogar'), ('tecnologia', 'Tecnología'), ('salud', 'Salud')], max_length=50, unique=True)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='servicio',
+            name='ranking',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='servicio',
+            index=models.Index(fields=['-ranking', '-id'], name='servicio_ranking_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicio',
+            index=models.Index(fields=['category', '-ranking', '-id'], name='servicio_cat_ranking_idx'),
+        ),
+        migrations.RunPython(calcular_ranking, migrations.RunPython.noop),
+    ]
@@ -1,17 +1,63 @@
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 import os
 from cloudinary_storage.storage import MediaCloudinaryStorage
 
+from .imagenes import url_imagen
+
 
 def profile_image_upload_path(instance, filename):
     """Guarda la imagen de perfil en Cloudinary o media/profiles/<username>/<filename>"""
     return os.path.join('profiles', instance.username, filename)
 
-class Usuario(AbstractUser):
+class ConAgregados:
+    """
+    Los agregados de valoraciones (CAMPOS_AGREGADOS) los mantienen los UPDATE con F() de
+    core/ratings.py. Un save() completo de una fila existente (editar perfil o servicio)
+    los escribe como `campo = campo`, así no pisa con los valores cargados antes los
+    deltas aplicados mientras tanto; después se releen de la fila.
+    """
+    CAMPOS_AGREGADOS = ('rating_sum', 'rating_count')
+
+    def save(self, *args, **kwargs):
+        if args or self._state.adding or kwargs.get('update_fields') is not None or kwargs.get('force_insert'):
+            return super().save(*args, **kwargs)
+        cargados = {campo: getattr(self, campo) for campo in self.CAMPOS_AGREGADOS}
+        for campo in cargados:
+            setattr(self, campo, models.F(campo))
+        try:
+            super().save(*args, **kwargs)
+        except Exception:
+            for campo, valor in cargados.items():
+                setattr(self, campo, valor)
+            raise
+        self.refresh_from_db(fields=list(cargados))
+
+
+class Localidad(models.Model):
+    """Localidad del nomenclador (core/data/localidades.csv), ver core/ubicaciones.py."""
+    nombre = models.CharField(max_length=100)
+    provincia = models.CharField(max_length=100)
+    latitud = models.FloatField()
+    longitud = models.FloatField()
+    geohash = models.CharField(max_length=12)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['nombre', 'provincia'], name='localidad_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre}, {self.provincia}"
+
+
+class Usuario(ConAgregados, AbstractUser):
     profession = models.CharField(max_length=100, blank=True, null=True)
     location = models.CharField(max_length=100, blank=True, null=True)
+    # Se completa a partir de `location` al guardar (ver core/signals.py)
+    localidad = models.ForeignKey(Localidad, on_delete=models.SET_NULL, null=True, blank=True, related_name='usuarios')
     age = models.PositiveIntegerField(blank=True, null=True)
 
     profile_image = models.ImageField(
@@ -21,14 +67,24 @@ class Usuario(AbstractUser):
     null=True,
     default='profiles/default.png'
 )
+    # Miniaturas generadas por el worker (ver core/imagenes.py)
+    profile_image_variantes = models.JSONField(default=dict, blank=True)
+
+    # Agregados de las valoraciones recibidas en todos sus servicios (ver core/signals.py)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
 
+    # Última modificación del perfil (ver core/condicional.py)
+    updated_at = models.DateTimeField(auto_now=True)
 
     @property
     def profile_image_url(self):
         """Devuelve la URL de la imagen de perfil o default.png en Cloudinary/Media"""
+        # Memoizada por (storage, nombre): construirla con Cloudinary en cada avatar es caro
         try:
-            if self.profile_image and hasattr(self.profile_image, 'url'):
-                return self.profile_image.url
+            url = url_imagen(self, 'profile_image')
+            if url:
+                return url
         except Exception:
             pass
         # Fallback
@@ -56,17 +112,16 @@ class Usuario(AbstractUser):
     
     @property
     def reputacion(self):
-        valoraciones = Valoracion.objects.filter(servicio__user=self)
-        if not valoraciones.exists():
+        if not self.rating_count:
             return 0
-        promedio = sum(v.puntuacion for v in valoraciones) / valoraciones.count()
-        return round(promedio, 2)
+        return round(self.rating_sum / self.rating_count, 2)
 
 
 # -------------------------------------------------------
 # Servicio publicado por un usuario
 # -------------------------------------------------------
-class Servicio(models.Model):
+class Servicio(ConAgregados, models.Model):
+    CAMPOS_AGREGADOS = ('rating_sum', 'rating_count', 'ranking')
     CATEGORY_CHOICES = (
         ('educacion', 'Educación'),
         ('hogar', 'Hogar'),
@@ -80,23 +135,87 @@ class Servicio(models.Model):
     blank=True,
     null=True
 )
+    image_variantes = models.JSONField(default=dict, blank=True)
     user = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='services')
     title = models.CharField(max_length=100)
     description = models.TextField()
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES)
     profession = models.CharField(max_length=100)
     location = models.CharField(max_length=100)
-    rating = models.FloatField(default=0)
+    # Localidad de `location` y sus coordenadas copiadas, para filtrar por distancia sin join
+    localidad = models.ForeignKey(Localidad, on_delete=models.SET_NULL, null=True, blank=True, related_name='servicios')
+    latitud = models.FloatField(null=True, blank=True)
+    longitud = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, default='')
+
+    # Agregados de sus valoraciones, mantenidos con F() al crear/editar/borrar una Valoracion
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+
+    # Última modificación: base de los Last-Modified/ETag del listado (ver core/condicional.py).
+    # Los UPDATE en bloque que cambian lo que se muestra también lo actualizan.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Promedio bayesiano (suavizado hacia el de su categoría) para ordenar por calidad
+    # con un índice. Lo mantienen core/ratings.py y el comando recalcular_ranking.
+    ranking = models.FloatField(default=0)
+
+    # Nuevo o editado desde el último cálculo de similares (ver core/recomendaciones.py)
+    similares_pendientes = models.BooleanField(default=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['id'], condition=models.Q(similares_pendientes=True), name='servicio_similares_pend_idx',
+            ),
+            # Listado filtrado por categoría, paginado por cursor sobre -id
+            models.Index(fields=['category', 'id'], name='servicio_categoria_idx'),
+            # Listado con sort=top, en general y por categoría
+            models.Index(fields=['-ranking', '-id'], name='servicio_ranking_idx'),
+            models.Index(fields=['category', '-ranking', '-id'], name='servicio_cat_ranking_idx'),
+            # MAX(updated_at) de las respuestas condicionales del listado
+            models.Index(fields=['updated_at'], name='servicio_updated_idx'),
+            # Búsqueda por cercanía: rangos de prefijos de geohash (ver core/ubicaciones.py)
+            models.Index(fields=['geohash'], name='servicio_geohash_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.user.username}"
     
     @property
     def rating(self):
-        valoraciones = self.valoraciones.all()
-        if valoraciones.exists():
-            return round(sum(v.puntuacion for v in valoraciones) / valoraciones.count(), 1)
-        return 0
+        if not self.rating_count:
+            return 0
+        return round(self.rating_sum / self.rating_count, 1)
+
+
+# -------------------------------------------------------
+# Agregados de valoraciones por categoría: el promedio previo del ranking
+# -------------------------------------------------------
+class RankingCategoria(models.Model):
+    category = models.CharField(max_length=50, choices=Servicio.CATEGORY_CHOICES, unique=True)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.get_category_display()}: {self.rating_sum}/{self.rating_count}"
+
+
+# -------------------------------------------------------
+# Vecinos precalculados de cada servicio (ver core/recomendaciones.py)
+# -------------------------------------------------------
+class ServicioSimilar(models.Model):
+    servicio = models.ForeignKey(Servicio, on_delete=models.CASCADE, related_name='similares', db_index=False)
+    similar = models.ForeignKey(Servicio, on_delete=models.CASCADE, related_name='+')
+    puntaje = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['servicio', 'similar'], name='servicio_similar_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['servicio', '-puntaje'], name='servicio_similar_idx'),
+        ]
 
 
 # -------------------------------------------------------
@@ -110,9 +229,47 @@ class Mensaje(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['sender', 'receiver', 'timestamp'], name='mensaje_conversacion_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sender} -> {self.receiver}: {self.content[:20]}"
+
+
+# -------------------------------------------------------
+# Resumen de cada conversación para la bandeja de entrada (ver core/conversaciones.py)
+# -------------------------------------------------------
+class Conversacion(models.Model):
+    # El par se guarda ordenado (usuario_a.id < usuario_b.id): una fila por par.
+    # Sin índice propio en las FK: los índices compuestos de Meta empiezan por cada una.
+    usuario_a = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='conversaciones_a', db_index=False)
+    usuario_b = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='conversaciones_b', db_index=False)
+    ultimo_mensaje = models.ForeignKey(Mensaje, on_delete=models.SET_NULL, null=True, related_name='+')
+    vista_previa = models.CharField(max_length=100, blank=True)
+    ultima_fecha = models.DateTimeField()
+    no_leidos_a = models.PositiveIntegerField(default=0)
+    no_leidos_b = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario_a', 'usuario_b'], name='conversacion_par_unico'),
+            models.CheckConstraint(condition=models.Q(usuario_a__lt=models.F('usuario_b')), name='conversacion_par_ordenado'),
+        ]
+        indexes = [
+            # Bandeja: conversaciones de un usuario por actividad reciente, desde cada lado del par
+            models.Index(fields=['usuario_a', 'ultima_fecha', 'id'], name='conversacion_a_idx'),
+            models.Index(fields=['usuario_b', 'ultima_fecha', 'id'], name='conversacion_b_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario_a} <-> {self.usuario_b}"
+
+    def otro(self, usuario):
+        return self.usuario_b if usuario.id == self.usuario_a_id else self.usuario_a
+
+    def no_leidos(self, usuario):
+        return self.no_leidos_a if usuario.id == self.usuario_a_id else self.no_leidos_b
     
 
 class Valoracion(models.Model):
@@ -122,6 +279,7 @@ class Valoracion(models.Model):
     comentario = models.TextField(blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('servicio', 'autor')  # evita que un usuario valore dos veces el mismo servicio
@@ -130,15 +288,68 @@ class Valoracion(models.Model):
         return f"{self.autor.username} → {self.servicio.title}: {self.puntuacion}★"
     
 class Notificacion(models.Model):
+    MENSAJE = 'mensaje'
+    VALORACION = 'valoracion'
+    TIPO_CHOICES = (
+        (MENSAJE, 'Mensaje'),
+        (VALORACION, 'Valoración'),
+    )
+
     receptor = models.ForeignKey(
         Usuario, on_delete=models.CASCADE, related_name="notificaciones"
     )
     emisor = models.ForeignKey(
         Usuario, on_delete=models.CASCADE, related_name="notificaciones_enviadas"
     )
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES, default=MENSAJE)
     mensaje = models.CharField(max_length=255)
+    # Eventos agrupados en esta notificación mientras sigue sin leer (ver core/notificaciones.py)
+    cantidad = models.PositiveIntegerField(default=1)
     leida = models.BooleanField(default=False)
     fecha = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['receptor', 'leida', 'fecha'], name='notificacion_receptor_idx'),
+            # Listado paginado por cursor sobre (-fecha, -id)
+            models.Index(fields=['receptor', 'fecha', 'id'], name='notificacion_listado_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.emisor} ➔ {self.receptor}: {self.mensaje[:20]}"
+
+# -------------------------------------------------------
+# Cola de tareas en segundo plano (ver core/tareas.py)
+# -------------------------------------------------------
+class Tarea(models.Model):
+    PENDIENTE = 'pendiente'
+    EN_CURSO = 'en_curso'
+    COMPLETADA = 'completada'
+    FALLIDA = 'fallida'
+    ESTADO_CHOICES = (
+        (PENDIENTE, 'Pendiente'),
+        (EN_CURSO, 'En curso'),
+        (COMPLETADA, 'Completada'),
+        (FALLIDA, 'Fallida'),
+    )
+
+    nombre = models.CharField(max_length=100)
+    datos = models.JSONField(default=dict)
+    # Archivo subido que la tarea procesa (p. ej. una imagen a subir a Cloudinary)
+    adjunto = models.BinaryField(null=True, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default=PENDIENTE)
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=5)
+    # Próxima ejecución; mientras está en curso funciona como vencimiento del bloqueo
+    ejecutar_desde = models.DateTimeField(default=timezone.now)
+    error = models.TextField(blank=True)
+    creada = models.DateTimeField(auto_now_add=True)
+    actualizada = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'ejecutar_desde'], name='tarea_pendientes_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.emisor} ➔ {self.receptor}: {self.mensaje[:20]}"
\ No newline at end of file
+        return f"{self.nombre} #{self.pk} ({self.estado})"
@@ -0,0 +1,132 @@
+"""
+Servicio de notificaciones: creación agrupada, contador de no leídas en caché y
+operaciones en bloque. Las vistas y tareas crean notificaciones solo con `notificar`.
+
+Agrupación: si el receptor ya tiene una notificación sin leer del mismo emisor y tipo,
+se actualiza esa fila (cantidad + 1, texto y fecha del último evento) en lugar de crear
+otra. Para varios receptores se resuelve con un UPDATE (F('cantidad') + 1) y un
+bulk_create para los que no tenían una fila que agrupar, en la misma transacción.
+
+El contador se guarda por usuario en la caché por defecto. Se incrementa al crear
+una Notificacion (aquí o en core/signals.py), se decrementa al marcarla como leída y se
+reconstruye con un COUNT cuando no está en caché.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Notificacion
+from .realtime import publicar
+
+# Con caché local por proceso el contador de otro worker puede quedar desfasado
+# hasta este vencimiento; con una caché compartida siempre está al día.
+CONTADOR_TIMEOUT = 300
+
+
+def clave_no_leidas(usuario_id):
+    return f"notificaciones:no_leidas:{usuario_id}"
+
+
+def contar_no_leidas(usuario_id):
+    clave = clave_no_leidas(usuario_id)
+    cantidad = cache.get(clave)
+    if cantidad is None:
+        cantidad = Notificacion.objects.filter(receptor_id=usuario_id, leida=False).count()
+        cache.set(clave, cantidad, CONTADOR_TIMEOUT)
+    return cantidad
+
+
+async def acontar_no_leidas(usuario_id):
+    clave = clave_no_leidas(usuario_id)
+    cantidad = await cache.aget(clave)
+    if cantidad is None:
+        cantidad = await Notificacion.objects.filter(receptor_id=usuario_id, leida=False).acount()
+        await cache.aset(clave, cantidad, CONTADOR_TIMEOUT)
+    return cantidad
+
+
+def _ajustar(usuario_id, delta):
+    clave = clave_no_leidas(usuario_id)
+    try:
+        cantidad = cache.incr(clave, delta)
+    except ValueError:
+        # No estaba en caché: se reconstruye en la próxima lectura
+        return
+    if cantidad < 0:
+        cache.delete(clave)
+
+
+def incrementar_no_leidas(usuario_id, cantidad=1):
+    _ajustar(usuario_id, cantidad)
+
+
+def decrementar_no_leidas(usuario_id, cantidad=1):
+    _ajustar(usuario_id, -cantidad)
+
+
+def marcar_leida(usuario, notif_id):
+    """Marca una notificación del usuario como leída. Devuelve True si estaba sin leer."""
+    actualizada = Notificacion.objects.filter(id=notif_id, receptor=usuario, leida=False).update(leida=True)
+    if actualizada:
+        decrementar_no_leidas(usuario.id)
+    return bool(actualizada)
+
+
+def marcar_todas_leidas(usuario):
+    """Marca todas las notificaciones del usuario como leídas con un único UPDATE."""
+    actualizadas = Notificacion.objects.filter(receptor=usuario, leida=False).update(leida=True)
+    # Borrar en vez de poner 0: una notificación creada entre medio no se pierde
+    cache.delete(clave_no_leidas(usuario.id))
+    return actualizadas
+
+
+def publicar_notificacion(notificacion):
+    publicar(notificacion.receptor_id, 'notificacion', {
+        'id': notificacion.id,
+        'emisor_id': notificacion.emisor_id,
+        'tipo': notificacion.tipo,
+        'mensaje': notificacion.mensaje,
+        'cantidad': notificacion.cantidad,
+        'fecha': notificacion.fecha.isoformat(),
+    })
+
+
+def notificar(receptores, emisor_id, tipo, mensaje):
+    """
+    Notifica a uno o varios receptores (id o lista de ids) del mismo evento, agrupando con
+    las notificaciones sin leer del mismo emisor y tipo. Devuelve las notificaciones
+    creadas o actualizadas.
+    """
+    receptores = ({receptores} if isinstance(receptores, int) else set(receptores)) - {emisor_id}
+    if not receptores:
+        return []
+
+    ahora = timezone.now()
+    grupo = {'emisor_id': emisor_id, 'tipo': tipo, 'leida': False}
+    with transaction.atomic():
+        # Un UPDATE sobre la sin leer más reciente de cada receptor (si hay más de una,
+        # anteriores a la agrupación, se agrupa en esa); se crea solo donde no hubo fila
+        ultima = (
+            Notificacion.objects.filter(receptor_id=OuterRef('receptor_id'), **grupo)
+            .order_by('-fecha', '-id').values('pk')[:1]
+        )
+        agrupadas = Notificacion.objects.filter(receptor_id__in=receptores, pk=Subquery(ultima), **grupo).update(
+            cantidad=F('cantidad') + 1, mensaje=mensaje, fecha=ahora,
+        )
+        actualizadas = []
+        if agrupadas:
+            # Para el evento en tiempo real: las filas recién actualizadas (bloqueadas hasta el commit)
+            actualizadas = list(Notificacion.objects.filter(receptor_id__in=receptores, fecha=ahora, **grupo))
+        agrupables = {notif.receptor_id for notif in actualizadas}
+
+        nuevas = Notificacion.objects.bulk_create([
+            Notificacion(receptor_id=receptor_id, emisor_id=emisor_id, tipo=tipo, mensaje=mensaje)
+            for receptor_id in sorted(receptores - agrupables)
+        ])
+        for notif in nuevas:
+            transaction.on_commit(lambda receptor_id=notif.receptor_id: incrementar_no_leidas(receptor_id))
+
+        for notif in actualizadas + nuevas:
+            publicar_notificacion(notif)
+    return actualizadas + nuevas
@@ -0,0 +1,186 @@
+"""
+Paginación por cursor (keyset) para listados largos.
+
+En lugar de OFFSET + COUNT(*), cada página filtra a partir de la clave de orden
+de la última fila vista, así la página 1000 cuesta lo mismo que la primera.
+Los cursores son opacos para el cliente (JSON en base64 urlsafe).
+"""
+import base64
+import binascii
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+
+# Los números de `page` más allá de este tope vuelven a la primera página: el OFFSET
+# recorre y descarta todas las filas anteriores
+MAX_PAGINA_NUMERADA = 100
+
+
+def codificar_cursor(valores, direccion):
+    # isoformat completo (con microsegundos) para que el filtro keyset sea exacto
+    datos = json.dumps({'k': valores, 'd': direccion}, separators=(',', ':'), default=lambda v: v.isoformat())
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (valores, dirección) o None si el cursor no es válido."""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        valores, direccion = datos['k'], datos['d']
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        return None
+    if direccion not in ('n', 'p') or not isinstance(valores, list):
+        return None
+    return valores, direccion
+
+
+def estimar_total(queryset):
+    """
+    Cantidad aproximada de filas según el planificador de PostgreSQL,
+    sin ejecutar el COUNT(*). En otros motores devuelve None.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, total_aproximado=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total_aproximado = total_aproximado
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginador keyset sobre `ordering`, que debe identificar unívocamente cada fila
+    (por eso termina en 'id'). `total_aproximado=True` agrega una estimación del total.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-id',), total_aproximado=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self.campos = [campo.lstrip('-') for campo in self.ordering]
+        self.total_aproximado = total_aproximado
+
+    def _clave(self, obj):
+        return [getattr(obj, campo) for campo in self.campos]
+
+    def _filtro(self, valores, hacia_adelante):
+        """Filas estrictamente posteriores (o anteriores) a `valores` en el orden del listado."""
+        filtro = Q()
+        iguales = Q()
+        for orden, campo, valor in zip(self.ordering, self.campos, valores):
+            descendente = orden.startswith('-')
+            lookup = 'lt' if descendente == hacia_adelante else 'gt'
+            filtro |= iguales & Q(**{f'{campo}__{lookup}': valor})
+            iguales &= Q(**{campo: valor})
+        return filtro
+
+    def _invertir(self):
+        return [orden[1:] if orden.startswith('-') else f'-{orden}' for orden in self.ordering]
+
+    def _consulta(self, cursor, page_number):
+        """
+        (queryset limitado, hacia_atras, desde_cursor, inicio) de la página pedida. Sin
+        cursor, acepta un número de `page` (links viejos): esa página se resuelve una vez
+        con OFFSET y desde ahí los enlaces siguen con cursores.
+        """
+        decodificado = decodificar_cursor(cursor) if cursor else None
+        limite = self.per_page + 1
+        if decodificado:
+            valores, direccion = decodificado
+            try:
+                desde_cursor = self.queryset.filter(self._filtro(valores, hacia_adelante=direccion == 'n'))
+            except (ValueError, TypeError, ValidationError):
+                # Cursor manipulado: se vuelve a la primera página
+                decodificado = None
+
+        if decodificado and decodificado[1] == 'p':
+            return desde_cursor.order_by(*self._invertir())[:limite], True, True, 0
+        if decodificado:
+            return desde_cursor.order_by(*self.ordering)[:limite], False, True, 0
+        inicio = (self._numero_de_pagina(page_number) - 1) * self.per_page
+        return self.queryset.order_by(*self.ordering)[inicio:inicio + limite], False, False, inicio
+
+    def _ultima_pagina(self):
+        """La última página, leyendo desde el final con el orden invertido."""
+        return self.queryset.order_by(*self._invertir())[:self.per_page + 1]
+
+    def _pagina(self, filas, hacia_atras, desde_cursor, inicio, total_aproximado, ultima=False):
+        if hacia_atras:
+            hay_anteriores = len(filas) > self.per_page
+            filas = filas[:self.per_page][::-1]
+            hay_siguientes = not ultima
+        else:
+            hay_siguientes = len(filas) > self.per_page
+            filas = filas[:self.per_page]
+            hay_anteriores = desde_cursor or inicio > 0
+
+        if not filas:
+            hay_siguientes = hay_anteriores = False
+
+        return CursorPage(
+            filas,
+            next_cursor=codificar_cursor(self._clave(filas[-1]), 'n') if hay_siguientes else None,
+            previous_cursor=codificar_cursor(self._clave(filas[0]), 'p') if hay_anteriores else None,
+            total_aproximado=total_aproximado,
+        )
+
+    def get_page(self, cursor=None, page_number=None):
+        """Devuelve la página indicada por `cursor` (o por número de `page`, ver _consulta)."""
+        qs, hacia_atras, desde_cursor, inicio = self._consulta(cursor, page_number)
+        total = estimar_total(self.queryset) if self.total_aproximado else None
+        filas = list(qs)
+        if not filas and inicio:
+            # `page` más allá del final (link viejo): la última, como Paginator.get_page
+            return self._pagina(list(self._ultima_pagina()), True, False, 0, total, ultima=True)
+        return self._pagina(filas, hacia_atras, desde_cursor, inicio, total)
+
+    async def aget_page(self, cursor=None, page_number=None):
+        """get_page para vistas async, con el ORM async."""
+        qs, hacia_atras, desde_cursor, inicio = self._consulta(cursor, page_number)
+        total = await sync_to_async(estimar_total)(self.queryset) if self.total_aproximado else None
+        filas = [fila async for fila in qs]
+        if not filas and inicio:
+            filas = [fila async for fila in self._ultima_pagina()]
+            return self._pagina(filas, True, False, 0, total, ultima=True)
+        return self._pagina(filas, hacia_atras, desde_cursor, inicio, total)
+
+    @staticmethod
+    def _numero_de_pagina(page_number):
+        try:
+            numero = int(page_number)
+        except (TypeError, ValueError):
+            return 1
+        return numero if 1 <= numero <= MAX_PAGINA_NUMERADA else 1
@@ -0,0 +1,228 @@
+"""
+Perfilado de requests.
+
+`PerfiladoMiddleware` mide por request el tiempo total, la cantidad y el tiempo de las
+consultas SQL, las consultas repetidas (misma forma de SQL ejecutada muchas veces: un
+N+1) y el tiempo de render de templates. Lo devuelve en el header Server-Timing (a staff
+o con DEBUG) y lo acumula en un histograma por nombre de URL, en memoria del proceso,
+que se consulta en /estado/perfilado/.
+
+Funciona con vistas sync y async: las consultas se registran con execute_wrapper en las
+conexiones del hilo que atiende el request, solo mientras dura (con vistas async, en el
+hilo donde asgiref corre el ORM de ese request), y el perfil viaja en una ContextVar. El
+render se mide con el backend de templates `PlantillasMedidas`, que settings usa en lugar
+de DjangoTemplates cuando el perfilado está activo.
+"""
+import logging
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as backend_django
+from django.utils.functional import SimpleLazyObject, empty
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (ms) de los baldes del histograma; el último balde es "más"
+BALDES_MS = (10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_actual = ContextVar('perfil_request', default=None)
+_muestras = {}
+_muestras_lock = threading.Lock()
+
+
+class Perfil:
+    def __init__(self):
+        self.sql_ms = 0.0
+        self.formas = Counter()
+        self.exactas = Counter()
+        self.tpl_ms = 0.0
+        self.tpl_profundidad = 0
+
+    @property
+    def consultas(self):
+        return sum(self.formas.values())
+
+    def repetidas(self):
+        """(veces, sql) de la consulta más repetida, o (0, '')."""
+        if not self.formas:
+            return 0, ''
+        sql, veces = self.formas.most_common(1)[0]
+        return veces, sql
+
+    def duplicadas(self):
+        """Consultas idénticas (mismo SQL y parámetros) ejecutadas de más."""
+        return sum(veces - 1 for veces in self.exactas.values())
+
+
+def _registrar_sql(execute, sql, params, many, context):
+    perfil = _actual.get()
+    if perfil is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        perfil.sql_ms += (time.perf_counter() - inicio) * 1000
+        perfil.formas[sql] += 1
+        perfil.exactas[(sql, repr(params))] += 1
+
+
+def _medir_consultas():
+    """Registra las consultas de las conexiones de este hilo hasta cerrar la pila devuelta."""
+    pila = ExitStack()
+    for conexion in connections.all():
+        pila.enter_context(conexion.execute_wrapper(_registrar_sql))
+    return pila
+
+
+class PlantillaMedida(backend_django.Template):
+    def render(self, context=None, request=None):
+        perfil = _actual.get()
+        if perfil is None:
+            return super().render(context, request)
+        # Solo cuenta el render más externo: los render_to_string anidados ya están dentro
+        perfil.tpl_profundidad += 1
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            perfil.tpl_profundidad -= 1
+            if not perfil.tpl_profundidad:
+                perfil.tpl_ms += (time.perf_counter() - inicio) * 1000
+
+
+class PlantillasMedidas(backend_django.DjangoTemplates):
+    """DjangoTemplates cuyas plantillas suman su tiempo de render al perfil del request."""
+
+    def from_string(self, template_code):
+        return PlantillaMedida(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return PlantillaMedida(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            backend_django.reraise(exc, self)
+
+
+def _registrar_muestra(vista, muestra):
+    with _muestras_lock:
+        if vista not in _muestras:
+            _muestras[vista] = deque(maxlen=settings.PERFILADO_MUESTRAS)
+        _muestras[vista].append(muestra)
+
+
+def _percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def resumen():
+    """Histograma y percentiles de las últimas muestras de cada URL."""
+    with _muestras_lock:
+        copia = {vista: list(muestras) for vista, muestras in _muestras.items()}
+    resultado = {}
+    for vista, muestras in sorted(copia.items()):
+        tiempos = sorted(m['total_ms'] for m in muestras)
+        baldes = Counter()
+        for t in tiempos:
+            baldes[next((f"<={limite}ms" for limite in BALDES_MS if t <= limite), f">{BALDES_MS[-1]}ms")] += 1
+        resultado[vista] = {
+            'muestras': len(muestras),
+            'p50_ms': round(_percentil(tiempos, 50), 2),
+            'p95_ms': round(_percentil(tiempos, 95), 2),
+            'max_ms': round(tiempos[-1], 2),
+            'histograma': dict(baldes),
+            'sql_promedio': round(sum(m['consultas'] for m in muestras) / len(muestras), 1),
+            'sql_max': max(m['consultas'] for m in muestras),
+            'sql_ms_p95': round(_percentil(sorted(m['sql_ms'] for m in muestras), 95), 2),
+            'template_ms_p95': round(_percentil(sorted(m['template_ms'] for m in muestras), 95), 2),
+            'repetidas_max': max(m['repetidas'] for m in muestras),
+            'duplicadas_max': max(m['duplicadas'] for m in muestras),
+        }
+    return resultado
+
+
+def reiniciar():
+    with _muestras_lock:
+        _muestras.clear()
+
+
+class PerfiladoMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PERFILADO_ACTIVO:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        perfil = Perfil()
+        token = _actual.set(perfil)
+        inicio = time.perf_counter()
+        try:
+            with _medir_consultas():
+                response = self.get_response(request)
+        finally:
+            _actual.reset(token)
+        return self._terminar(request, response, perfil, inicio)
+
+    async def __acall__(self, request):
+        perfil = Perfil()
+        token = _actual.set(perfil)
+        inicio = time.perf_counter()
+        # En el hilo sync de este request, que es donde el ORM async usa sus conexiones
+        consultas = await sync_to_async(_medir_consultas)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(consultas.close)()
+            _actual.reset(token)
+        return self._terminar(request, response, perfil, inicio)
+
+    @staticmethod
+    def _usuario_resuelto(request):
+        """
+        El usuario del request solo si la vista ya lo cargó: resolverlo acá sumaría sesión
+        y usuario a los requests que no lo usan (estáticos, caché de anónimos, 304).
+        """
+        usuario = getattr(request, 'user', None)
+        if isinstance(usuario, SimpleLazyObject) and usuario._wrapped is empty:
+            return getattr(request, '_cached_user', None) or getattr(request, '_acached_user', None)
+        return usuario
+
+    def _terminar(self, request, response, perfil, inicio):
+        total_ms = (time.perf_counter() - inicio) * 1000
+
+        vista = request.resolver_match.view_name if request.resolver_match else 'sin_ruta'
+        repetidas, sql_repetida = perfil.repetidas()
+        if repetidas >= settings.PERFILADO_UMBRAL_REPETIDAS:
+            logger.warning("%s: la misma consulta se ejecutó %d veces: %s", vista, repetidas, sql_repetida[:300])
+        _registrar_muestra(vista, {
+            'total_ms': total_ms,
+            'consultas': perfil.consultas,
+            'sql_ms': perfil.sql_ms,
+            'template_ms': perfil.tpl_ms,
+            'repetidas': repetidas,
+            'duplicadas': perfil.duplicadas(),
+        })
+
+        usuario = self._usuario_resuelto(request)
+        if settings.DEBUG or (usuario is not None and usuario.is_staff):
+            response['Server-Timing'] = (
+                f'total;dur={total_ms:.1f}, '
+                f'sql;dur={perfil.sql_ms:.1f};desc="{perfil.consultas} consultas", '
+                f'tpl;dur={perfil.tpl_ms:.1f}'
+            )
+        return response
@@ -0,0 +1,162 @@
+"""
+Agregados de valoraciones (suma y cantidad) de servicios, usuarios y categorías, y el
+ranking de servicios.
+
+El ranking es un promedio bayesiano: cada servicio suma PESO_PREVIO valoraciones
+"virtuales" con el promedio de su categoría, así uno con una sola valoración de 5 no
+queda por encima de uno con cien de 4,8. Cada valoración actualiza en SQL el agregado
+de la categoría y el ranking de su servicio; el de los demás servicios de la categoría
+(cuyo promedio previo se movió apenas) lo pone al día `recalcular_ranking`.
+"""
+from django.db.models import F, FloatField, IntegerField, OuterRef, Subquery, Sum, Count, Value
+from django.db.models.functions import Cast, Coalesce, Now
+
+from .models import Usuario, Servicio, Valoracion, RankingCategoria
+
+PESO_PREVIO = 5
+PROMEDIO_POR_DEFECTO = 3.0  # categoría sin valoraciones
+
+
+def puntaje_bayesiano(suma, cantidad, previo):
+    return (suma + PESO_PREVIO * previo) / (cantidad + PESO_PREVIO)
+
+
+def promedio_previo(categoria):
+    fila = RankingCategoria.objects.filter(category=categoria).values_list('rating_sum', 'rating_count').first()
+    return fila[0] / fila[1] if fila and fila[1] else PROMEDIO_POR_DEFECTO
+
+
+def promedios_previos():
+    """{categoría: promedio previo} de todas las categorías, en una consulta."""
+    promedios = dict.fromkeys((clave for clave, _ in Servicio.CATEGORY_CHOICES), PROMEDIO_POR_DEFECTO)
+    for categoria, suma, cantidad in RankingCategoria.objects.values_list('category', 'rating_sum', 'rating_count'):
+        if cantidad:
+            promedios[categoria] = suma / cantidad
+    return promedios
+
+
+def _previo_sql(categoria):
+    promedio = (
+        RankingCategoria.objects.filter(category=categoria, rating_count__gt=0)
+        .annotate(promedio=Cast('rating_sum', FloatField()) / F('rating_count'))
+        .values('promedio')[:1]
+    )
+    return Coalesce(Subquery(promedio, output_field=FloatField()), Value(PROMEDIO_POR_DEFECTO))
+
+
+def _ranking_sql(suma, cantidad):
+    """puntaje_bayesiano como expresión, con el promedio previo de la categoría de cada fila."""
+    return (
+        (Cast(suma, FloatField()) + PESO_PREVIO * _previo_sql(OuterRef('category')))
+        / Cast(cantidad + PESO_PREVIO, FloatField())
+    )
+
+
+def aplicar_delta(servicio_id, delta_sum, delta_count):
+    """Suma (o resta) una valoración a los agregados del servicio, su dueño y su categoría."""
+    if not delta_sum and not delta_count:
+        return
+    cambios = {
+        'rating_sum': F('rating_sum') + delta_sum,
+        'rating_count': F('rating_count') + delta_count,
+    }
+    # Primero la categoría, así el ranking del servicio ya usa el promedio nuevo
+    RankingCategoria.objects.filter(
+        category=Subquery(Servicio.objects.filter(pk=servicio_id).values('category')[:1])
+    ).update(**cambios)
+    # updated_at a mano: UPDATE no pasa por auto_now y la reputación se muestra
+    Servicio.objects.filter(pk=servicio_id).update(
+        ranking=_ranking_sql(F('rating_sum') + delta_sum, F('rating_count') + delta_count),
+        updated_at=Now(),
+        **cambios,
+    )
+    Usuario.objects.filter(services__pk=servicio_id).update(updated_at=Now(), **cambios)
+
+
+def mover_de_categoria(servicio_id, anterior, nueva):
+    """Pasa los agregados del servicio de la categoría `anterior` a `nueva` y rehace su ranking."""
+    suma, cantidad = Servicio.objects.filter(pk=servicio_id).values_list('rating_sum', 'rating_count').get()
+    if cantidad:
+        RankingCategoria.objects.filter(category=anterior).update(
+            rating_sum=F('rating_sum') - suma, rating_count=F('rating_count') - cantidad,
+        )
+        RankingCategoria.objects.filter(category=nueva).update(
+            rating_sum=F('rating_sum') + suma, rating_count=F('rating_count') + cantidad,
+        )
+    Servicio.objects.filter(pk=servicio_id).update(
+        ranking=_ranking_sql(F('rating_sum'), F('rating_count')), updated_at=Now(),
+    )
+
+
+def _subconsulta(filtro, agregado):
+    return Coalesce(
+        Subquery(
+            Valoracion.objects.filter(**filtro)
+            .order_by()
+            .values(*filtro)
+            .annotate(total=agregado)
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def recalcular_ranking():
+    """Recalcula los agregados por categoría y el ranking de todos los servicios."""
+    totales = {
+        fila['category']: fila
+        for fila in Servicio.objects.order_by().values('category').annotate(
+            suma=Sum('rating_sum'), cantidad=Sum('rating_count'),
+        )
+    }
+    for categoria, _ in Servicio.CATEGORY_CHOICES:
+        fila = totales.get(categoria, {})
+        RankingCategoria.objects.update_or_create(category=categoria, defaults={
+            'rating_sum': fila.get('suma') or 0,
+            'rating_count': fila.get('cantidad') or 0,
+        })
+    return Servicio.objects.update(ranking=_ranking_sql(F('rating_sum'), F('rating_count')), updated_at=Now())
+
+
+def recalcular_agregados():
+    """
+    Recalcula desde cero rating_sum/rating_count de todos los servicios y usuarios, y con
+    ellos el ranking.
+    """
+    servicios = Servicio.objects.update(
+        rating_sum=_subconsulta({'servicio': OuterRef('pk')}, Sum('puntuacion')),
+        rating_count=_subconsulta({'servicio': OuterRef('pk')}, Count('id')),
+        updated_at=Now(),
+    )
+    usuarios = Usuario.objects.update(
+        rating_sum=_subconsulta({'servicio__user': OuterRef('pk')}, Sum('puntuacion')),
+        rating_count=_subconsulta({'servicio__user': OuterRef('pk')}, Count('id')),
+        updated_at=Now(),
+    )
+    recalcular_ranking()
+    return servicios, usuarios
+
+
+def verificar_agregados():
+    """
+    Compara los agregados guardados contra los calculados a partir de Valoracion.
+    Devuelve una lista de (objeto, (suma, cantidad) guardados, (suma, cantidad) reales).
+    """
+    inconsistencias = []
+    consultas = (
+        (Servicio.objects.all(), 'valoraciones'),
+        (Usuario.objects.all(), 'services__valoraciones'),
+    )
+    for queryset, relacion in consultas:
+        filas = queryset.annotate(
+            real_sum=Coalesce(Sum(f'{relacion}__puntuacion'), 0),
+            real_count=Count(f'{relacion}__id'),
+        ).exclude(rating_sum=F('real_sum'), rating_count=F('real_count'))
+        for obj in filas:
+            inconsistencias.append((
+                obj,
+                (obj.rating_sum, obj.rating_count),
+                (obj.real_sum, obj.real_count),
+            ))
+    return inconsistencias
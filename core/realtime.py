@@ -0,0 +1,28 @@
+"""
+Envío de eventos en tiempo real a los usuarios conectados por WebSocket.
+
+Cada usuario escucha el grupo `usuario_<id>` (ver core/consumers.py). La capa de
+canales se configura en CHANNEL_LAYERS: en memoria por defecto, o un broker
+(Redis) para varios procesos.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+
+def grupo_usuario(usuario_id):
+    return f"usuario_{usuario_id}"
+
+
+def publicar(usuario_id, tipo, datos):
+    """Envía `datos` al usuario cuando la transacción actual se confirma."""
+    def enviar():
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        async_to_sync(channel_layer.group_send)(
+            grupo_usuario(usuario_id),
+            {'type': 'evento', 'tipo': tipo, 'datos': datos},
+        )
+
+    transaction.on_commit(enviar)
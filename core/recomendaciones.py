@@ -0,0 +1,210 @@
+"""
+Servicios similares.
+
+Cada Servicio se representa como un vector TF-IDF disperso ({término: peso}) sobre
+título, profesión, descripción y categoría, normalizado a largo 1. Los vecinos de un
+servicio salen de recorrer el índice invertido (término -> [(servicio, peso)]) con sus
+términos: es el producto disperso de su fila contra la matriz, sin comparar contra
+todo el catálogo. Los términos presentes en más de MAX_DF del catálogo no entran al
+índice (no discriminan y son las listas más largas).
+
+Los K vecinos de cada servicio (de otros usuarios) se guardan en ServicioSimilar, así
+perfil y detalle los leen con una consulta. `recalcular_todo` (comando
+calcular_similares) reconstruye la tabla por lotes; al guardar un servicio queda
+marcado como pendiente y la tarea `refrescar_similares` actualiza solo los pendientes:
+sus vecinos y su lugar en las listas de los demás.
+"""
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from .cache import invalidar
+from .models import Servicio, ServicioSimilar
+from .ubicaciones import normalizar
+
+K = 10
+LOTE = 500
+MAX_DF = 0.5
+PUNTAJE_MINIMO = 0.05
+PESOS = (('title', 2.0), ('profession', 1.5), ('description', 1.0))
+STOPWORDS = frozenset(
+    "a al con de del el en es la las lo los mas o para por que se sin su sus un una uno y".split()
+)
+
+
+def terminos(servicio):
+    """Frecuencias ponderadas por campo de un servicio (o de un dict con sus campos)."""
+    obtener = servicio.get if isinstance(servicio, dict) else lambda campo: getattr(servicio, campo)
+    frecuencias = Counter()
+    for campo, peso in PESOS:
+        for palabra in re.findall(r'[a-z0-9]+', normalizar(obtener(campo))):
+            if len(palabra) > 2 and palabra not in STOPWORDS:
+                frecuencias[palabra] += peso
+    frecuencias[f"categoria:{obtener('category')}"] += 1.0
+    return frecuencias
+
+
+class Corpus:
+    """Vectores TF-IDF de todo el catálogo y su índice invertido."""
+
+    def __init__(self, filas):
+        frecuencias, self.duenos = {}, {}
+        df = Counter()
+        for fila in filas:
+            frecuencias[fila['id']] = terminos(fila)
+            self.duenos[fila['id']] = fila['user_id']
+            df.update(frecuencias[fila['id']].keys())
+
+        total = len(frecuencias)
+        idf = {t: math.log((1 + total) / (1 + n)) + 1 for t, n in df.items()}
+        self.vectores = {}
+        for servicio_id, tf in frecuencias.items():
+            # tf sublineal: los pesos por campo hacen que f >= 1
+            vector = {t: (1 + math.log(f)) * idf[t] for t, f in tf.items()}
+            norma = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+            self.vectores[servicio_id] = {t: w / norma for t, w in vector.items()}
+
+        limite = max(MAX_DF * total, 10)
+        self.indice = defaultdict(list)
+        for servicio_id, vector in self.vectores.items():
+            for t, w in vector.items():
+                if df[t] <= limite:
+                    self.indice[t].append((servicio_id, w))
+
+    def puntajes(self, servicio_id):
+        """{otro servicio: similitud coseno} con los que comparten algún término indexado."""
+        acumulado = defaultdict(float)
+        dueno = self.duenos[servicio_id]
+        for t, w in self.vectores[servicio_id].items():
+            for otro, w_otro in self.indice.get(t, ()):
+                if self.duenos[otro] != dueno:
+                    acumulado[otro] += w * w_otro
+        return acumulado
+
+    def vecinos(self, servicio_id, k=K):
+        candidatos = ((otro, p) for otro, p in self.puntajes(servicio_id).items() if p >= PUNTAJE_MINIMO)
+        return heapq.nlargest(k, candidatos, key=lambda par: (par[1], -par[0]))
+
+
+def cargar_corpus():
+    filas = (
+        Servicio.objects.order_by('id')
+        .values('id', 'user_id', 'title', 'description', 'profession', 'category')
+        .iterator(chunk_size=2000)
+    )
+    return Corpus(filas)
+
+
+def _filas(servicio_id, vecinos):
+    return [
+        ServicioSimilar(servicio_id=servicio_id, similar_id=otro, puntaje=puntaje)
+        for otro, puntaje in vecinos
+    ]
+
+
+def _limpiar_pendientes(versiones):
+    """
+    Quita la marca de pendiente a los servicios de `versiones` ({id: updated_at} leídos
+    antes de calcular) que no se editaron desde entonces: esos siguen pendientes.
+    """
+    items = list(versiones.items())
+    for inicio in range(0, len(items), 100):
+        sin_cambios = Q()
+        for servicio_id, updated_at in items[inicio:inicio + 100]:
+            sin_cambios |= Q(id=servicio_id, updated_at=updated_at)
+        Servicio.objects.filter(sin_cambios).update(similares_pendientes=False)
+
+
+def recalcular_todo(k=K, lote=LOTE):
+    """Recalcula los vecinos de todo el catálogo. Devuelve la cantidad de servicios."""
+    versiones = dict(Servicio.objects.filter(similares_pendientes=True).values_list('id', 'updated_at'))
+    corpus = cargar_corpus()
+    ids = sorted(corpus.vectores)
+    for inicio in range(0, len(ids), lote):
+        bloque = ids[inicio:inicio + lote]
+        filas = []
+        for servicio_id in bloque:
+            filas += _filas(servicio_id, corpus.vecinos(servicio_id, k))
+        with transaction.atomic():
+            ServicioSimilar.objects.filter(servicio_id__in=bloque).delete()
+            ServicioSimilar.objects.bulk_create(filas)
+    # Servicios borrados mientras se calculaba: sus filas se van por CASCADE
+    _limpiar_pendientes(versiones)
+    invalidar('servicios')  # los perfiles muestran los similares
+    return len(ids)
+
+
+def refrescar_pendientes(k=K):
+    """
+    Actualiza los servicios nuevos o editados: sus vecinos y su lugar en las listas de
+    los servicios parecidos. Los idf son los del catálogo actual, pero las listas de los
+    demás solo cambian respecto de los pendientes; el recálculo completo las pone al día.
+    Devuelve la cantidad de servicios actualizados.
+    """
+    versiones = dict(Servicio.objects.filter(similares_pendientes=True).values_list('id', 'updated_at'))
+    if not versiones:
+        return 0
+    # Los idf y los vecinos candidatos dependen de todo el catálogo: el corpus se carga entero
+    corpus = cargar_corpus()
+    pendientes = {servicio_id for servicio_id in versiones if servicio_id in corpus.vectores}
+
+    with transaction.atomic():
+        # Sus apariciones viejas en otras listas pueden no valer más
+        ServicioSimilar.objects.filter(similar_id__in=list(pendientes)).delete()
+        ServicioSimilar.objects.filter(servicio_id__in=list(pendientes)).delete()
+        filas = []
+        entrantes = defaultdict(list)  # servicio existente -> [(pendiente, puntaje)]
+        for servicio_id in sorted(pendientes):
+            puntajes = corpus.puntajes(servicio_id)
+            vecinos = heapq.nlargest(
+                k, ((o, p) for o, p in puntajes.items() if p >= PUNTAJE_MINIMO),
+                key=lambda par: (par[1], -par[0]),
+            )
+            filas += _filas(servicio_id, vecinos)
+            for otro, puntaje in puntajes.items():
+                if puntaje >= PUNTAJE_MINIMO and otro not in pendientes:
+                    entrantes[otro].append((servicio_id, puntaje))
+        ServicioSimilar.objects.bulk_create(filas)
+
+        # Cada servicio afectado conserva sus K mejores entre los actuales y los entrantes
+        actuales = defaultdict(list)
+        for fila in ServicioSimilar.objects.filter(servicio_id__in=list(entrantes)):
+            actuales[fila.servicio_id].append(fila)
+        nuevas, sobrantes = [], []
+        for servicio_id, candidatos in entrantes.items():
+            todos = [(f.similar_id, f.puntaje, f) for f in actuales[servicio_id]]
+            todos += [(otro, puntaje, None) for otro, puntaje in candidatos]
+            todos.sort(key=lambda t: (-t[1], t[0]))
+            for posicion, (otro, puntaje, fila) in enumerate(todos):
+                if posicion < k and fila is None:
+                    nuevas.append(ServicioSimilar(servicio_id=servicio_id, similar_id=otro, puntaje=puntaje))
+                elif posicion >= k and fila is not None:
+                    sobrantes.append(fila.pk)
+        ServicioSimilar.objects.filter(pk__in=sobrantes).delete()
+        ServicioSimilar.objects.bulk_create(nuevas)
+
+        # Recién ahora dejan de estar pendientes: si la tarea falla, el reintento los toma
+        _limpiar_pendientes(versiones)
+    invalidar('servicios')
+    return len(pendientes)
+
+
+def similares_de(servicio, limite=K):
+    return (
+        ServicioSimilar.objects.filter(servicio=servicio)
+        .select_related('similar')
+        .order_by('-puntaje', 'similar_id')[:limite]
+    )
+
+
+def similares_para_usuario(usuario_id):
+    """Vecinos de los servicios del usuario (siempre de otros usuarios), del más parecido al menos."""
+    return (
+        ServicioSimilar.objects.filter(servicio__user_id=usuario_id)
+        .select_related('similar')
+        .order_by('-puntaje', 'similar_id')
+    )
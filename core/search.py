@@ -0,0 +1,185 @@
+"""
+Búsqueda de servicios por texto completo.
+
+Indexa título, profesión, descripción y ubicación de cada Servicio en una tabla
+auxiliar según el motor de base de datos:
+
+- PostgreSQL: tabla core_servicio_busqueda con un tsvector ponderado e índice GIN,
+  más un índice de trigramas sobre el título para tolerar errores de tipeo (el
+  umbral de `<%` se fija en cada conexión nueva, ver core/signals.py).
+- SQLite: tabla virtual FTS5 core_servicio_fts (desarrollo local y tests).
+- Otros motores: sin índice, cae en icontains sobre los cuatro campos.
+
+Las tablas se crean en la migración 0008 y se mantienen desde core/signals.py.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+
+TABLA_PG = 'core_servicio_busqueda'
+TABLA_FTS = 'core_servicio_fts'
+
+DOCUMENTO_PG = (
+    "setweight(to_tsvector('spanish', coalesce(s.title, '')), 'A') || "
+    "setweight(to_tsvector('spanish', coalesce(s.profession, '')), 'B') || "
+    "setweight(to_tsvector('spanish', coalesce(s.description, '')), 'C') || "
+    "setweight(to_tsvector('spanish', coalesce(s.location, '')), 'D')"
+)
+
+# Similitud mínima de trigramas en PostgreSQL (pg_trgm.word_similarity_threshold)
+UMBRAL_TRIGRAMAS = 0.3
+
+
+class BusquedaPostgres:
+    def indexar(self, servicio_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {TABLA_PG} (servicio_id, documento) "
+                f"SELECT s.id, {DOCUMENTO_PG} FROM core_servicio s WHERE s.id = %s "
+                f"ON CONFLICT (servicio_id) DO UPDATE SET documento = EXCLUDED.documento",
+                [servicio_id],
+            )
+
+    def indexar_varios(self, servicio_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {TABLA_PG} (servicio_id, documento) "
+                f"SELECT s.id, {DOCUMENTO_PG} FROM core_servicio s WHERE s.id = ANY(%s) "
+                f"ON CONFLICT (servicio_id) DO UPDATE SET documento = EXCLUDED.documento",
+                [list(servicio_ids)],
+            )
+
+    def eliminar(self, servicio_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLA_PG} WHERE servicio_id = %s", [servicio_id])
+
+    def reindexar(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLA_PG}")
+            cursor.execute(
+                f"INSERT INTO {TABLA_PG} (servicio_id, documento) "
+                f"SELECT s.id, {DOCUMENTO_PG} FROM core_servicio s"
+            )
+
+    def buscar(self, queryset, termino):
+        consulta = "websearch_to_tsquery('spanish', %s)"
+        coincide = f"{TABLA_PG}.documento @@ {consulta}"
+        # Una sola consulta: coincidencias léxicas (GIN del tsvector) primero por ts_rank,
+        # después las parecidas por trigramas (`<%` usa el GIN de trigramas del título)
+        return queryset.extra(
+            select={
+                'lexico': coincide,
+                'rank': (
+                    f"CASE WHEN {coincide} THEN ts_rank({TABLA_PG}.documento, {consulta}) "
+                    f"ELSE word_similarity(%s, core_servicio.title) END"
+                ),
+            },
+            select_params=[termino, termino, termino, termino],
+            tables=[TABLA_PG],
+            where=[
+                f"{TABLA_PG}.servicio_id = core_servicio.id",
+                f"({coincide} OR %s <%% core_servicio.title)",
+            ],
+            params=[termino, termino],
+        ).order_by('-lexico', '-rank', '-id')
+
+    @staticmethod
+    def configurar_conexion(conexion):
+        """Umbral de `<%` para la sesión (el de pg_trgm por defecto es 0.6)."""
+        with conexion.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('pg_trgm.word_similarity_threshold', %s, false)",
+                [str(UMBRAL_TRIGRAMAS)],
+            )
+
+
+class BusquedaSqlite:
+    def indexar(self, servicio_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid = %s", [servicio_id])
+            cursor.execute(
+                f"INSERT INTO {TABLA_FTS} (rowid, title, profession, description, location) "
+                f"SELECT id, title, profession, description, location FROM core_servicio WHERE id = %s",
+                [servicio_id],
+            )
+
+    def indexar_varios(self, servicio_ids):
+        servicio_ids = list(servicio_ids)
+        marcas = ', '.join(['%s'] * len(servicio_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid IN ({marcas})", servicio_ids)
+            cursor.execute(
+                f"INSERT INTO {TABLA_FTS} (rowid, title, profession, description, location) "
+                f"SELECT id, title, profession, description, location FROM core_servicio WHERE id IN ({marcas})",
+                servicio_ids,
+            )
+
+    def eliminar(self, servicio_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid = %s", [servicio_id])
+
+    def reindexar(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLA_FTS}")
+            cursor.execute(
+                f"INSERT INTO {TABLA_FTS} (rowid, title, profession, description, location) "
+                f"SELECT id, title, profession, description, location FROM core_servicio"
+            )
+
+    @staticmethod
+    def _consulta_fts(termino):
+        # Cada palabra como prefijo entre comillas: evita inyectar sintaxis FTS5
+        palabras = re.findall(r'\w+', termino)
+        return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+    def buscar(self, queryset, termino):
+        consulta = self._consulta_fts(termino)
+        if not consulta:
+            return queryset.none()
+        # bm25 devuelve valores más bajos para mejores resultados; pesos por columna
+        return queryset.extra(
+            select={'rank': f"-bm25({TABLA_FTS}, 4.0, 2.0, 1.0, 1.0)"},
+            tables=[TABLA_FTS],
+            where=[f"{TABLA_FTS}.rowid = core_servicio.id", f"{TABLA_FTS} MATCH %s"],
+            params=[consulta],
+        ).order_by('-rank', '-id')
+
+
+class BusquedaBasica:
+    """Motores sin índice de texto: mismos campos, sin ranking."""
+
+    def indexar(self, servicio_id):
+        pass
+
+    def indexar_varios(self, servicio_ids):
+        pass
+
+    def eliminar(self, servicio_id):
+        pass
+
+    def reindexar(self):
+        pass
+
+    def buscar(self, queryset, termino):
+        filtro = Q()
+        for campo in ('title', 'profession', 'description', 'location'):
+            filtro |= Q(**{f'{campo}__icontains': termino})
+        return queryset.filter(filtro).annotate(
+            rank=Value(0.0, output_field=FloatField())
+        ).order_by('-id')
+
+
+BACKENDS = {
+    'postgresql': BusquedaPostgres,
+    'sqlite': BusquedaSqlite,
+}
+
+
+def get_backend():
+    return BACKENDS.get(connection.vendor, BusquedaBasica)()
+
+
+def buscar_servicios(queryset, termino):
+    """Filtra `queryset` por `termino` y lo ordena por relevancia (anotada como `rank`)."""
+    return get_backend().buscar(queryset, termino)
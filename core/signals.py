@@ -0,0 +1,159 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.db import transaction
+from django.dispatch import receiver
+
+from .autenticacion import invalidar_usuario
+from .cache import invalidar
+from .models import Usuario, Servicio, Mensaje, Notificacion, Valoracion
+from .notificaciones import incrementar_no_leidas, publicar_notificacion
+from .ratings import aplicar_delta, mover_de_categoria, promedio_previo, puntaje_bayesiano
+from .realtime import publicar
+from .search import BusquedaPostgres, get_backend
+from .tareas import pedir_refresco_similares
+from .ubicaciones import ubicar
+
+
+# -------------------------------------------------------
+# Agregados de valoraciones (Servicio / Usuario)
+# -------------------------------------------------------
+@receiver(pre_save, sender=Valoracion)
+def guardar_valoracion_previa(sender, instance, **kwargs):
+    """Recuerda servicio y puntuación anteriores para poder ajustar los agregados al editar."""
+    instance._valoracion_previa = None
+    if instance.pk:
+        instance._valoracion_previa = (
+            Valoracion.objects.filter(pk=instance.pk)
+            .values_list('servicio_id', 'puntuacion')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Valoracion)
+def actualizar_agregados_al_guardar(sender, instance, created, **kwargs):
+    previa = getattr(instance, '_valoracion_previa', None)
+    if previa and not created:
+        servicio_id, puntuacion = previa
+        if servicio_id == instance.servicio_id:
+            aplicar_delta(servicio_id, instance.puntuacion - puntuacion, 0)
+            return
+        aplicar_delta(servicio_id, -puntuacion, -1)
+    aplicar_delta(instance.servicio_id, instance.puntuacion, 1)
+
+
+@receiver(post_delete, sender=Valoracion)
+def actualizar_agregados_al_borrar(sender, instance, **kwargs):
+    aplicar_delta(instance.servicio_id, -instance.puntuacion, -1)
+
+
+@receiver(pre_save, sender=Servicio)
+def calcular_ranking_al_guardar(sender, instance, update_fields=None, **kwargs):
+    # Un servicio nuevo parte del promedio de su categoría
+    instance._categoria_previa = None
+    if instance.pk and (update_fields is None or 'category' in update_fields):
+        instance._categoria_previa = (
+            Servicio.objects.filter(pk=instance.pk).values_list('category', flat=True).first()
+        )
+    if instance._state.adding:
+        instance.ranking = puntaje_bayesiano(
+            instance.rating_sum, instance.rating_count, promedio_previo(instance.category)
+        )
+
+
+@receiver(post_save, sender=Servicio)
+def mover_ranking_de_categoria(sender, instance, created, **kwargs):
+    # Si cambió de categoría sus valoraciones pasan al promedio de la nueva
+    previa = getattr(instance, '_categoria_previa', None)
+    if not created and previa is not None and previa != instance.category:
+        mover_de_categoria(instance.pk, previa, instance.category)
+
+
+# -------------------------------------------------------
+# Localidad de Servicio / Usuario (ver core/ubicaciones.py)
+# -------------------------------------------------------
+@receiver(pre_save, sender=Servicio)
+@receiver(pre_save, sender=Usuario)
+def ubicar_al_guardar(sender, instance, update_fields=None, **kwargs):
+    # Con update_fields (p. ej. last_login, imágenes) no cambia la ubicación
+    if update_fields is None:
+        ubicar(instance)
+
+
+# -------------------------------------------------------
+# Índice de búsqueda de servicios (ver core/search.py)
+# -------------------------------------------------------
+@receiver(post_save, sender=Servicio)
+def indexar_servicio(sender, instance, **kwargs):
+    get_backend().indexar(instance.pk)
+
+
+@receiver(post_delete, sender=Servicio)
+def desindexar_servicio(sender, instance, **kwargs):
+    get_backend().eliminar(instance.pk)
+
+
+@receiver(connection_created)
+def configurar_busqueda(sender, connection, **kwargs):
+    if connection.vendor == 'postgresql':
+        BusquedaPostgres.configurar_conexion(connection)
+
+
+# -------------------------------------------------------
+# Servicios similares (ver core/recomendaciones.py)
+# -------------------------------------------------------
+@receiver(pre_save, sender=Servicio)
+def marcar_similares_pendientes(sender, instance, update_fields=None, **kwargs):
+    # Con update_fields (imágenes, agregados) no cambia el texto
+    if update_fields is None:
+        instance.similares_pendientes = True
+
+
+@receiver(post_save, sender=Servicio)
+def encolar_refresco_similares(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None:
+        transaction.on_commit(pedir_refresco_similares)
+
+
+# -------------------------------------------------------
+# Eventos en tiempo real (ver core/realtime.py)
+# -------------------------------------------------------
+@receiver(post_save, sender=Mensaje)
+def publicar_mensaje(sender, instance, created, **kwargs):
+    if not created:
+        return
+    publicar(instance.receiver_id, 'mensaje', {
+        'id': instance.id,
+        'sender_id': instance.sender_id,
+        'sender': instance.sender.username,
+        'content': instance.content,
+        'timestamp': instance.timestamp.isoformat(),
+    })
+
+
+@receiver(post_save, sender=Notificacion)
+def notificacion_creada(sender, instance, created, **kwargs):
+    if not created:
+        return
+    # Las que crea core.notificaciones.notificar (bulk_create) no pasan por acá
+    if not instance.leida:
+        transaction.on_commit(lambda: incrementar_no_leidas(instance.receptor_id))
+    publicar_notificacion(instance)
+
+
+# -------------------------------------------------------
+# Invalidación de caché (ver core/cache.py)
+# -------------------------------------------------------
+@receiver(post_save, sender=Servicio)
+@receiver(post_delete, sender=Servicio)
+@receiver(post_save, sender=Valoracion)
+@receiver(post_delete, sender=Valoracion)
+def invalidar_cache_servicios(sender, **kwargs):
+    transaction.on_commit(lambda: invalidar('servicios'))
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def invalidar_usuario_cacheado(sender, instance, **kwargs):
+    # Ahora para este hilo y al confirmar para los requests que lo leyeron mientras tanto
+    invalidar_usuario(instance.pk)
+    transaction.on_commit(lambda: invalidar_usuario(instance.pk))
@@ -0,0 +1,174 @@
+"""
+Cola de tareas en segundo plano respaldada por la base de datos.
+
+Las vistas encolan trabajo lento (notificaciones, subidas de imágenes a Cloudinary)
+con `encolar()` dentro del mismo `transaction.atomic()` que guarda el objeto: se
+confirman los dos o ninguno. El comando `procesar_tareas` las ejecuta con reintentos
+y backoff exponencial.
+
+Para tomar una tarea, el worker hace un UPDATE condicionado al estado: funciona
+igual en PostgreSQL y SQLite, y dos workers nunca ejecutan la misma tarea.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from . import notificaciones as servicio_notificaciones
+from . import recomendaciones
+from .imagenes import procesar_imagen
+from .models import Notificacion, Tarea
+
+logger = logging.getLogger(__name__)
+
+_REGISTRO = {}
+
+
+def tarea(nombre):
+    """Registra la función como manejador de las tareas `nombre`."""
+    def decorador(funcion):
+        _REGISTRO[nombre] = funcion
+        return funcion
+    return decorador
+
+
+def encolar(nombre, adjunto=None, max_intentos=None, **datos):
+    if nombre not in _REGISTRO:
+        raise ValueError(f"Tarea desconocida: {nombre}")
+    return Tarea.objects.create(
+        nombre=nombre,
+        datos=datos,
+        adjunto=adjunto,
+        max_intentos=max_intentos or settings.TAREAS_MAX_INTENTOS,
+    )
+
+
+def tomar_tareas(limite):
+    """Reserva hasta `limite` tareas listas para ejecutar y las devuelve."""
+    ahora = timezone.now()
+    candidatas = (
+        Tarea.objects.filter(
+            # Las "en curso" con el bloqueo vencido son de un worker que se cayó
+            Q(estado=Tarea.PENDIENTE) | Q(estado=Tarea.EN_CURSO),
+            ejecutar_desde__lte=ahora,
+        )
+        .order_by('ejecutar_desde', 'id')
+        .values_list('id', 'estado', 'intentos')[:limite]
+    )
+    bloqueo = ahora + timedelta(seconds=settings.TAREAS_BLOQUEO_SEGUNDOS)
+    tomadas = []
+    for tarea_id, estado, intentos in candidatas:
+        reservada = Tarea.objects.filter(id=tarea_id, estado=estado, intentos=intentos).update(
+            estado=Tarea.EN_CURSO, intentos=intentos + 1, ejecutar_desde=bloqueo, actualizada=ahora,
+        )
+        if reservada:
+            tomadas.append(tarea_id)
+    return tomadas
+
+
+def ejecutar(tarea_id):
+    """Ejecuta una tarea ya reservada; si falla, la reprograma con backoff o la da por fallida."""
+    close_old_connections()
+    try:
+        obj = Tarea.objects.get(id=tarea_id)
+        try:
+            _REGISTRO[obj.nombre](obj, **obj.datos)
+        except Exception:
+            error = traceback.format_exc()
+            logger.exception("Falló la tarea %s", obj)
+            if obj.intentos >= obj.max_intentos:
+                Tarea.objects.filter(id=obj.id).update(
+                    estado=Tarea.FALLIDA, error=error, actualizada=timezone.now(),
+                )
+            else:
+                espera = settings.TAREAS_BACKOFF_SEGUNDOS * 2 ** (obj.intentos - 1)
+                Tarea.objects.filter(id=obj.id).update(
+                    estado=Tarea.PENDIENTE,
+                    error=error,
+                    ejecutar_desde=timezone.now() + timedelta(seconds=espera),
+                    actualizada=timezone.now(),
+                )
+            return False
+        Tarea.objects.filter(id=obj.id).update(
+            estado=Tarea.COMPLETADA, adjunto=None, error='', actualizada=timezone.now(),
+        )
+        return True
+    finally:
+        close_old_connections()
+
+
+def procesar_pendientes(limite=100):
+    """Ejecuta en este hilo las tareas listas. Devuelve cuántas se procesaron."""
+    tomadas = tomar_tareas(limite)
+    for tarea_id in tomadas:
+        ejecutar(tarea_id)
+    return len(tomadas)
+
+
+# -------------------------------------------------------
+# Imágenes: se suben desde el worker, no durante el request
+# -------------------------------------------------------
+def separar_imagen(instancia, campo):
+    """
+    Si `campo` tiene un archivo recién subido sin guardar, lo quita de la instancia
+    (dejando el valor anterior) y lo devuelve para subirlo con `encolar_imagen`.
+    """
+    archivo = getattr(instancia, campo)
+    if not archivo or archivo._committed:
+        return None
+    subido = archivo.file
+    if instancia.pk:
+        anterior = type(instancia).objects.filter(pk=instancia.pk).values_list(campo, flat=True).first()
+    else:
+        anterior = instancia._meta.get_field(campo).get_default()
+    setattr(instancia, campo, anterior)
+    return subido
+
+
+def encolar_imagen(instancia, campo, subido):
+    subido.seek(0)
+    return encolar(
+        'subir_imagen',
+        adjunto=subido.read(),
+        modelo=instancia._meta.label,
+        pk=instancia.pk,
+        campo=campo,
+        nombre_archivo=subido.name,
+    )
+
+
+@tarea('subir_imagen')
+def subir_imagen(tarea, modelo, pk, campo, nombre_archivo):
+    instancia = apps.get_model(modelo).objects.filter(pk=pk).first()
+    if instancia is None:
+        return
+    procesar_imagen(instancia, campo, nombre_archivo, bytes(tarea.adjunto))
+    instancia.save(update_fields=[campo, f'{campo}_variantes', 'updated_at'])
+
+
+# -------------------------------------------------------
+# Notificaciones
+# -------------------------------------------------------
+@tarea('notificar')
+def notificar(tarea, receptor_id, emisor_id, mensaje, tipo=Notificacion.MENSAJE):
+    # `receptor_id` puede ser una lista (un evento para varios usuarios)
+    servicio_notificaciones.notificar(receptor_id, emisor_id, tipo, mensaje)
+
+
+# -------------------------------------------------------
+# Servicios similares
+# -------------------------------------------------------
+@tarea('refrescar_similares')
+def refrescar_similares(tarea):
+    recomendaciones.refrescar_pendientes()
+
+
+def pedir_refresco_similares():
+    """Encola `refrescar_similares` salvo que ya haya una pendiente: atiende a todos los marcados."""
+    if not Tarea.objects.filter(nombre='refrescar_similares', estado=Tarea.PENDIENTE).exists():
+        encolar('refrescar_similares')
@@ -0,0 +1,19 @@
+from django import template
+from django.template.loader import render_to_string
+
+from core.cache import obtener_o_calcular
+
+register = template.Library()
+
+
+@register.simple_tag
+def tarjeta_servicio(service, puede_valorar):
+    """Tarjeta de un servicio en el perfil, cacheada hasta que cambien servicios o valoraciones."""
+    return obtener_o_calcular(
+        'servicios',
+        ('tarjeta', service.id, bool(puede_valorar)),
+        lambda: render_to_string('servicio_tarjeta.html', {
+            'service': service,
+            'puede_valorar': puede_valorar,
+        }),
+    )
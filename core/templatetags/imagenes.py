@@ -0,0 +1,32 @@
+from django import template
+
+from core.imagenes import url_imagen
+
+register = template.Library()
+
+
+def _url_original(objeto, campo, respaldo):
+    # Usuario expone profile_image_url con su propio respaldo (default.png)
+    propia = getattr(objeto, f'{campo}_url', None)
+    if propia:
+        return propia
+    return url_imagen(objeto, campo) or respaldo
+
+
+@register.simple_tag
+def imagen_url(objeto, campo, variante, ext='jpg', respaldo=''):
+    """URL de la variante, o del original si todavía no se generaron las miniaturas."""
+    return url_imagen(objeto, campo, variante, ext) or _url_original(objeto, campo, respaldo)
+
+
+@register.inclusion_tag('imagen_variante.html')
+def imagen(objeto, campo, variante, alt='', clase='', estilo='', respaldo=''):
+    """<picture> con la variante en WebP y JPEG de respaldo; sin variantes, el original."""
+    return {
+        'webp': url_imagen(objeto, campo, variante, 'webp'),
+        'jpg': url_imagen(objeto, campo, variante, 'jpg'),
+        'original': _url_original(objeto, campo, respaldo),
+        'alt': alt,
+        'clase': clase,
+        'estilo': estilo,
+    }
@@ -1,3 +1,1293 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import tempfile
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.storage import InMemoryStorage
+from django.core.handlers.asgi import ASGIHandler
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.template import Context, Template
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from PIL import Image
+from unittest import mock
+
+from .autenticacion import clave_usuario
+from .benchmark import comparar
+from .cache import estadisticas
+from .consumers import EventosConsumer
+from .forms import ServicioForm
+from .exportacion import lineas
+from .imagenes import VARIANTES, limpiar_urls, resolver_urls
+from .management.commands.auditar_indices import ESCANEO
+from .models import Usuario, Servicio, ServicioSimilar, RankingCategoria, Mensaje, Valoracion, Notificacion, Tarea, Conversacion
+from .notificaciones import contar_no_leidas, marcar_todas_leidas, notificar
+from .pagination import codificar_cursor
+from .ratings import PESO_PREVIO, PROMEDIO_POR_DEFECTO, verificar_agregados
+from .recomendaciones import recalcular_todo, refrescar_pendientes
+from .perfilado import PerfiladoMiddleware, reiniciar as reiniciar_perfilado
+from .search import buscar_servicios
+from .tareas import encolar, procesar_pendientes, tarea
+from .ubicaciones import distancia_km, geocodificar_todos
+
+# Producción con una caché compartida: sesiones cached_db y usuario del request cacheado
+CACHE_COMPARTIDA = override_settings(
+    CACHE_COMPARTIDA=True, SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+)
+
+
+def crear_servicios(user, cantidad, autores=()):
+    """Crea `cantidad` servicios para `user`, cada uno valorado y comentado por `autores`."""
+    servicios = Servicio.objects.bulk_create([
+        Servicio(
+            user=user,
+            title=f"Servicio {i}",
+            description="Descripción de prueba",
+            category='hogar',
+            profession="Plomero",
+            location="Rosario",
+        )
+        for i in range(cantidad)
+    ])
+    Valoracion.objects.bulk_create([
+        Valoracion(servicio=servicio, autor=autor, puntuacion=4, comentario="Muy bueno")
+        for servicio in servicios
+        for autor in autores
+    ])
+    return servicios
+
+
+@CACHE_COMPARTIDA
+class ProfileQueryCountTests(TestCase):
+    # usuario logueado (la primera vez; la sesión sale de la caché) + perfil + fechas
+    # para el ETag + servicios + comentarios (con autor) + similares
+    MAX_QUERIES = 6
+
+    def setUp(self):
+        cache.clear()
+        self.owner = Usuario.objects.create_user(username="owner", password="x")
+        self.autores = [
+            Usuario.objects.create_user(username=f"autor{i}", password="x")
+            for i in range(2)
+        ]
+        self.client.force_login(self.autores[0])
+
+    def assertProfileQueries(self, cantidad):
+        crear_servicios(self.owner, cantidad, self.autores)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('profile', args=[self.owner.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['servicios']), cantidad)
+        self.assertLessEqual(
+            len(ctx.captured_queries), self.MAX_QUERIES,
+            "\n".join(q['sql'] for q in ctx.captured_queries),
+        )
+
+    def test_profile_1_service(self):
+        self.assertProfileQueries(1)
+
+    def test_profile_50_services(self):
+        self.assertProfileQueries(50)
+
+    def test_profile_500_services(self):
+        self.assertProfileQueries(500)
+
+    def test_profile_shows_only_reviews_with_comment(self):
+        servicio = crear_servicios(self.owner, 1)[0]
+        Valoracion.objects.create(servicio=servicio, autor=self.autores[0], puntuacion=5)
+        Valoracion.objects.create(servicio=servicio, autor=self.autores[1], puntuacion=3, comentario="Puntual")
+        response = self.client.get(reverse('profile', args=[self.owner.id]))
+        self.assertContains(response, "Puntual")
+        self.assertEqual(len(response.context['servicios'][0].comentarios), 1)
+        self.assertContains(response, "(4,0)")
+
+
+class ServiceSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = Usuario.objects.create_user(username="owner", password="x")
+        self.client.force_login(self.user)
+
+    def crear(self, **campos):
+        datos = dict(user=self.user, title="Servicio", description="", category='hogar',
+                     profession="", location="")
+        datos.update(campos)
+        return Servicio.objects.create(**datos)
+
+    def test_ranks_title_above_description(self):
+        en_descripcion = self.crear(title="Arreglos", description="también clases de guitarra")
+        en_titulo = self.crear(title="Clases de guitarra")
+        response = self.client.get(reverse('services'), {'search': 'guitarra'})
+        self.assertEqual(list(response.context['services']), [en_titulo, en_descripcion])
+
+    def test_index_follows_save_and_delete(self):
+        servicio = self.crear(title="Pintura", location="Córdoba")
+        self.assertEqual(list(buscar_servicios(Servicio.objects.all(), "cordoba")), [servicio])
+        servicio.location = "Mendoza"
+        servicio.save()
+        self.assertFalse(buscar_servicios(Servicio.objects.all(), "cordoba").exists())
+        servicio.delete()
+        self.assertFalse(buscar_servicios(Servicio.objects.all(), "pintura").exists())
+
+
+class ServiceCursorPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = Usuario.objects.create_user(username="owner", password="x")
+        self.client.force_login(self.user)
+        crear_servicios(self.user, 20)
+        self.ids = list(Servicio.objects.order_by('-id').values_list('id', flat=True))
+
+    def ids_de(self, response):
+        return [servicio.id for servicio in response.context['services']]
+
+    def test_walks_forward_and_back_with_cursors(self):
+        response = self.client.get(reverse('services'))
+        paginas = [self.ids_de(response)]
+        vistos = list(paginas[0])
+        while response.context['page_obj'].has_next():
+            response = self.client.get(reverse('services'), {'cursor': response.context['page_obj'].next_cursor})
+            paginas.append(self.ids_de(response))
+            vistos += paginas[-1]
+        self.assertEqual(vistos, self.ids)
+
+        for esperada in reversed(paginas[:-1]):
+            response = self.client.get(reverse('services'), {'cursor': response.context['page_obj'].previous_cursor})
+            self.assertEqual(self.ids_de(response), esperada)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_legacy_page_parameter(self):
+        response = self.client.get(reverse('services'), {'page': 3})
+        self.assertEqual(self.ids_de(response), self.ids[12:18])
+        page = response.context['page_obj']
+        response = self.client.get(reverse('services'), {'cursor': page.next_cursor})
+        self.assertEqual(self.ids_de(response), self.ids[18:])
+
+    def test_out_of_range_page_falls_back_to_first_page(self):
+        with mock.patch('core.pagination.MAX_PAGINA_NUMERADA', 2):
+            for page in (3, 10 ** 12, -1, 'abc'):
+                response = self.client.get(reverse('services'), {'page': page})
+                self.assertEqual(self.ids_de(response), self.ids[:6])
+            response = self.client.get(reverse('services'), {'page': 2})
+            self.assertEqual(self.ids_de(response), self.ids[6:12])
+
+    def test_page_past_the_end_serves_the_last_page(self):
+        # Las últimas 6 filas, con enlace hacia atrás y sin siguiente
+        response = self.client.get(reverse('services'), {'page': 10})
+        self.assertEqual(self.ids_de(response), self.ids[-6:])
+        page = response.context['page_obj']
+        self.assertFalse(page.has_next())
+        response = self.client.get(reverse('services'), {'cursor': page.previous_cursor})
+        self.assertEqual(self.ids_de(response), self.ids[-12:-6])
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        for cursor in ('no-es-un-cursor', codificar_cursor(['abc'], 'n')):
+            response = self.client.get(reverse('services'), {'cursor': cursor})
+            self.assertEqual(self.ids_de(response), self.ids[:6])
+
+
+class ChatDeltaTests(TestCase):
+    def setUp(self):
+        self.yo = Usuario.objects.create_user(username="yo", password="x")
+        self.otro = Usuario.objects.create_user(username="otro", password="x")
+        self.tercero = Usuario.objects.create_user(username="tercero", password="x")
+        self.client.force_login(self.yo)
+        self.mensajes = [
+            Mensaje.objects.create(sender=self.yo if i % 2 else self.otro,
+                                   receiver=self.otro if i % 2 else self.yo,
+                                   content=f"mensaje {i}")
+            for i in range(5)
+        ]
+        Mensaje.objects.create(sender=self.tercero, receiver=self.yo, content="de otra conversación")
+
+    def ids(self, response):
+        return [m['id'] for m in response.json()['mensajes']]
+
+    def test_new_messages_after_id(self):
+        response = self.client.get(reverse('mensajes_nuevos', args=[self.otro.id]),
+                                   {'after': self.mensajes[2].id})
+        self.assertEqual(self.ids(response), [m.id for m in self.mensajes[3:]])
+        self.assertEqual(response.json()['mensajes'][0]['sender'], "yo")
+
+    def test_new_messages_without_known_cursor_return_latest(self):
+        with mock.patch('core.views.MENSAJES_POR_PAGINA', 3):
+            for after in ('', 'abc', str(self.mensajes[-1].id + 1000)):
+                response = self.client.get(reverse('mensajes_nuevos', args=[self.otro.id]),
+                                           {'after': after})
+                self.assertEqual(self.ids(response), [m.id for m in self.mensajes[2:]])
+                self.assertFalse(response.json()['hay_mas'])
+
+    def test_older_messages_before_id(self):
+        response = self.client.get(reverse('mensajes_anteriores', args=[self.otro.id]),
+                                   {'before': self.mensajes[3].id})
+        self.assertEqual(self.ids(response), [m.id for m in self.mensajes[:3]])
+        self.assertFalse(response.json()['hay_mas'])
+
+    def test_send_message_returns_json(self):
+        response = self.client.post(reverse('send_message', args=[self.otro.id]),
+                                    {'message': "hola"}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['mensaje']['content'], "hola")
+        self.assertTrue(response.json()['mensaje']['propio'])
+
+    def test_chat_page_renders_last_messages(self):
+        response = self.client.get(reverse('chat', args=[self.otro.id]))
+        self.assertEqual(list(response.context['messages']), self.mensajes)
+        self.assertNotContains(response, "de otra conversación")
+
+
+class RealtimeEventsTests(TestCase):
+    def setUp(self):
+        self.yo = Usuario.objects.create_user(username="yo", password="x")
+        self.otro = Usuario.objects.create_user(username="otro", password="x")
+
+    async def conectar(self, user):
+        communicator = WebsocketCommunicator(EventosConsumer.as_asgi(), "/ws/eventos/")
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+    def enviar_mensaje(self):
+        self.client.force_login(self.otro)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('send_message', args=[self.yo.id]), {'message': "hola"})
+            procesar_pendientes()
+
+    async def test_send_message_pushes_message_and_notification(self):
+        communicator, connected = await self.conectar(self.yo)
+        self.assertTrue(connected)
+        await sync_to_async(self.enviar_mensaje)()
+
+        eventos = [await communicator.receive_json_from() for _ in range(2)]
+        self.assertEqual({e['tipo'] for e in eventos}, {'mensaje', 'notificacion'})
+        mensaje = next(e['datos'] for e in eventos if e['tipo'] == 'mensaje')
+        self.assertEqual((mensaje['sender'], mensaje['content']), ("otro", "hola"))
+        await communicator.disconnect()
+
+    def test_pages_open_the_socket_only_with_realtime_enabled(self):
+        self.client.force_login(self.yo)
+        for activo in (False, True):
+            with override_settings(TIEMPO_REAL_ACTIVO=activo):
+                for url in (reverse('home'), reverse('chat', args=[self.otro.id])):
+                    respuesta = self.client.get(url)
+                    self.assertEqual('/ws/eventos/' in respuesta.content.decode(), activo, url)
+
+    async def test_anonymous_connection_is_rejected(self):
+        communicator, connected = await self.conectar(AnonymousUser())
+        self.assertFalse(connected)
+
+
+class UnreadNotificationCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.yo = Usuario.objects.create_user(username="yo", password="x")
+        self.otro = Usuario.objects.create_user(username="otro", password="x")
+        self.client.force_login(self.yo)
+
+    def notificar(self, cantidad=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                Notificacion.objects.create(receptor=self.yo, emisor=self.otro, mensaje="hola")
+                for _ in range(cantidad)
+            ]
+
+    def test_counter_follows_create_and_mark_read(self):
+        self.assertEqual(contar_no_leidas(self.yo.id), 0)
+        notifs = self.notificar(3)
+        with self.assertNumQueries(0):
+            self.assertEqual(contar_no_leidas(self.yo.id), 3)
+        self.client.get(reverse('marcar_notificacion', args=[notifs[0].id]))
+        self.client.get(reverse('marcar_notificacion', args=[notifs[0].id]))
+        self.assertEqual(contar_no_leidas(self.yo.id), 2)
+
+    def test_mark_all_read_is_a_single_update(self):
+        self.notificar(5)
+        with self.assertNumQueries(1):
+            self.assertEqual(marcar_todas_leidas(self.yo), 5)
+        self.assertEqual(contar_no_leidas(self.yo.id), 0)
+
+    def test_home_badge_uses_cached_counter(self):
+        self.notificar(2)
+        contar_no_leidas(self.yo.id)
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['no_leidas'], 2)
+
+    def test_notification_list_is_paginated(self):
+        self.notificar(25)
+        response = self.client.get(reverse('notificaciones'))
+        self.assertEqual(len(response.context['notifs']), 20)
+        response = self.client.get(reverse('notificaciones'), {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(len(response.context['notifs']), 5)
+
+
+
+class NotificationCoalescingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.yo = Usuario.objects.create_user(username="yo", password="x")
+        self.otro = Usuario.objects.create_user(username="otro", password="x")
+        self.tercero = Usuario.objects.create_user(username="tercero", password="x")
+
+    def test_burst_of_messages_is_one_notification(self):
+        self.client.force_login(self.otro)
+        for texto in ("hola", "¿estás?", "te escribo por la clase"):
+            self.client.post(reverse('send_message', args=[self.yo.id]), {'message': texto})
+        with self.captureOnCommitCallbacks(execute=True):
+            procesar_pendientes()
+
+        notif = Notificacion.objects.get()
+        self.assertEqual((notif.cantidad, notif.tipo), (3, Notificacion.MENSAJE))
+        self.assertIn("te escribo por la clase", notif.mensaje)
+        self.assertEqual(contar_no_leidas(self.yo.id), 1)
+
+        notif.leida = True
+        notif.save()
+        notificar(self.yo.id, self.otro.id, Notificacion.MENSAJE, "de nuevo")
+        self.assertEqual(Notificacion.objects.filter(leida=False).get().cantidad, 1)
+
+    def test_fan_out_updates_and_creates_in_bulk(self):
+        previa = Notificacion.objects.create(
+            receptor=self.yo, emisor=self.otro, tipo=Notificacion.VALORACION, mensaje="antes",
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            resultado = notificar([self.yo.id, self.tercero.id, self.otro.id], self.otro.id,
+                                  Notificacion.VALORACION, "nueva valoración")
+        self.assertEqual(len(resultado), 2)  # el emisor no se notifica a sí mismo
+        self.assertEqual(len([q for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]), 3)
+        previa.refresh_from_db()
+        self.assertEqual((previa.cantidad, previa.mensaje), (2, "nueva valoración"))
+        self.assertTrue(Notificacion.objects.filter(receptor=self.tercero, cantidad=1).exists())
+
+
+    def test_groups_into_the_latest_unread_with_a_single_update(self):
+        antigua, reciente = [
+            Notificacion.objects.create(receptor=self.yo, emisor=self.otro, tipo=Notificacion.MENSAJE, mensaje=texto)
+            for texto in ("antigua", "reciente")
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            resultado = notificar(self.yo.id, self.otro.id, Notificacion.MENSAJE, "otra más")
+        self.assertEqual([(n.pk, n.cantidad) for n in resultado], [(reciente.pk, 2)])
+        self.assertTrue(any('"cantidad" = ("core_notificacion"."cantidad" + 1)' in q['sql']
+                            for q in ctx.captured_queries))
+        antigua.refresh_from_db()
+        self.assertEqual((antigua.cantidad, antigua.mensaje), (1, "antigua"))
+
+
+@override_settings(CACHE_FRAGMENTOS=True)
+class CacheLayerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = Usuario.objects.create_user(username="owner", password="x")
+        self.client.force_login(self.user)
+        crear_servicios(self.user, 3)
+
+    def test_services_listing_is_served_from_cache(self):
+        self.client.get(reverse('services'), {'category': 'hogar'})
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('services'), {'category': 'hogar'})
+        # Solo los validadores (MAX/COUNT sobre índices); el listado sale de la caché
+        consultas = [q['sql'] for q in ctx.captured_queries if 'core_servicio' in q['sql']]
+        self.assertEqual(len(consultas), 1)
+        self.assertIn('MAX("core_servicio"."updated_at")', consultas[0])
+        self.assertEqual(estadisticas()['servicios'], {'hits': 1, 'misses': 1, 'ratio': 0.5})
+
+    def test_listing_is_invalidated_when_a_service_changes(self):
+        self.client.get(reverse('services'))
+        with self.captureOnCommitCallbacks(execute=True):
+            nuevo = Servicio.objects.create(
+                user=self.user, title="Nuevo servicio", description="", category='salud',
+                profession="", location="",
+            )
+        response = self.client.get(reverse('services'))
+        self.assertContains(response, nuevo.title)
+
+    @override_settings(CACHE_FRAGMENTOS=False)
+    def test_nothing_is_cached_with_a_per_process_cache(self):
+        self.client.get(reverse('services'))
+        # Cambio hecho por otro proceso: su invalidación no llega a esta caché
+        with mock.patch('core.signals.invalidar'):
+            nuevo = crear_servicios(self.user, 1)[0]
+        self.assertContains(self.client.get(reverse('services')), nuevo.title)
+        self.client.logout()
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'))
+        self.assertEqual(estadisticas()['servicios']['hits'] + estadisticas()['paginas']['hits'], 0)
+
+    def test_home_is_cached_only_for_anonymous_users(self):
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'))
+        self.assertEqual(estadisticas()['paginas']['hits'], 0)
+        self.client.logout()
+        self.client.get(reverse('home'))
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(estadisticas()['paginas']['hits'], 1)
+
+    def test_stats_endpoint_is_staff_only(self):
+        response = self.client.get(reverse('cache_estadisticas'))
+        self.assertEqual(response.status_code, 302)
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('cache_estadisticas'))
+        self.assertIn('servicios', response.json())
+
+
+_fallos = []
+
+
+@tarea('prueba_falla')
+def _tarea_que_falla(tarea, veces):
+    _fallos.append(tarea.intentos)
+    if tarea.intentos <= veces:
+        raise RuntimeError("falla a propósito")
+
+
+@override_settings(TAREAS_MAX_INTENTOS=3, TAREAS_BACKOFF_SEGUNDOS=10)
+class BackgroundQueueTests(TestCase):
+    def setUp(self):
+        _fallos.clear()
+        self.yo = Usuario.objects.create_user(username="yo", password="x")
+        self.otro = Usuario.objects.create_user(username="otro", password="x")
+
+    def test_send_message_defers_notification(self):
+        self.client.force_login(self.otro)
+        self.client.post(reverse('send_message', args=[self.yo.id]), {'message': "hola"})
+        self.assertTrue(Mensaje.objects.filter(receiver=self.yo).exists())
+        self.assertFalse(Notificacion.objects.exists())
+        self.assertEqual(procesar_pendientes(), 1)
+        self.assertEqual(Notificacion.objects.get().receptor, self.yo)
+        self.assertEqual(Tarea.objects.get().estado, Tarea.COMPLETADA)
+
+    def test_message_is_not_saved_if_its_notification_cannot_be_queued(self):
+        self.client.force_login(self.otro)
+        with mock.patch('core.views.encolar', side_effect=DatabaseError("cola caída")), \
+                self.assertRaises(DatabaseError):
+            self.client.post(reverse('send_message', args=[self.yo.id]), {'message': "hola"})
+        self.assertFalse(Mensaje.objects.exists())
+        self.assertFalse(Conversacion.objects.exists())
+
+    def test_failed_task_is_retried_with_backoff(self):
+        obj = encolar('prueba_falla', veces=1)
+        with self.assertLogs('core.tareas', 'ERROR'):
+            procesar_pendientes()
+        obj.refresh_from_db()
+        self.assertEqual((obj.estado, obj.intentos), (Tarea.PENDIENTE, 1))
+        self.assertGreater(obj.ejecutar_desde, timezone.now() + timezone.timedelta(seconds=5))
+        self.assertEqual(procesar_pendientes(), 0)
+
+        Tarea.objects.update(ejecutar_desde=timezone.now())
+        procesar_pendientes()
+        obj.refresh_from_db()
+        self.assertEqual(obj.estado, Tarea.COMPLETADA)
+        self.assertEqual(_fallos, [1, 2])
+
+    def test_task_fails_after_max_attempts(self):
+        obj = encolar('prueba_falla', veces=10)
+        for _ in range(3):
+            Tarea.objects.update(ejecutar_desde=timezone.now())
+            with self.assertLogs('core.tareas', 'ERROR'):
+                procesar_pendientes()
+        obj.refresh_from_db()
+        self.assertEqual((obj.estado, obj.intentos), (Tarea.FALLIDA, 3))
+        self.assertIn("falla a propósito", obj.error)
+
+    def test_service_image_is_uploaded_by_worker(self):
+        self.client.force_login(self.yo)
+        imagen = SimpleUploadedFile("foto.gif", GIF_1PX, content_type="image/gif")
+        storage = InMemoryStorage()
+        with mock.patch.object(Servicio._meta.get_field('image'), 'storage', storage):
+            self.client.post(reverse('create_service'), {
+                'title': "Clases", 'description': "Descripción", 'category': 'educacion',
+                'profession': "Docente", 'location': "Rosario", 'image': imagen,
+            })
+            servicio = Servicio.objects.get()
+            self.assertFalse(servicio.image)
+            procesar_pendientes()
+            servicio.refresh_from_db()
+            self.assertTrue(storage.exists(servicio.image.name))
+        self.assertIsNone(Tarea.objects.get().adjunto)
+
+
+def jpeg_con_exif(ancho, alto):
+    imagen = Image.new('RGB', (ancho, alto), 'red')
+    exif = Image.Exif()
+    exif[0x010F] = "Camara de prueba"  # Make
+    salida = io.BytesIO()
+    imagen.save(salida, 'JPEG', exif=exif)
+    return salida.getvalue()
+
+
+class ImagePipelineTests(TestCase):
+    def setUp(self):
+        self.yo = Usuario.objects.create_user(username="yo", password="x")
+        self.storage = InMemoryStorage()
+        parche = mock.patch.object(Servicio._meta.get_field('image'), 'storage', self.storage)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def subir(self, contenido, nombre="foto.jpg"):
+        self.client.force_login(self.yo)
+        return self.client.post(reverse('create_service'), {
+            'title': "Clases", 'description': "Descripción", 'category': 'educacion',
+            'profession': "Docente", 'location': "Rosario",
+            'image': SimpleUploadedFile(nombre, contenido, content_type="image/jpeg"),
+        })
+
+    def test_worker_generates_variants_without_metadata(self):
+        self.subir(jpeg_con_exif(2000, 1000))
+        procesar_pendientes()
+        servicio = Servicio.objects.get()
+
+        with self.storage.open(servicio.image.name) as f, Image.open(f) as original:
+            self.assertNotIn(0x010F, original.getexif())
+        for variante, (ancho, alto, recortar) in VARIANTES.items():
+            for ext, formato in (('webp', 'WEBP'), ('jpg', 'JPEG')):
+                nombre = servicio.image_variantes[variante][ext]
+                with self.storage.open(nombre) as f, Image.open(f) as imagen:
+                    self.assertEqual(imagen.format, formato)
+                    self.assertNotIn(0x010F, imagen.getexif())
+                    esperado = (ancho, alto) if recortar else (ancho, ancho // 2)
+                    self.assertEqual(imagen.size, esperado)
+
+        html = Template("{% load imagenes %}{% imagen s 'image' 'avatar' %}").render(Context({'s': servicio}))
+        self.assertIn(servicio.image_variantes['avatar']['webp'], html)
+        self.assertIn('<picture>', html)
+
+    def test_template_falls_back_to_original_when_image_changes(self):
+        self.subir(jpeg_con_exif(300, 300))
+        procesar_pendientes()
+        servicio = Servicio.objects.get()
+        servicio.image = self.storage.save("services/otra.jpg", io.BytesIO(jpeg_con_exif(10, 10)))
+        html = Template("{% load imagenes %}{% imagen s 'image' 'card' %}").render(Context({'s': servicio}))
+        self.assertNotIn('<picture>', html)
+        self.assertIn("otra.jpg", html)
+
+    def test_form_rejects_invalid_image(self):
+        datos = {
+            'title': "Clases", 'description': "Descripción", 'category': 'educacion',
+            'profession': "Docente", 'location': "Rosario",
+        }
+        falsa = SimpleUploadedFile("foto.jpg", b"no es una imagen", content_type="image/jpeg")
+        form = ServicioForm(datos, {'image': falsa})
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+        with mock.patch('core.imagenes.MAX_BYTES', 10):
+            grande = SimpleUploadedFile("foto.gif", GIF_1PX, content_type="image/gif")
+            form = ServicioForm(datos, {'image': grande})
+            self.assertFalse(form.is_valid())
+
+
+
+class MediaUrlCacheTests(TestCase):
+    def setUp(self):
+        limpiar_urls()
+        self.addCleanup(limpiar_urls)
+        self.storage = InMemoryStorage(base_url='/media/')
+        parche = mock.patch.object(Usuario._meta.get_field('profile_image'), 'storage', self.storage)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_url_is_built_once_per_image(self):
+        usuario = Usuario.objects.create_user(username="yo", password="x", profile_image="profiles/yo/a.png")
+        with mock.patch.object(self.storage, 'url', wraps=self.storage.url) as url:
+            for _ in range(3):
+                self.assertEqual(usuario.profile_image_url, "/media/profiles/yo/a.png")
+            usuario.profile_image = "profiles/yo/b.png"
+            self.assertEqual(usuario.profile_image_url, "/media/profiles/yo/b.png")
+        self.assertEqual(url.call_count, 2)
+
+    def test_storage_failure_falls_back_to_default_image(self):
+        usuario = Usuario(pk=1, profile_image="profiles/yo/a.png")
+        with mock.patch.object(self.storage, 'url', side_effect=RuntimeError("sin credenciales")):
+            self.assertTrue(usuario.profile_image_url.endswith("profiles/default.png"))
+            self.assertEqual(resolver_urls([usuario], 'profile_image'), {1: None})
+        # El error no quedó memoizado
+        self.assertEqual(usuario.profile_image_url, "/media/profiles/yo/a.png")
+
+    def test_lru_is_bounded(self):
+        usuarios = [Usuario(pk=i, profile_image=f"profiles/u{i}.png") for i in range(5)]
+        with mock.patch('core.imagenes.MAX_URLS', 3), \
+                mock.patch.object(self.storage, 'url', wraps=self.storage.url) as url:
+            resolver_urls(usuarios, 'profile_image')
+            self.assertEqual(url.call_count, 5)
+            # Los dos primeros fueron desalojados, los últimos tres siguen memoizados
+            self.assertEqual(resolver_urls(usuarios[2:], 'profile_image')[4], "/media/profiles/u4.png")
+            self.assertEqual(url.call_count, 5)
+            usuarios[0].profile_image_url
+            self.assertEqual(url.call_count, 6)
+
+    def test_bulk_resolver_skips_missing_variants(self):
+        usuarios = [Usuario(pk=1, profile_image="profiles/a.png"), Usuario(pk=2, profile_image="")]
+        self.assertEqual(resolver_urls(usuarios, 'profile_image', 'avatar'), {1: None, 2: None})
+        self.assertEqual(resolver_urls(usuarios, 'profile_image'), {1: "/media/profiles/a.png", 2: None})
+
+
+
+class ViewBenchmarkTests(TestCase):
+    def test_benchmark_writes_baseline_and_discards_data(self):
+        with tempfile.TemporaryDirectory() as carpeta:
+            salida = os.path.join(carpeta, 'base.json')
+            call_command(
+                'benchmark_vistas', usuarios=5, servicios=10, valoraciones=10, mensajes=20,
+                notificaciones=10, repeticiones=2, salida=salida, stdout=io.StringIO(),
+            )
+            with open(salida) as f:
+                resultado = json.load(f)
+        self.assertFalse(Usuario.objects.exists())
+        self.assertEqual(resultado['vistas']['services']['estado'], [200])
+        self.assertEqual(resultado['vistas']['send_message']['estado'], [302])
+        self.assertGreater(resultado['vistas']['profile']['consultas'], 0)
+
+    def test_compare_flags_query_and_latency_regressions(self):
+        base = {'vistas': {'chat': {'consultas': 4, 'p95_ms': 10.0}}}
+        self.assertEqual(comparar(base, {'vistas': {'chat': {'consultas': 4, 'p95_ms': 11.5}}}, 0.25), [])
+        regresiones = comparar(base, {'vistas': {'chat': {'consultas': 6, 'p95_ms': 20.0}}}, 0.25)
+        self.assertEqual(len(regresiones), 2)
+
+
+
+@override_settings(PERFILADO_ACTIVO=True)
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        reiniciar_perfilado()
+        self.addCleanup(reiniciar_perfilado)
+        self.staff = Usuario.objects.create_user(username="admin", password="x", is_staff=True)
+        self.yo = Usuario.objects.create_user(username="yo", password="x")
+
+    def test_server_timing_and_histogram_for_staff(self):
+        self.client.force_login(self.yo)
+        respuesta = self.client.get(reverse('profile', args=[self.yo.id]))
+        self.assertNotIn('Server-Timing', respuesta)
+
+        self.client.force_login(self.staff)
+        respuesta = self.client.get(reverse('profile', args=[self.yo.id]))
+        self.assertRegex(respuesta['Server-Timing'], r'total;dur=[\d.]+, sql;dur=[\d.]+;desc="\d+ consultas", tpl;dur=')
+
+        resumen = self.client.get(reverse('perfilado')).json()
+        self.assertEqual(resumen['profile']['muestras'], 2)
+        self.assertGreater(resumen['profile']['sql_max'], 0)
+        self.assertEqual(sum(resumen['profile']['histograma'].values()), 2)
+
+    def test_unresolved_user_is_not_loaded_for_the_header(self):
+        request = RequestFactory().get('/')
+        request.user = SimpleLazyObject(mock.Mock(side_effect=AssertionError("usuario cargado")))
+        with override_settings(DEBUG=False):
+            respuesta = PerfiladoMiddleware(lambda request: HttpResponse())(request)
+        self.assertNotIn('Server-Timing', respuesta)
+
+        request._cached_user = self.staff
+        respuesta = PerfiladoMiddleware(lambda request: HttpResponse())(request)
+        self.assertIn('Server-Timing', respuesta)
+
+    def test_repeated_query_is_reported(self):
+        def vista(request):
+            for pk in range(6):
+                Usuario.objects.filter(pk=pk).exists()
+            return HttpResponse()
+
+        with self.assertLogs('core.perfilado', 'WARNING') as logs:
+            PerfiladoMiddleware(vista)(RequestFactory().get('/'))
+        self.assertIn("6 veces", logs.output[0])
+        # El execute_wrapper dura lo que el request
+        self.assertEqual(connection.execute_wrappers, [])
+
+
+
+class IndexAuditTests(TestCase):
+    def test_view_queries_use_indexes(self):
+        salida = io.StringIO()
+        call_command('auditar_indices', fallar=True, stdout=salida)
+        self.assertIn("por categoría", salida.getvalue())
+        self.assertNotIn("[ SCAN]", salida.getvalue())
+
+    def test_index_scans_are_not_full_scans(self):
+        plan = (
+            "SCAN core_servicio USING INDEX servicio_cat_idx\n"
+            "SCAN core_mensaje USING COVERING INDEX mensaje_idx\n"
+            "SCAN core_servicio_fts VIRTUAL TABLE INDEX 0:M1\n"
+            "SCAN core_tarea"
+        )
+        self.assertEqual(ESCANEO['sqlite'].findall(plan), ['core_tarea'])
+
+
+
+class ConversationInboxTests(TestCase):
+    def setUp(self):
+        self.yo = Usuario.objects.create_user(username="yo", password="x")
+        self.otro = Usuario.objects.create_user(username="otro", password="x")
+        self.tercero = Usuario.objects.create_user(username="tercero", password="x")
+
+    def enviar(self, emisor, receptor, texto):
+        self.client.force_login(emisor)
+        self.client.post(reverse('send_message', args=[receptor.id]), {'message': texto})
+
+    def test_send_message_keeps_summary_and_unread_counts(self):
+        self.enviar(self.otro, self.yo, "hola")
+        self.enviar(self.otro, self.yo, "¿estás?")
+        self.enviar(self.tercero, self.yo, "buenas")
+
+        conversacion = Conversacion.objects.get(usuario_a=self.yo, usuario_b=self.otro)
+        self.assertEqual(conversacion.vista_previa, "¿estás?")
+        self.assertEqual((conversacion.no_leidos(self.yo), conversacion.no_leidos(self.otro)), (2, 0))
+
+        with CACHE_COMPARTIDA:
+            self.client = self.client_class()
+            self.client.force_login(self.yo)
+            with self.assertNumQueries(2):  # usuario recién logueado, conversaciones (sesión en caché)
+                respuesta = self.client.get(reverse('bandeja'))
+        filas = respuesta.context['filas']
+        self.assertEqual([fila['otro'] for fila in filas], [self.tercero, self.otro])
+        self.assertEqual([fila['no_leidos'] for fila in filas], [1, 2])
+
+        self.client.get(reverse('chat', args=[self.otro.id]))
+        conversacion.refresh_from_db()
+        self.assertEqual(conversacion.no_leidos(self.yo), 0)
+
+    def test_backfill_from_existing_messages(self):
+        Mensaje.objects.create(sender=self.yo, receiver=self.otro, content="viejo")
+        ultimo = Mensaje.objects.create(sender=self.otro, receiver=self.yo, content="último")
+        Mensaje.objects.create(sender=self.tercero, receiver=self.yo, content="otro par")
+        call_command('reconstruir_conversaciones', stdout=io.StringIO())
+
+        self.assertEqual(Conversacion.objects.count(), 2)
+        conversacion = Conversacion.objects.get(usuario_a=self.yo, usuario_b=self.otro)
+        self.assertEqual((conversacion.ultimo_mensaje, conversacion.vista_previa), (ultimo, "último"))
+
+
+class NearbyServicesTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(username="ana", password="x", location="Caballito, CABA")
+        datos = {'user': self.user, 'description': "d", 'category': 'hogar', 'profession': "Plomero"}
+        self.palermo = Servicio.objects.create(title="Palermo", location="palermo", **datos)
+        self.caballito = Servicio.objects.create(title="Caballito", location="Caballito, CABA", **datos)
+        self.quilmes = Servicio.objects.create(title="Quilmes", location="Quilmes", **datos)
+        self.rosario = Servicio.objects.create(title="Rosario", location="Rosario", **datos)
+        self.sin_ubicar = Servicio.objects.create(title="Atlántida", location="Atlántida", **datos)
+
+    def test_geocodes_free_text_from_gazetteer(self):
+        self.palermo.refresh_from_db()
+        self.assertEqual(str(self.palermo.localidad), "Palermo, Ciudad de Buenos Aires")
+        self.assertTrue(self.palermo.geohash.startswith('69y'))
+        self.assertEqual(self.user.localidad.nombre, "Caballito")
+        self.assertIsNone(Servicio.objects.get(pk=self.sin_ubicar.pk).localidad)
+
+        # Filas creadas con bulk_create: las ubica el proceso por lotes
+        Servicio.objects.filter(pk=self.rosario.pk).update(localidad=None, latitud=None, longitud=None, geohash='')
+        self.assertEqual(geocodificar_todos(Servicio, solo_pendientes=True), (1, 1))
+        self.assertEqual(Servicio.objects.get(pk=self.rosario.pk).localidad.nombre, "Rosario")
+
+    def test_services_view_filters_and_sorts_by_distance(self):
+        self.client.force_login(self.user)
+        respuesta = self.client.get(reverse('services'), {'cerca': 'Villa Crespo', 'radio': '25'})
+        servicios = list(respuesta.context['services'])
+        self.assertEqual([s.title for s in servicios], ["Palermo", "Caballito", "Quilmes"])
+        self.assertAlmostEqual(servicios[0].distancia, distancia_km(-34.5994, -58.4381, -34.5889, -58.4306), places=3)
+
+        respuesta = self.client.get(reverse('services'), {'cerca': 'Villa Crespo', 'radio': '5'})
+        self.assertEqual([s.title for s in respuesta.context['services']], ["Palermo", "Caballito"])
+
+        respuesta = self.client.get(reverse('services'), {'cerca': 'Narnia'})
+        self.assertTrue(respuesta.context['cerca_desconocida'])
+        self.assertEqual(len(respuesta.context['services']), 5)
+
+
+class StreamingExportTests(TestCase):
+    def setUp(self):
+        self.staff = Usuario.objects.create_user(username="admin", password="x", is_staff=True)
+        self.otro = Usuario.objects.create_user(username="beto", password="x")
+        self.mensajes = [
+            Mensaje.objects.create(sender=self.otro, receiver=self.staff, content=texto)
+            for texto in ("hola", 'con "comillas", coma\ny salto')
+        ]
+
+    def test_staff_endpoint_streams_csv_and_jsonl(self):
+        self.client.force_login(self.otro)
+        self.assertEqual(self.client.get(reverse('exportar', args=['mensajes'])).status_code, 302)
+
+        self.client.force_login(self.staff)
+        respuesta = self.client.get(reverse('exportar', args=['mensajes']))
+        self.assertTrue(respuesta.streaming)
+        self.assertIn('attachment; filename="mensajes-', respuesta['Content-Disposition'])
+        contenido = b''.join(respuesta.streaming_content).decode()
+        filas = list(csv.reader(io.StringIO(contenido)))
+        self.assertEqual(filas[0], ['id', 'sender_id', 'receiver_id', 'content', 'timestamp'])
+        self.assertEqual([fila[3] for fila in filas[1:]], ["hola", 'con "comillas", coma\ny salto'])
+
+        respuesta = self.client.get(
+            reverse('exportar', args=['mensajes']), {'formato': 'jsonl', 'desde': self.mensajes[0].id}
+        )
+        lineas = b''.join(respuesta.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(linea)['id'] for linea in lineas], [self.mensajes[1].id])
+        self.assertEqual(self.client.get(reverse('exportar', args=['usuarios'])).status_code, 404)
+
+    def test_csv_neutralizes_formula_cells(self):
+        peligrosos = ['=HYPERLINK("http://x")', '+1', '-2+3', '@SUM(A1)', '\tcelda', '\rcelda']
+        for texto in peligrosos:
+            Mensaje.objects.create(sender=self.otro, receiver=self.staff, content=texto)
+        contenido = ''.join(lineas('mensajes', 'csv', desde_id=self.mensajes[-1].id))
+        celdas = [fila[3] for fila in csv.reader(io.StringIO(contenido, newline=''))][1:]
+        self.assertEqual(celdas, ["'" + texto for texto in peligrosos])
+        # JSONL no pasa por una planilla: el texto queda igual
+        jsonl = lineas('mensajes', 'jsonl', desde_id=self.mensajes[-1].id)
+        self.assertEqual([json.loads(linea)['content'] for linea in jsonl], peligrosos)
+
+    async def test_asgi_streams_with_async_iterator_in_batches(self):
+        await self.async_client.aforce_login(self.staff)
+        with mock.patch('core.exportacion.LOTE', 1):
+            respuesta = await self.async_client.get(reverse('exportar', args=['mensajes']), {'formato': 'jsonl'})
+            self.assertTrue(respuesta.is_async)
+            lineas = [linea async for linea in respuesta.streaming_content]
+        self.assertEqual([json.loads(linea)['id'] for linea in lineas], [m.id for m in self.mensajes])
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as carpeta:
+            destino = os.path.join(carpeta, 'mensajes.jsonl')
+            salida = io.StringIO()
+            call_command('exportar', 'mensajes', formato='jsonl', salida=destino, stdout=salida)
+            with open(destino, encoding='utf-8') as f:
+                self.assertEqual([json.loads(linea)['content'] for linea in f][0], "hola")
+        self.assertIn("2 filas exportadas", salida.getvalue())
+
+
+class BulkImportTests(TestCase):
+    def escribir(self, nombre, contenido):
+        ruta = os.path.join(self.carpeta.name, nombre)
+        with open(ruta, 'a', encoding='utf-8') as f:
+            f.write(contenido)
+        return ruta
+
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(self.carpeta.cleanup)
+
+    def test_imports_users_validating_with_registration_form(self):
+        ruta = self.escribir('usuarios.csv', (
+            "username,email,password,profession,location\n"
+            "ana,ana@example.com,Clave-Segura-123,Docente,Rosario\n"
+            "beto,beto@example.com,,Plomero,Caballito\n"
+            "ana,otra@example.com,Clave-Segura-123,Docente,\n"
+            "caro,no-es-un-mail,123,Docente,\n"
+        ))
+        errores = os.path.join(self.carpeta.name, 'errores.jsonl')
+        salida = io.StringIO()
+        call_command('importar', 'usuarios', ruta, lote=3, errores=errores, stdout=salida)
+
+        self.assertIn("4 filas", salida.getvalue())
+        ana, beto = Usuario.objects.order_by('username')
+        self.assertTrue(ana.check_password('Clave-Segura-123'))
+        self.assertFalse(beto.has_usable_password())
+        self.assertEqual(beto.localidad.nombre, "Caballito")
+        with open(errores, encoding='utf-8') as f:
+            rechazadas = {json.loads(linea)['fila']: json.loads(linea)['errores'] for linea in f}
+        self.assertEqual(set(rechazadas), {3, 4})
+        self.assertEqual(rechazadas[3]['username'][0]['code'], 'duplicado')
+        self.assertIn('email', rechazadas[4])
+
+    def test_imports_services_in_batches_and_resumes_from_checkpoint(self):
+        Usuario.objects.create_user(username="ana", password="x")
+        linea = '{{"usuario": "{}", "title": "Clases de {}", "description": "d", "category": "educacion", ' \
+                '"profession": "Docente", "location": "Palermo"}}\n'
+        ruta = self.escribir('servicios.jsonl', linea.format('ana', 'guitarra') + linea.format('nadie', 'piano'))
+        call_command('importar', 'servicios', ruta, lote=1, stdout=io.StringIO())
+        self.assertEqual(Servicio.objects.count(), 1)
+
+        self.escribir('servicios.jsonl', linea.format('ana', 'violín'))
+        call_command('importar', 'servicios', ruta, reanudar=True, stdout=io.StringIO())
+        self.assertEqual(sorted(Servicio.objects.values_list('title', flat=True)), ["Clases de guitarra", "Clases de violín"])
+        self.assertEqual(Servicio.objects.filter(localidad__nombre="Palermo").count(), 2)
+        self.assertEqual(
+            [s.title for s in buscar_servicios(Servicio.objects.all(), 'violín')], ["Clases de violín"]
+        )
+
+    def test_imported_services_are_queued_for_similar_refresh(self):
+        Usuario.objects.create_user(username="ana", password="x")
+        ruta = self.escribir('servicios.jsonl', ''.join(
+            f'{{"usuario": "ana", "title": "Clases de {materia}", "description": "d", '
+            f'"category": "educacion", "profession": "Docente", "location": "Palermo"}}\n'
+            for materia in ("guitarra", "piano", "violín")
+        ))
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('importar', 'servicios', ruta, lote=1, stdout=io.StringIO())
+        self.assertEqual(Servicio.objects.filter(similares_pendientes=True).count(), 3)
+        self.assertEqual(Tarea.objects.filter(nombre='refrescar_similares', estado=Tarea.PENDIENTE).count(), 1)
+        self.assertEqual(
+            set(Servicio.objects.values_list('ranking', flat=True)), {PROMEDIO_POR_DEFECTO}
+        )
+
+
+class AsyncViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.yo = Usuario.objects.create_user(username="yo", password="x")
+        cls.otro = Usuario.objects.create_user(username="otro", password="x")
+        crear_servicios(cls.otro, 2, autores=[cls.yo])
+        Mensaje.objects.create(sender=cls.otro, receiver=cls.yo, content="hola")
+        Notificacion.objects.create(receptor=cls.yo, emisor=cls.otro, mensaje="Nuevo mensaje")
+
+    def test_middleware_chain_is_fully_async(self):
+        # Un middleware solo síncrono se registra como "Asynchronous handler adapted..."
+        with self.assertNoLogs('django.request', level='DEBUG'):
+            ASGIHandler()
+
+    async def test_views_render_under_asgi(self):
+        await self.async_client.aforce_login(self.yo)
+        urls = [
+            reverse('home'),
+            reverse('services'),
+            reverse('profile', args=[self.otro.id]),
+            reverse('chat', args=[self.otro.id]),
+            reverse('notificaciones'),
+        ]
+        for url in urls:
+            respuesta = await self.async_client.get(url)
+            self.assertEqual(respuesta.status_code, 200, url)
+        self.assertContains(respuesta, "Nuevo mensaje")
+        self.assertEqual(respuesta.context['no_leidas'], 1)
+
+
+
+class SimilarServicesTests(TestCase):
+    def setUp(self):
+        self.ana = Usuario.objects.create_user(username="ana", password="x")
+        self.beto = Usuario.objects.create_user(username="beto", password="x")
+        self.caro = Usuario.objects.create_user(username="caro", password="x")
+        self.clases = Servicio.objects.create(
+            user=self.ana, title="Clases de matemática", description="Apoyo escolar de álgebra",
+            category='educacion', profession="Profesora", location="Rosario",
+        )
+        self.propio = Servicio.objects.create(
+            user=self.ana, title="Clases de física", description="Apoyo escolar",
+            category='educacion', profession="Profesora", location="Rosario",
+        )
+        self.algebra = Servicio.objects.create(
+            user=self.beto, title="Álgebra y matemática", description="Clases particulares de álgebra",
+            category='educacion', profession="Profesor", location="Rosario",
+        )
+        self.plomero = Servicio.objects.create(
+            user=self.caro, title="Plomería", description="Arreglo de cañerías y pérdidas",
+            category='hogar', profession="Plomero", location="Rosario",
+        )
+
+    def test_full_rebuild_stores_neighbors_of_other_users(self):
+        self.assertEqual(recalcular_todo(), 4)
+        self.assertFalse(Servicio.objects.filter(similares_pendientes=True).exists())
+        vecinos = list(ServicioSimilar.objects.filter(servicio=self.clases).values_list('similar_id', flat=True))
+        self.assertEqual(vecinos[0], self.algebra.id)
+        self.assertNotIn(self.propio.id, vecinos)
+
+        self.client.force_login(self.beto)
+        respuesta = self.client.get(reverse('profile', args=[self.ana.id]))
+        self.assertEqual(respuesta.context['similares'][0], self.algebra)
+        respuesta = self.client.get(reverse('valorar_servicio', args=[self.clases.id]))
+        self.assertContains(respuesta, "Álgebra y matemática")
+
+    def test_saving_a_service_refreshes_it_through_one_task(self):
+        recalcular_todo()
+        with self.captureOnCommitCallbacks(execute=True):
+            nuevo = Servicio.objects.create(
+                user=self.caro, title="Matemática para ingreso", description="Álgebra y análisis",
+                category='educacion', profession="Profesora", location="Rosario",
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            nuevo.save()
+        self.assertEqual(Tarea.objects.filter(nombre='refrescar_similares').count(), 1)
+
+        # Si el cálculo falla, el servicio sigue pendiente para el reintento
+        with mock.patch('core.recomendaciones.ServicioSimilar.objects.bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                refrescar_pendientes()
+        nuevo.refresh_from_db()
+        self.assertTrue(nuevo.similares_pendientes)
+
+        procesar_pendientes()
+        nuevo.refresh_from_db()
+        self.assertFalse(nuevo.similares_pendientes)
+        self.assertTrue(ServicioSimilar.objects.filter(servicio=nuevo, similar=self.algebra).exists())
+        # Y entra en la lista de los servicios parecidos que ya estaban calculados
+        self.assertTrue(ServicioSimilar.objects.filter(servicio=self.clases, similar=nuevo).exists())
+        self.assertFalse(ServicioSimilar.objects.filter(servicio=self.plomero, similar=nuevo).exists())
+
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        self.duenos = [Usuario.objects.create_user(username=f"dueno{i}", password="x") for i in range(2)]
+        self.autores = [Usuario.objects.create_user(username=f"autor{i}", password="x") for i in range(2)]
+        datos = {'description': "d", 'category': 'hogar', 'profession': "Plomero", 'location': "Rosario"}
+        self.servicios = [
+            Servicio.objects.create(user=dueno, title=f"Servicio {i}", **datos) for i, dueno in enumerate(self.duenos)
+        ]
+
+    def agregados(self):
+        for obj in (*self.servicios, *self.duenos):
+            obj.refresh_from_db()
+        return (
+            [s.rating for s in self.servicios], [u.reputacion for u in self.duenos],
+        )
+
+    def test_create_edit_move_and_delete_keep_aggregates(self):
+        primera = Valoracion.objects.create(servicio=self.servicios[0], autor=self.autores[0], puntuacion=4)
+        segunda = Valoracion.objects.create(servicio=self.servicios[0], autor=self.autores[1], puntuacion=2)
+        self.assertEqual(self.agregados(), ([3.0, 0], [3.0, 0]))
+
+        primera.puntuacion = 5
+        primera.save()
+        self.assertEqual(self.agregados(), ([3.5, 0], [3.5, 0]))
+
+        segunda.servicio = self.servicios[1]
+        segunda.save()
+        self.assertEqual(self.agregados(), ([5.0, 2.0], [5.0, 2.0]))
+
+        primera.delete()
+        self.assertEqual(self.agregados(), ([0, 2.0], [0, 2.0]))
+        self.assertEqual(verificar_agregados(), [])
+
+    def test_full_save_keeps_deltas_applied_meanwhile(self):
+        servicio = Servicio.objects.get(pk=self.servicios[0].pk)
+        dueno = Usuario.objects.get(pk=self.duenos[0].pk)
+        Valoracion.objects.create(servicio=self.servicios[0], autor=self.autores[0], puntuacion=4)
+
+        # Instancias cargadas antes de la valoración (formulario de edición abierto)
+        servicio.title = "Editado"
+        servicio.save()
+        dueno.profession = "Gasista"
+        dueno.save()
+        self.assertEqual((servicio.rating_sum, servicio.rating_count, dueno.rating_count), (4, 1, 1))
+        self.assertEqual(self.agregados(), ([4.0, 0], [4.0, 0]))
+        self.assertEqual(verificar_agregados(), [])
+
+    def test_verify_reports_and_repairs_drift(self):
+        Valoracion.objects.create(servicio=self.servicios[0], autor=self.autores[0], puntuacion=4)
+        Servicio.objects.filter(pk=self.servicios[0].pk).update(rating_sum=40)
+        with self.assertRaises(CommandError):
+            call_command('verificar_valoraciones', stdout=io.StringIO())
+
+        salida = io.StringIO()
+        call_command('verificar_valoraciones', reparar=True, stdout=salida)
+        self.assertIn("1 inconsistencias reparadas", salida.getvalue())
+        self.assertEqual(self.agregados(), ([4.0, 0], [4.0, 0]))
+
+    def test_recalculate_rebuilds_from_ratings(self):
+        Valoracion.objects.create(servicio=self.servicios[1], autor=self.autores[0], puntuacion=3)
+        Servicio.objects.update(rating_sum=0, rating_count=0)
+        Usuario.objects.update(rating_sum=7, rating_count=2)
+        call_command('recalcular_valoraciones', stdout=io.StringIO())
+        self.assertEqual(self.agregados(), ([0, 3.0], [0, 3.0]))
+        self.assertEqual(verificar_agregados(), [])
+
+
+class ServiceRankingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dueno = Usuario.objects.create_user(username="dueno", password="x")
+        self.autores = [Usuario.objects.create_user(username=f"autor{i}", password="x") for i in range(4)]
+        datos = {'user': self.dueno, 'description': "d", 'category': 'hogar', 'profession': "Plomero", 'location': "Rosario"}
+        self.consolidado = Servicio.objects.create(title="Consolidado", **datos)
+        self.uno_solo = Servicio.objects.create(title="Uno solo", **datos)
+        self.nuevo = Servicio.objects.create(title="Nuevo", **datos)
+        self.malo = Servicio.objects.create(title="Malo", **datos)
+        for autor in self.autores:
+            Valoracion.objects.create(servicio=self.consolidado, autor=autor, puntuacion=5)
+        Valoracion.objects.create(servicio=self.uno_solo, autor=self.autores[0], puntuacion=5)
+        Valoracion.objects.create(servicio=self.malo, autor=self.autores[0], puntuacion=1)
+
+    def test_rating_updates_category_and_service_ranking(self):
+        categoria = RankingCategoria.objects.get(category='hogar')
+        self.assertEqual((categoria.rating_sum, categoria.rating_count), (26, 6))
+        # El servicio valorado usa el promedio de la categoría ya con su valoración
+        self.malo.refresh_from_db()
+        self.assertAlmostEqual(self.malo.ranking, (1 + PESO_PREVIO * 26 / 6) / (1 + PESO_PREVIO))
+
+        # El recálculo completo también mueve el previo de los servicios no tocados
+        call_command('recalcular_ranking', stdout=io.StringIO())
+        self.nuevo.refresh_from_db()
+        self.assertAlmostEqual(self.nuevo.ranking, 26 / 6)
+
+    def test_category_change_moves_ratings_to_new_category(self):
+        self.consolidado.refresh_from_db()
+        self.consolidado.category = 'salud'
+        self.consolidado.save()
+        hogar = RankingCategoria.objects.get(category='hogar')
+        salud = RankingCategoria.objects.get(category='salud')
+        self.assertEqual((hogar.rating_sum, hogar.rating_count), (6, 2))
+        self.assertEqual((salud.rating_sum, salud.rating_count), (20, 4))
+        # El ranking del servicio usa ya el promedio de su nueva categoría
+        self.consolidado.refresh_from_db()
+        self.assertAlmostEqual(self.consolidado.ranking, (20 + PESO_PREVIO * 5) / (4 + PESO_PREVIO))
+
+    def test_sort_top_orders_by_materialized_ranking(self):
+        call_command('recalcular_ranking', stdout=io.StringIO())
+        self.client.force_login(self.autores[0])
+        with CaptureQueriesContext(connection) as ctx:
+            respuesta = self.client.get(reverse('services'), {'sort': 'top'})
+        titulos = [s.title for s in respuesta.context['services']]
+        self.assertEqual(titulos, ["Consolidado", "Uno solo", "Nuevo", "Malo"])
+        self.assertTrue(any('"ranking" DESC' in q['sql'] for q in ctx.captured_queries))
+
+        respuesta = self.client.get(reverse('services'), {'sort': 'top', 'category': 'salud'})
+        self.assertEqual(len(respuesta.context['services']), 0)
+
+
+
+@CACHE_COMPARTIDA
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create_user(username="ana", password="clave-vieja-123")
+
+    def consultas_en_home(self):
+        self.client.get(reverse('home'))  # calienta sesión, usuario y contador de no leídas
+        with CaptureQueriesContext(connection) as ctx:
+            respuesta = self.client.get(reverse('home'))
+        self.assertEqual(respuesta.context['user'], self.usuario)
+        return len(ctx.captured_queries)
+
+    def test_authenticated_request_skips_session_and_user_queries(self):
+        self.client.force_login(self.usuario)
+        cacheado = self.consultas_en_home()
+
+        with override_settings(
+            SESSION_ENGINE='django.contrib.sessions.backends.db',
+            AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'],
+        ):
+            # Cliente nuevo: SessionMiddleware fija el motor de sesiones al crearse
+            self.client = self.client_class()
+            self.client.force_login(self.usuario)
+            sin_cache = self.consultas_en_home()
+        self.assertEqual(cacheado, 0)
+        self.assertGreaterEqual(sin_cache - cacheado, 2)
+
+    def test_sessions_from_model_backend_still_resolve(self):
+        self.client.force_login(self.usuario, backend='django.contrib.auth.backends.ModelBackend')
+        self.assertEqual(self.client.get(reverse('home')).context['user'], self.usuario)
+
+        self.client.logout()
+        original = ModelBackend.authenticate
+        with mock.patch.object(ModelBackend, 'authenticate', autospec=True, side_effect=original) as repetido:
+            self.assertFalse(self.client.login(username="ana", password="otra"))
+        repetido.assert_called_once()  # solo el del backend con caché (vía super())
+        self.assertTrue(self.client.login(username="ana", password="clave-vieja-123"))
+        self.assertEqual(
+            self.client.session['_auth_user_backend'], 'core.autenticacion.UsuarioCacheadoBackend',
+        )
+
+    def test_profile_edit_and_password_change_invalidate_cached_user(self):
+        self.client.force_login(self.usuario)
+        self.client.get(reverse('home'))
+        self.assertIsNotNone(cache.get(clave_usuario(self.usuario.pk)))
+
+        self.client.post(reverse('edit_profile', args=[self.usuario.id]), {
+            'username': "ana", 'email': "ana@example.com", 'profession': "Electricista", 'location': "Rosario",
+        })
+        respuesta = self.client.get(reverse('home'))
+        self.assertEqual(respuesta.context['user'].profession, "Electricista")
+
+        # Con la contraseña nueva el hash de la sesión ya no coincide: se cierra
+        self.usuario.refresh_from_db()
+        self.usuario.set_password("clave-nueva-456")
+        self.usuario.save()
+        respuesta = self.client.get(reverse('home'))
+        self.assertFalse(respuesta.context['user'].is_authenticated)
+
+    @override_settings(CACHE_COMPARTIDA=False, SESSION_ENGINE='django.contrib.sessions.backends.db')
+    def test_password_change_in_another_process_ends_session_with_local_cache(self):
+        self.client = self.client_class()
+        self.client.force_login(self.usuario)
+        self.client.get(reverse('home'))
+        self.assertIsNone(cache.get(clave_usuario(self.usuario.pk)))
+
+        # Otro proceso cambia la contraseña: su invalidación no llega a esta caché
+        cache.clear()
+        with mock.patch('core.signals.invalidar_usuario'):
+            self.usuario.set_password("clave-nueva-456")
+            self.usuario.save()
+        respuesta = self.client.get(reverse('home'))
+        self.assertFalse(respuesta.context['user'].is_authenticated)
+
+
+
+class ConditionalResponseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.yo = Usuario.objects.create_user(username="yo", password="x")
+        self.otro = Usuario.objects.create_user(username="otro", password="x")
+        self.servicio = crear_servicios(self.otro, 1)[0]
+        self.client.force_login(self.yo)
+
+    def revalidar(self, url):
+        self.client.get(url)  # la primera visita fija la cookie CSRF, que entra en el ETag
+        primera = self.client.get(url)
+        self.assertEqual(primera.status_code, 200)
+        self.assertIn('private', primera['Cache-Control'])
+        return self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag'], HTTP_IF_MODIFIED_SINCE=primera['Last-Modified'])
+
+    def test_unchanged_pages_answer_304_without_rendering(self):
+        Notificacion.objects.create(receptor=self.yo, emisor=self.otro, mensaje="Nuevo mensaje")
+        for url in (reverse('services'), reverse('profile', args=[self.otro.id]), reverse('notificaciones')):
+            respuesta = self.revalidar(url)
+            self.assertEqual(respuesta.status_code, 304, url)
+            self.assertEqual(respuesta.templates, [], url)
+            self.assertTrue(respuesta.has_header('ETag'))
+
+    def test_listing_validators_come_from_the_database(self):
+        url = reverse('services')
+        self.client.get(url)
+        # Cambios de otro proceso: su invalidación de caché no llega a este
+        with mock.patch('core.signals.invalidar'):
+            anterior = self.client.get(url)['ETag']
+            otro = crear_servicios(self.otro, 1)[0]
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=anterior).status_code, 200)
+
+            anterior = self.client.get(url)['ETag']
+            otro.delete()
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=anterior).status_code, 200)
+
+        # UPDATE en bloque de un comando (geocodificar_todos) también mueve updated_at
+        anterior = self.client.get(url)['ETag']
+        geocodificar_todos(Servicio, solo_pendientes=False)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=anterior).status_code, 200)
+
+    def test_changes_invalidate_the_validators(self):
+        url = reverse('profile', args=[self.otro.id])
+        anterior = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Valoracion.objects.create(servicio=self.servicio, autor=self.yo, puntuacion=5, comentario="Genial")
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=anterior)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, "Genial")
+
+        url = reverse('notificaciones')
+        anterior = self.client.get(url)['ETag']
+        Notificacion.objects.create(receptor=self.yo, emisor=self.otro, mensaje="Otra notificación")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=anterior).status_code, 200)
+
+        # Marcar como leída (en otro worker, con el contador en caché atrasado) también cambia
+        notificacion = Notificacion.objects.filter(receptor=self.yo).latest('id')
+        anterior = self.client.get(url)['ETag']
+        Notificacion.objects.filter(pk=notificacion.pk).update(leida=True)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=anterior).status_code, 200)
+
+        # Otro usuario no recibe la versión de este
+        url = reverse('services')
+        anterior = self.client.get(url)['ETag']
+        self.client.force_login(self.otro)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=anterior).status_code, 200)
+
+
+GIF_1PX = (
+    b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00"
+    b",\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
+)
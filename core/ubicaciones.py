@@ -0,0 +1,248 @@
+"""
+Ubicaciones normalizadas y búsqueda por cercanía.
+
+- Geocodificación local: el texto libre de `location` se normaliza y se busca en el
+  nomenclador core/data/localidades.csv (nombre, provincia, coordenadas y alias). No
+  hay llamadas a servicios externos; lo que no está en el archivo queda sin ubicar.
+- Índice espacial: cada Servicio guarda latitud, longitud y el geohash de su localidad
+  (indexado). Buscar a `radio` km de un punto recorre, con rangos sobre ese índice, la
+  celda del punto y sus 8 vecinas con la precisión cuyo tamaño cubre el radio; la
+  distancia exacta solo se calcula sobre esos candidatos.
+"""
+import csv
+import math
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+from django.db.models import FloatField, Q, Value
+from django.db.models.functions import ACos, Cos, Least, Now, Radians, Sin
+
+ARCHIVO = os.path.join(os.path.dirname(__file__), 'data', 'localidades.csv')
+RADIO_TIERRA_KM = 6371.0
+KM_POR_GRADO = 111.32
+PRECISION = 9
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+# -------------------------------------------------------
+# Nomenclador
+# -------------------------------------------------------
+def normalizar(texto):
+    """Minúsculas, sin acentos ni signos y con espacios simples."""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', texto).split())
+
+
+@lru_cache(maxsize=1)
+def _nomenclador():
+    """{nombre o alias normalizado: entrada} leído una vez por proceso."""
+    indice = {}
+    with open(ARCHIVO, encoding='utf-8') as f:
+        for fila in csv.DictReader(f):
+            entrada = {
+                'nombre': fila['nombre'],
+                'provincia': fila['provincia'],
+                'latitud': float(fila['lat']),
+                'longitud': float(fila['lon']),
+            }
+            nombres = [fila['nombre'], f"{fila['nombre']} {fila['provincia']}"]
+            nombres += [alias for alias in fila['alias'].split('|') if alias]
+            for nombre in nombres:
+                # El primero gana: "Córdoba" es la ciudad, no otra localidad de la provincia
+                indice.setdefault(normalizar(nombre), entrada)
+    return indice
+
+
+def buscar_en_nomenclador(texto):
+    """
+    Entrada del nomenclador para un texto libre ("Palermo, CABA", "cordoba"), o None.
+    Prueba el texto completo y después cada parte separada por coma, guion o barra.
+    """
+    indice = _nomenclador()
+    candidatos = [texto or ''] + re.split(r'[,/\-]', texto or '')
+    for candidato in candidatos:
+        entrada = indice.get(normalizar(candidato))
+        if entrada:
+            return entrada
+    return None
+
+
+# -------------------------------------------------------
+# Geohash
+# -------------------------------------------------------
+def geohash(latitud, longitud, precision=PRECISION):
+    lat_min, lat_max, lon_min, lon_max = -90.0, 90.0, -180.0, 180.0
+    resultado, bits, valor, par = [], 0, 0, True
+    while len(resultado) < precision:
+        if par:
+            medio = (lon_min + lon_max) / 2
+            if longitud >= medio:
+                valor, lon_min = valor * 2 + 1, medio
+            else:
+                valor, lon_max = valor * 2, medio
+        else:
+            medio = (lat_min + lat_max) / 2
+            if latitud >= medio:
+                valor, lat_min = valor * 2 + 1, medio
+            else:
+                valor, lat_max = valor * 2, medio
+        par = not par
+        bits += 1
+        if bits == 5:
+            resultado.append(BASE32[valor])
+            bits, valor = 0, 0
+    return ''.join(resultado)
+
+
+def _siguiente(prefijo):
+    """
+    Menor geohash mayor que todos los que empiezan con `prefijo` (None si no hay): así
+    "empieza con" es un rango sobre el índice. Solo usa caracteres de BASE32, que ordenan
+    igual con cualquier collation (un LIKE 'abc%' no usa el índice con collation de locale).
+    """
+    while prefijo and prefijo[-1] == BASE32[-1]:
+        prefijo = prefijo[:-1]
+    if not prefijo:
+        return None
+    return prefijo[:-1] + BASE32[BASE32.index(prefijo[-1]) + 1]
+
+
+def _tamano_celda(precision):
+    """(grados de latitud, grados de longitud) de una celda de `precision` caracteres."""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def prefijos_cercanos(latitud, longitud, radio_km):
+    """
+    Geohashes de la celda del punto y sus vecinas, con la mayor precisión cuya celda mide
+    al menos `radio_km` de lado: todo punto a menos de `radio_km` cae en alguna de ellas.
+    Lista vacía si el radio es tan grande que no conviene acotar.
+    """
+    cos_lat = max(math.cos(math.radians(latitud)), 0.01)
+    precision = 0
+    for p in range(1, PRECISION + 1):
+        alto, ancho = _tamano_celda(p)
+        if alto * KM_POR_GRADO < radio_km or ancho * KM_POR_GRADO * cos_lat < radio_km:
+            break
+        precision = p
+    if not precision:
+        return []
+    alto, ancho = _tamano_celda(precision)
+    prefijos = set()
+    for dlat in (-1, 0, 1):
+        for dlon in (-1, 0, 1):
+            lat = min(max(latitud + dlat * alto, -90.0), 90.0)
+            lon = (longitud + dlon * ancho + 180.0) % 360.0 - 180.0
+            prefijos.add(geohash(lat, lon, precision))
+    return sorted(prefijos)
+
+
+# -------------------------------------------------------
+# Distancias
+# -------------------------------------------------------
+def distancia_km(lat1, lon1, lat2, lon2):
+    """Distancia de haversine entre dos puntos."""
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _distancia_sql(latitud, longitud):
+    """Distancia (ley de cosenos esférica) de las columnas latitud/longitud al punto dado."""
+    lat0 = math.radians(latitud)
+    coseno = (
+        Value(math.cos(lat0)) * Cos(Radians('latitud')) * Cos(Radians('longitud') - Value(math.radians(longitud)))
+        + Value(math.sin(lat0)) * Sin(Radians('latitud'))
+    )
+    return Value(RADIO_TIERRA_KM) * ACos(Least(Value(1.0), coseno, output_field=FloatField()))
+
+
+def cercanos(queryset, latitud, longitud, radio_km):
+    """
+    Filtra `queryset` (de un modelo con latitud, longitud y geohash) a `radio_km` del punto
+    y anota `distancia` en km. No ordena.
+    """
+    prefijos = prefijos_cercanos(latitud, longitud, radio_km)
+    if prefijos:
+        rangos = Q()
+        for prefijo in prefijos:
+            siguiente = _siguiente(prefijo)
+            rangos |= Q(geohash__gte=prefijo, geohash__lt=siguiente) if siguiente else Q(geohash__gte=prefijo)
+        queryset = queryset.filter(rangos)
+    else:
+        queryset = queryset.exclude(geohash='')
+    return queryset.annotate(distancia=_distancia_sql(latitud, longitud)).filter(distancia__lte=radio_km)
+
+
+# -------------------------------------------------------
+# Asignación de localidades
+# -------------------------------------------------------
+def geocodificar(texto):
+    """Localidad (creada si hace falta) para un texto libre, o None si no está en el nomenclador."""
+    from .models import Localidad
+
+    entrada = buscar_en_nomenclador(texto)
+    if entrada is None:
+        return None
+    localidad, _ = Localidad.objects.get_or_create(
+        nombre=entrada['nombre'],
+        provincia=entrada['provincia'],
+        defaults={
+            'latitud': entrada['latitud'],
+            'longitud': entrada['longitud'],
+            'geohash': geohash(entrada['latitud'], entrada['longitud']),
+        },
+    )
+    return localidad
+
+
+def ubicar(instancia, memo=None):
+    """
+    Asigna localidad (y coordenadas, si el modelo las tiene) según `instancia.location`.
+    `memo` ({texto: Localidad}) evita repetir la consulta en cargas por lotes.
+    """
+    if memo is None:
+        localidad = geocodificar(instancia.location)
+    else:
+        if instancia.location not in memo:
+            memo[instancia.location] = geocodificar(instancia.location)
+        localidad = memo[instancia.location]
+    instancia.localidad = localidad
+    if hasattr(instancia, 'geohash'):
+        instancia.latitud = localidad.latitud if localidad else None
+        instancia.longitud = localidad.longitud if localidad else None
+        instancia.geohash = localidad.geohash if localidad else ''
+
+
+def geocodificar_todos(modelo, solo_pendientes=False):
+    """
+    Ubica todas las filas de `modelo` (Servicio o Usuario) con un UPDATE por texto de
+    ubicación distinto. Para cargas con bulk_create, que no disparan señales.
+    Devuelve (ubicadas, sin_ubicar).
+    """
+    filas = modelo.objects.all()
+    if solo_pendientes:
+        filas = filas.filter(localidad__isnull=True)
+    ubicadas = sin_ubicar = 0
+    textos = filas.order_by().values_list('location', flat=True).distinct()
+    for texto in list(textos):
+        localidad = geocodificar(texto)
+        # updated_at a mano: UPDATE no pasa por auto_now y la ubicación se muestra
+        cambios = {'localidad': localidad, 'updated_at': Now()}
+        if hasattr(modelo, 'geohash'):
+            cambios.update(
+                latitud=localidad.latitud if localidad else None,
+                longitud=localidad.longitud if localidad else None,
+                geohash=localidad.geohash if localidad else '',
+            )
+        cantidad = filas.filter(location=texto).update(**cambios)
+        if localidad:
+            ubicadas += cantidad
+        else:
+            sin_ubicar += cantidad
+    return ubicadas, sin_ubicar
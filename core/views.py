@@ -1,20 +1,59 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from .models import Usuario, Servicio, Mensaje, Valoracion
 from .forms import RegistroForm, LoginForm, ServicioForm, MensajeForm, ValoracionForm
+from django.core.handlers.asgi import ASGIRequest
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count, Max, Prefetch, Q
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from .forms import EditarPerfilForm
 from core.models import Notificacion
+from .search import buscar_servicios
+from .pagination import CursorPaginator
+from .cache import aobtener_o_calcular, cache_para_anonimos, estadisticas
+from .condicional import con_validadores, no_modificado, validadores
+from .notificaciones import acontar_no_leidas, marcar_leida, marcar_todas_leidas
+from .conversaciones import (
+    amarcar_leida as amarcar_conversacion_leida,
+    conversaciones_de,
+    enviar_mensaje,
+    marcar_leida as marcar_conversacion_leida,
+)
+from .exportacion import EXPORTABLES, FORMATOS, alineas, lineas
+from .imagenes import resolver_urls
+from .recomendaciones import similares_de, similares_para_usuario
+from .perfilado import reiniciar as reiniciar_perfilado, resumen as resumen_perfilado
+from .tareas import encolar, encolar_imagen, separar_imagen
+from .ubicaciones import buscar_en_nomenclador, cercanos
 
 
+async def _usuario(request):
+    """
+    Usuario del request resuelto con el ORM async. Queda en request.user para que los
+    templates (procesador de contexto `auth`) no disparen consultas síncronas.
+    """
+    request.user = await request.auser()
+    return request.user
+
+
+# Vistas async: home, services_view, profile_view, chat_view y notificaciones_view.
+# Bajo ASGI (helptime/asgi.py) esperan la base sin ocupar un hilo por request.
+
 # Home
-def home(request):
-    notifs = []
-    if request.user.is_authenticated:
-        notifs = Notificacion.objects.filter(receptor=request.user, leida=False)
-    return render(request, 'home.html', {'notifs': notifs})
+@cache_para_anonimos()
+async def home(request):
+    usuario = await _usuario(request)
+    no_leidas = 0
+    if usuario.is_authenticated:
+        no_leidas = await acontar_no_leidas(usuario.id)
+    return render(request, 'home.html', {'no_leidas': no_leidas})
 
 # Registro
 def register_view(request):
@@ -23,7 +62,12 @@ def register_view(request):
         if form.is_valid():
             user = form.save(commit=False)
             user.set_password(form.cleaned_data['password1'])
-            user.save()
+            # La imagen se sube a Cloudinary desde el worker, no en este request
+            imagen = separar_imagen(user, 'profile_image')
+            with transaction.atomic():
+                user.save()
+                if imagen:
+                    encolar_imagen(user, 'profile_image', imagen)
             login(request, user)
             return redirect('home')
     else:
@@ -51,30 +95,119 @@ def logout_view(request):
 
 # Perfil de usuario
 @login_required
-def profile_view(request, user_id):
-    user = get_object_or_404(Usuario, id=user_id)
-    return render(request, 'profile.html', {'user': user})
+async def profile_view(request, user_id):
+    await _usuario(request)
+    user = await aget_object_or_404(Usuario, id=user_id)
+    # 304 si no cambió el usuario, sus servicios ni sus valoraciones (ver core/condicional.py)
+    estado = await Servicio.objects.filter(user=user).aaggregate(
+        fecha_servicios=Max('updated_at'), fecha_valoraciones=Max('valoraciones__updated_at'),
+        cantidad_servicios=Count('id', distinct=True),
+        cantidad_valoraciones=Count('valoraciones__id', distinct=True),
+    )
+    fechas = (user.updated_at, estado['fecha_servicios'], estado['fecha_valoraciones'])
+    ultima = max(fecha for fecha in fechas if fecha)
+    # Las cantidades cubren los borrados, que no mueven ninguna fecha
+    condicion = validadores(request, (estado['cantidad_servicios'], estado['cantidad_valoraciones']), ultima)
+    respuesta = no_modificado(request, condicion)
+    if respuesta:
+        return respuesta
+    # Todo el perfil sale de un plan fijo de consultas: servicios -> comentarios -> autor
+    servicios = user.services.order_by('id').prefetch_related(
+        Prefetch(
+            'valoraciones',
+            queryset=Valoracion.objects.exclude(comentario='').select_related('autor').order_by('created_at'),
+            to_attr='comentarios',
+        )
+    )
+    servicios = [servicio async for servicio in servicios]
+    # Vecinos precalculados de todos sus servicios en una consulta, sin repetir
+    similares = {}
+    async for fila in similares_para_usuario(user.id):
+        similares.setdefault(fila.similar_id, fila.similar)
+        if len(similares) == SIMILARES_EN_PERFIL:
+            break
+    # Las miniaturas de las tarjetas se resuelven juntas, no una por render
+    for ext in ('webp', 'jpg'):
+        resolver_urls(servicios, 'image', 'avatar', ext)
+    return con_validadores(render(request, 'profile.html', {
+        'user': user,
+        'servicios': servicios,
+        'similares': list(similares.values()),
+        'puede_valorar': request.user != user,
+    }), condicion)
+
+
+SIMILARES_EN_PERFIL = 6
 
 # Lista de servicios con filtros y paginación
 @login_required
-def services_view(request):
+async def services_view(request):
+    await _usuario(request)
+    # 304 si no cambió ningún servicio desde la última visita (ver core/condicional.py)
+    estado = await Servicio.objects.aaggregate(ultima=Max('updated_at'), cantidad=Count('id'))
+    condicion = validadores(request, estado['cantidad'], estado['ultima'])
+    respuesta = no_modificado(request, condicion)
+    if respuesta:
+        return respuesta
+    # Cache-aside del listado renderizado, por combinación de filtros y página. Un acierto
+    # no sale del event loop; un fallo arma el listado (búsqueda, paginador) en un hilo.
+    filtros = tuple(sorted(request.GET.items()))
+    listado = await aobtener_o_calcular(
+        'servicios', ('listado', filtros), lambda: sync_to_async(_listado_servicios)(request)
+    )
+    return con_validadores(
+        render(request, 'services.html', {'listado': listado, 'radios': RADIOS_KM}), condicion,
+    )
+
+
+RADIOS_KM = (5, 10, 25, 50, 100)
+RADIO_POR_DEFECTO = 25
+
+
+def _radio(valor):
+    try:
+        radio = int(valor)
+    except (TypeError, ValueError):
+        return RADIO_POR_DEFECTO
+    return radio if radio in RADIOS_KM else RADIO_POR_DEFECTO
+
+
+def _listado_servicios(request):
     servicios = Servicio.objects.all()
     search = request.GET.get('search')
     category = request.GET.get('category')
     location = request.GET.get('location')
+    cerca = request.GET.get('cerca')
 
     if search:
-        servicios = servicios.filter(title__icontains=search)
+        servicios = buscar_servicios(servicios, search)
     if category:
         servicios = servicios.filter(category=category)
     if location:
         servicios = servicios.filter(location__icontains=location)
 
-    paginator = Paginator(servicios, 6)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # sort=top: mejor valorados primero según el ranking materializado (ver core/ratings.py)
+    orden = ('-ranking', '-id') if request.GET.get('sort') == 'top' else ('-id',)
+    origen = buscar_en_nomenclador(cerca) if cerca else None
+    if origen:
+        # Más cercanos primero, dentro del radio elegido (ver core/ubicaciones.py)
+        servicios = cercanos(servicios, origen['latitud'], origen['longitud'], _radio(request.GET.get('radio')))
+        page_obj = Paginator(servicios.order_by('distancia', 'id'), 6).get_page(request.GET.get('page'))
+    elif search:
+        # Resultados ordenados por relevancia: el conjunto ya viene acotado por la búsqueda
+        if request.GET.get('sort') == 'top':
+            servicios = servicios.order_by(*orden)
+        page_obj = Paginator(servicios, 6).get_page(request.GET.get('page'))
+    else:
+        paginator = CursorPaginator(servicios, 6, ordering=orden, total_aproximado=True)
+        page_obj = paginator.get_page(request.GET.get('cursor'), page_number=request.GET.get('page'))
 
-    return render(request, 'services.html', {'services': page_obj, 'page_obj': page_obj})
+    return render_to_string('services_listado.html', {
+        'services': page_obj,
+        'page_obj': page_obj,
+        'origen': origen,
+        'cerca_desconocida': bool(cerca) and origen is None,
+    }, request=request)
 
 # Crear servicio
 @login_required
@@ -84,7 +217,11 @@ def create_service_view(request):
         if form.is_valid():
             servicio = form.save(commit=False)
             servicio.user = request.user
-            servicio.save()
+            imagen = separar_imagen(servicio, 'image')
+            with transaction.atomic():
+                servicio.save()
+                if imagen:
+                    encolar_imagen(servicio, 'image', imagen)
             messages.success(request, "Servicio publicado correctamente ✅")
             return redirect('create_service')
         else:
@@ -94,22 +231,110 @@ def create_service_view(request):
     return render(request, 'create_service.html', {'form': form})
 
 # Chat con otro usuario
+MENSAJES_POR_PAGINA = 50
+
+
+def _conversacion(usuario, otro):
+    """Mensajes entre dos usuarios; cada rama usa el índice (sender, receiver, timestamp)."""
+    return Mensaje.objects.filter(
+        Q(sender=usuario, receiver=otro) | Q(sender=otro, receiver=usuario)
+    )
+
+
+def _mensaje_json(mensaje, usuario, otro):
+    autor = usuario if mensaje.sender_id == usuario.id else otro
+    return {
+        'id': mensaje.id,
+        'sender': autor.username,
+        'propio': autor == usuario,
+        'content': mensaje.content,
+        'timestamp': mensaje.timestamp.isoformat(),
+    }
+
+
+def _ancla(mensajes, mensaje_id):
+    """Timestamp del mensaje `mensaje_id` dentro de la conversación, o None si no existe."""
+    return mensajes.filter(pk=mensaje_id).values_list('timestamp', flat=True).first()
+
+
 @login_required
-def chat_view(request, user_id):
-    chat_user = get_object_or_404(Usuario, id=user_id)
+async def chat_view(request, user_id):
+    usuario = await _usuario(request)
+    chat_user = await aget_object_or_404(Usuario, id=user_id)
 
-    if chat_user == request.user:
+    if chat_user == usuario:
         chat_user = None
         mensajes = []
+        hay_anteriores = False
     else:
-        mensajes = Mensaje.objects.filter(
-            sender__in=[request.user, chat_user],
-            receiver__in=[request.user, chat_user]
+        # Solo los últimos mensajes; los anteriores se piden con mensajes_anteriores_view
+        ultimos = [
+            mensaje async for mensaje in
+            _conversacion(usuario, chat_user).order_by('-timestamp', '-id')[:MENSAJES_POR_PAGINA + 1]
+        ]
+        hay_anteriores = len(ultimos) > MENSAJES_POR_PAGINA
+        mensajes = ultimos[:MENSAJES_POR_PAGINA][::-1]
+        await amarcar_conversacion_leida(usuario, chat_user)
+
+    return render(request, 'chat.html', {
+        'chat_user': chat_user,
+        'messages': mensajes,
+        'hay_anteriores': hay_anteriores,
+    })
+
+
+@login_required
+def mensajes_nuevos_view(request, user_id):
+    """JSON con los mensajes posteriores a `after` (id), en orden cronológico.
+
+    Sin `after`, o si no es un mensaje de esta conversación (mal formado, borrado),
+    devuelve los últimos mensajes, como la página del chat.
+    """
+    chat_user = get_object_or_404(Usuario, id=user_id)
+    mensajes = _conversacion(request.user, chat_user)
+    after = request.GET.get('after', '')
+    timestamp = _ancla(mensajes, after) if after.isdigit() else None
+    if timestamp is None:
+        nuevos = list(mensajes.order_by('-timestamp', '-id')[:MENSAJES_POR_PAGINA])[::-1]
+        hay_mas = False
+    else:
+        nuevos = list(
+            mensajes.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=after))
+            .order_by('timestamp', 'id')[:MENSAJES_POR_PAGINA + 1]
         )
+        hay_mas = len(nuevos) > MENSAJES_POR_PAGINA
+        nuevos = nuevos[:MENSAJES_POR_PAGINA]
+    if any(m.sender_id == chat_user.id for m in nuevos):
+        marcar_conversacion_leida(request.user, chat_user)
+    return JsonResponse({
+        'mensajes': [_mensaje_json(m, request.user, chat_user) for m in nuevos],
+        'hay_mas': hay_mas,
+    })
+
+
+@login_required
+def mensajes_anteriores_view(request, user_id):
+    """JSON con la página de mensajes anterior a `before` (id), en orden cronológico."""
+    chat_user = get_object_or_404(Usuario, id=user_id)
+    mensajes = _conversacion(request.user, chat_user)
+    before = request.GET.get('before', '')
+    timestamp = _ancla(mensajes, before) if before.isdigit() else None
+    if timestamp is None:
+        return JsonResponse({'mensajes': [], 'hay_mas': False})
 
-    return render(request, 'chat.html', {'chat_user': chat_user, 'messages': mensajes})
+    anteriores = list(
+        mensajes.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=before))
+        .order_by('-timestamp', '-id')[:MENSAJES_POR_PAGINA + 1]
+    )
+    return JsonResponse({
+        'mensajes': [
+            _mensaje_json(m, request.user, chat_user) for m in reversed(anteriores[:MENSAJES_POR_PAGINA])
+        ],
+        'hay_mas': len(anteriores) > MENSAJES_POR_PAGINA,
+    })
 
 # Términos y condiciones
+@cache_para_anonimos(timeout=60 * 60)
 def terms_view(request):
     return render(request, 'terms.html')
 
@@ -120,20 +345,57 @@ def send_message(request, user_id):
         content = request.POST.get("message", "")
         recipient = get_object_or_404(Usuario, id=user_id)
         if content:
-            # Guardar mensaje
-            Mensaje.objects.create(sender=request.user, receiver=recipient, content=content)
-            # Crear notificación
-            Notificacion.objects.create(
-                receptor=recipient,
-                emisor=request.user,
-                mensaje=f"Te envió un mensaje: {content[:50]}"
-            )
+            # Mensaje (con el resumen de la conversación) y su notificación juntos: si no se
+            # puede encolar la tarea tampoco queda el mensaje
+            with transaction.atomic():
+                mensaje = enviar_mensaje(request.user, recipient, content)
+                # Crear notificación (la genera el worker de tareas)
+                encolar(
+                    'notificar',
+                    receptor_id=recipient.id,
+                    emisor_id=request.user.id,
+                    tipo=Notificacion.MENSAJE,
+                    mensaje=f"Te envió un mensaje: {content[:50]}",
+                )
+            if request.accepts('application/json') and not request.accepts('text/html'):
+                return JsonResponse({'mensaje': _mensaje_json(mensaje, request.user, recipient)}, status=201)
     return redirect('chat', user_id=user_id)
 
 @login_required
-def notificaciones_view(request):
-    notifs = Notificacion.objects.filter(receptor=request.user).order_by('-fecha')
-    return render(request, 'notificaciones.html', {'notifs': notifs})
+def bandeja_view(request):
+    """Conversaciones del usuario, la de actividad más reciente primero."""
+    conversaciones = conversaciones_de(request.user).select_related('usuario_a', 'usuario_b')
+    paginator = CursorPaginator(conversaciones, 20, ordering=('-ultima_fecha', '-id'))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    filas = [
+        {'conversacion': c, 'otro': c.otro(request.user), 'no_leidos': c.no_leidos(request.user)}
+        for c in page_obj
+    ]
+    otros = [fila['otro'] for fila in filas]
+    resolver_urls(otros, 'profile_image')
+    for ext in ('webp', 'jpg'):
+        resolver_urls(otros, 'profile_image', 'avatar', ext)
+    return render(request, 'bandeja.html', {'filas': filas, 'page_obj': page_obj})
+
+@login_required
+async def notificaciones_view(request):
+    usuario = await _usuario(request)
+    notifs = Notificacion.objects.filter(receptor=usuario)
+    # Una nueva (o agrupada) mueve la fecha; marcar como leída, las no leídas. Las dos salen
+    # de la base: el contador en caché es por proceso y puede venir de otro worker atrasado.
+    estado = await notifs.aaggregate(ultima=Max('fecha'), no_leidas=Count('id', filter=Q(leida=False)))
+    no_leidas = estado['no_leidas']
+    condicion = validadores(request, no_leidas, estado['ultima'])
+    respuesta = no_modificado(request, condicion)
+    if respuesta:
+        return respuesta
+    paginator = CursorPaginator(notifs, 20, ordering=('-fecha', '-id'))
+    page_obj = await paginator.aget_page(request.GET.get('cursor'), page_number=request.GET.get('page'))
+    return con_validadores(render(request, 'notificaciones.html', {
+        'notifs': page_obj,
+        'page_obj': page_obj,
+        'no_leidas': no_leidas,
+    }), condicion)
 
 @login_required
 def marcar_leida_view(request, notif_id):
@@ -141,8 +403,13 @@ def marcar_leida_view(request, notif_id):
     Marca una notificación como leída y redirige a la misma página de notificaciones.
     """
     notif = get_object_or_404(Notificacion, id=notif_id, receptor=request.user)
-    notif.leida = True
-    notif.save()
+    marcar_leida(request.user, notif.id)
+    return redirect('notificaciones')
+
+@login_required
+def marcar_todas_leidas_view(request):
+    if request.method == 'POST':
+        marcar_todas_leidas(request.user)
     return redirect('notificaciones')
 
 
@@ -164,13 +431,25 @@ def valorar_servicio(request, servicio_id):
             valoracion = form.save(commit=False)
             valoracion.servicio = servicio
             valoracion.autor = request.user
-            valoracion.save()
+            with transaction.atomic():
+                valoracion.save()
+                encolar(
+                    'notificar',
+                    receptor_id=servicio.user_id,
+                    emisor_id=request.user.id,
+                    tipo=Notificacion.VALORACION,
+                    mensaje=f"Valoró tu servicio «{servicio.title}» con {valoracion.puntuacion} estrellas",
+                )
             messages.success(request, "¡Gracias por tu valoración!")
             return redirect('profile', user_id=servicio.user.id)
     else:
         form = ValoracionForm()
 
-    return render(request, 'valorar_servicio.html', {'form': form, 'servicio': servicio})
+    return render(request, 'valorar_servicio.html', {
+        'form': form,
+        'servicio': servicio,
+        'similares': [fila.similar for fila in similares_de(servicio, SIMILARES_EN_PERFIL)],
+    })
 
 @login_required
 def edit_profile_view(request, user_id):
@@ -187,10 +466,46 @@ def edit_profile_view(request, user_id):
                 user.profile_image.delete(save=False)
                 user.profile_image = None
 
-            form.save()
+            imagen = separar_imagen(user, 'profile_image')
+            with transaction.atomic():
+                form.save()
+                if imagen:
+                    encolar_imagen(user, 'profile_image', imagen)
             messages.success(request, "Perfil actualizado correctamente ✅")
             return redirect('profile', user_id=user.id)
     else:
         form = EditarPerfilForm(instance=user)
 
-    return render(request, 'edit_profile.html', {'form': form, 'user': user})
\ No newline at end of file
+    return render(request, 'edit_profile.html', {'form': form, 'user': user})
+
+
+@staff_member_required
+def cache_estadisticas_view(request):
+    """Aciertos/fallos de caché por espacio de nombres, para monitoreo."""
+    return JsonResponse(estadisticas())
+
+
+@staff_member_required
+def perfilado_view(request):
+    """Histograma de latencia y consultas por URL de este proceso. POST lo reinicia."""
+    if request.method == 'POST':
+        reiniciar_perfilado()
+    return JsonResponse(resumen_perfilado())
+
+
+@staff_member_required
+def exportar_view(request, nombre):
+    """Exporta un modelo completo en CSV (por defecto) o JSONL, en streaming. ?desde=<id> retoma."""
+    formato = request.GET.get('formato', 'csv')
+    if nombre not in EXPORTABLES or formato not in FORMATOS:
+        raise Http404
+    try:
+        desde_id = int(request.GET['desde']) if request.GET.get('desde') else None
+    except ValueError:
+        raise Http404
+    tipo = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    # Cada servidor con el iterador que consume sin juntarlo en memoria (ver core/exportacion.py)
+    contenido = alineas if isinstance(request, ASGIRequest) else lineas
+    response = StreamingHttpResponse(contenido(nombre, formato, desde_id), content_type=f'{tipo}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nombre}-{timezone.now():%Y%m%d}.{formato}"'
+    return response
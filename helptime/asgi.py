@@ -2,6 +2,13 @@
 ASGI config for helptime project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django; WebSockets (ws/eventos/) go to core.consumers through
+Channels, so serving WebSockets requires running this module with an ASGI server:
+
+    daphne -b 0.0.0.0 -p $PORT helptime.asgi:application
+
+Under ASGI the async views in core/views.py run on the event loop; every middleware
+in MIDDLEWARE is async-capable, so requests to them do not go through a thread.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +20,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'helptime.settings')
 
-application = get_asgi_application()
+# Inicializar Django antes de importar consumers/modelos
+django_asgi_app = get_asgi_application()
+
+from channels.auth import AuthMiddlewareStack  # noqa: E402
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
+
+from core.routing import websocket_urlpatterns  # noqa: E402
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    'websocket': AllowedHostsOriginValidator(
+        AuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+    ),
+})
@@ -48,12 +48,22 @@ INSTALLED_APPS = [
 
 AUTH_USER_MODEL = 'core.Usuario'
 
+# get_user sale de la caché si es compartida (core/autenticacion.py). ModelBackend
+# sigue en la lista para que las sesiones iniciadas antes (guardan su ruta) sigan
+# valiendo; los logins nuevos quedan con el primero.
+AUTHENTICATION_BACKENDS = [
+    'core.autenticacion.UsuarioCacheadoBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+USUARIO_CACHE_SEGUNDOS = env.int('USUARIO_CACHE_SEGUNDOS', default=300)
+
 # -------------------------------------------------------
 # Middleware
 # -------------------------------------------------------
 MIDDLEWARE = [
+    'core.perfilado.PerfiladoMiddleware',  # primero: mide el request completo
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # servir estáticos
+    'core.estaticos.EstaticosMiddleware',  # servir estáticos (WhiteNoise, también bajo ASGI)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,12 +89,39 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'django.template.context_processors.media',
+                'core.context_processors.tiempo_real',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'helptime.wsgi.application'
+ASGI_APPLICATION = 'helptime.asgi.application'
+
+# -------------------------------------------------------
+# Tiempo real (WebSockets con Channels)
+# -------------------------------------------------------
+# Los eventos se publican desde donde se crean: el proceso web (daphne, pero también
+# gunicorn si se sirve por WSGI) y el worker de procesar_tareas. Para que lleguen a los
+# WebSockets abiertos en daphne hace falta un broker compartido: con
+# CHANNEL_LAYER_URL=redis://localhost:6379/0 se usa channels_redis. La capa en memoria
+# (sin CHANNEL_LAYER_URL) solo entrega dentro de un mismo proceso: sirve para tests y
+# desarrollo, y los eventos de otros procesos se pierden sin aviso.
+CHANNEL_LAYER_URL = env('CHANNEL_LAYER_URL', default='')
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': env(
+            'CHANNEL_LAYER_BACKEND',
+            default='channels_redis.core.RedisChannelLayer' if CHANNEL_LAYER_URL
+            else 'channels.layers.InMemoryChannelLayer',
+        ),
+    }
+}
+if CHANNEL_LAYER_URL:
+    CHANNEL_LAYERS['default']['CONFIG'] = {'hosts': [CHANNEL_LAYER_URL]}
+# Las páginas abren /ws/eventos/ solo con esto activo: hace falta servir por ASGI
+# (helptime/asgi.py) y un broker. Si no, se quedan con el polling.
+TIEMPO_REAL_ACTIVO = env.bool('TIEMPO_REAL_ACTIVO', default=bool(CHANNEL_LAYER_URL))
 
 # -------------------------------------------------------
 # Base de datos
@@ -92,6 +129,73 @@ WSGI_APPLICATION = 'helptime.wsgi.application'
 DATABASES = {
     'default': env.db('DATABASE_URL')
 }
+# Reutilizar la conexión entre requests del mismo worker en lugar de abrir una por request.
+# CONN_HEALTH_CHECKS verifica una conexión reutilizada antes de usarla (la base pudo cortarla).
+DATABASES['default']['CONN_MAX_AGE'] = env.int('DB_CONN_MAX_AGE', default=60)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = env.bool('DB_CONN_HEALTH_CHECKS', default=True)
+# Pool de psycopg 3 (solo PostgreSQL). Reemplaza a CONN_MAX_AGE: las conexiones vuelven al
+# pool al terminar cada request y se comparten entre los hilos del proceso (daphne, worker).
+if env.bool('DB_POOL', default=False) and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': env.int('DB_POOL_MIN', default=2),
+        'max_size': env.int('DB_POOL_MAX', default=10),
+        'timeout': env.int('DB_POOL_TIMEOUT', default=10),
+    }
+
+
+# -------------------------------------------------------
+# Caché
+# -------------------------------------------------------
+# CACHE_URL elige el backend: locmemcache:// (por defecto, por proceso),
+# filecache:///var/tmp/helptime o redis://host:6379/1 (compartida entre workers)
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://helptime'),
+}
+# Con locmem cada proceso (workers de gunicorn, procesar_tareas, comandos) tiene su
+# propia caché: lo que un proceso invalida sigue vigente en los demás. Lo que no puede
+# quedar desfasado (usuario del request, sesiones) solo se cachea si es compartida.
+CACHE_COMPARTIDA = not CACHES['default']['BACKEND'].endswith(('LocMemCache', 'DummyCache'))
+# Listado, tarjetas del perfil y páginas anónimas (core/cache.py): `invalidar` sube la
+# versión solo en la caché del proceso que escribe, así que con locmem y varios procesos
+# (Procfile: web + worker) quedarían viejos hasta su TIMEOUT. Por defecto se cachean
+# solo con una caché compartida; CACHE_FRAGMENTOS=True para un único proceso.
+CACHE_FRAGMENTOS = env.bool('CACHE_FRAGMENTOS', default=CACHE_COMPARTIDA)
+
+
+# -------------------------------------------------------
+# Sesiones
+# -------------------------------------------------------
+# cached_db (por defecto con caché compartida): se leen de la caché y la base queda
+# como respaldo, así un request autenticado no consulta la tabla de sesiones. Con una
+# caché por proceso, db: un logout en un worker tiene que valer en los demás.
+# signed_cookies: la sesión viaja firmada en la cookie, sin base ni caché (no se puede
+# cerrar una sesión desde el servidor y el contenido es visible para el cliente).
+SESSION_ENGINE = env('SESSION_ENGINE', default=(
+    'django.contrib.sessions.backends.cached_db' if CACHE_COMPARTIDA else 'django.contrib.sessions.backends.db'
+))
+
+
+# -------------------------------------------------------
+# Cola de tareas (core/tareas.py, worker: manage.py procesar_tareas)
+# -------------------------------------------------------
+TAREAS_CONCURRENCIA = env.int('TAREAS_CONCURRENCIA', default=2)
+TAREAS_MAX_INTENTOS = env.int('TAREAS_MAX_INTENTOS', default=5)
+TAREAS_BACKOFF_SEGUNDOS = env.int('TAREAS_BACKOFF_SEGUNDOS', default=10)
+TAREAS_BLOQUEO_SEGUNDOS = env.int('TAREAS_BLOQUEO_SEGUNDOS', default=300)
+
+
+# -------------------------------------------------------
+# Perfilado de requests (core/perfilado.py, resumen en /estado/perfilado/)
+# -------------------------------------------------------
+PERFILADO_ACTIVO = env.bool('PERFILADO_ACTIVO', default=DEBUG)
+if PERFILADO_ACTIVO:
+    # DjangoTemplates que además mide el render de cada request
+    TEMPLATES[0]['BACKEND'] = 'core.perfilado.PlantillasMedidas'
+# Muestras recientes que se conservan por nombre de URL
+PERFILADO_MUESTRAS = env.int('PERFILADO_MUESTRAS', default=500)
+# Veces que puede repetirse la misma consulta en un request antes de avisar (N+1)
+PERFILADO_UMBRAL_REPETIDAS = env.int('PERFILADO_UMBRAL_REPETIDAS', default=5)
 
 
 # -------------------------------------------------------
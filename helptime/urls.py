@@ -40,8 +40,11 @@ urlpatterns = [
     path('create_service/', views.create_service_view, name='create_service'),
 
     # Chat
+    path('chat/', views.bandeja_view, name='bandeja'),
     path('chat/<int:user_id>/', views.chat_view, name='chat'),
     path('chat/<int:user_id>/send/', views.send_message, name='send_message'),
+    path('chat/<int:user_id>/mensajes/', views.mensajes_nuevos_view, name='mensajes_nuevos'),
+    path('chat/<int:user_id>/mensajes/anteriores/', views.mensajes_anteriores_view, name='mensajes_anteriores'),
 
     path('valorar/<int:servicio_id>/', views.valorar_servicio, name='valorar_servicio'),
     path('profile/<int:user_id>/edit/', views.edit_profile_view, name='edit_profile'),
@@ -49,6 +52,12 @@ urlpatterns = [
     #Notificaciones
     path('notificaciones/', views.notificaciones_view, name='notificaciones'),
     path('notificaciones/marcar/<int:notif_id>/', views.marcar_leida_view, name='marcar_notificacion'),
+    path('notificaciones/marcar-todas/', views.marcar_todas_leidas_view, name='marcar_todas_notificaciones'),
+
+    # Monitoreo
+    path('estado/cache/', views.cache_estadisticas_view, name='cache_estadisticas'),
+    path('estado/perfilado/', views.perfilado_view, name='perfilado'),
+    path('estado/exportar/<str:nombre>/', views.exportar_view, name='exportar'),
 ]
 
 # Servir media solo en local